@@ -0,0 +1,84 @@
+"""Compare separate profile + label graphs against the combined profile graph.
+
+The CRM currently calls ``profile_graph`` and ``profile_label_graph`` for every
+customer. This runs both of them (concurrently, as the CRM does) and
+``combined_profile_graph`` on the same synthetic conversations, and reports
+latency and token usage. Calls the real model, so ``OPENAI_API_KEY`` must be
+set.
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_combined_profile.py [--conversations 5] [--turns 30]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+from benchmarks.bench_transcript_tokens import build_conversation
+from huanmu_agent.user_profile.combined_profile_agent import combined_profile_graph
+from huanmu_agent.user_profile.label_agent import profile_label_graph
+from huanmu_agent.user_profile.profile_agent import profile_graph
+
+
+async def run_separate(messages: list, config: dict) -> None:
+    await asyncio.gather(
+        profile_graph.ainvoke({"messages": messages}, config),
+        profile_label_graph.ainvoke({"messages": messages}, config),
+    )
+
+
+async def run_combined(messages: list, config: dict) -> None:
+    await combined_profile_graph.ainvoke({"messages": messages}, config)
+
+
+MODES = {"separate": run_separate, "combined": run_combined}
+
+
+async def measure(run, messages: list) -> dict:
+    usage = UsageMetadataCallbackHandler()
+    start = time.perf_counter()
+    await run(messages, {"callbacks": [usage]})
+    latency = time.perf_counter() - start
+    totals = usage.usage_metadata.values()
+    return {
+        "latency": latency,
+        "input_tokens": sum(u.get("input_tokens", 0) for u in totals),
+        "output_tokens": sum(u.get("output_tokens", 0) for u in totals),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    conversations = [build_conversation(args.turns, rng) for _ in range(args.conversations)]
+    results = {mode: [] for mode in MODES}
+    for messages in conversations:
+        for mode, run in MODES.items():
+            results[mode].append(await measure(run, messages))
+
+    print(f"{args.conversations} conversations x {args.turns} turns, mean per customer")
+    print(f"{'mode':<10}{'latency':>9}{'in_tok':>9}{'out_tok':>9}")
+    for mode, runs in results.items():
+        print(
+            f"{mode:<10}{statistics.mean(r['latency'] for r in runs):>8.2f}s"
+            f"{statistics.mean(r['input_tokens'] for r in runs):>9.0f}"
+            f"{statistics.mean(r['output_tokens'] for r in runs):>9.0f}"
+        )
+    separate, combined = results["separate"], results["combined"]
+    saved_tokens = 1 - (
+        sum(r["input_tokens"] + r["output_tokens"] for r in combined)
+        / max(sum(r["input_tokens"] + r["output_tokens"] for r in separate), 1)
+    )
+    print(f"combined saves {saved_tokens:.1%} of tokens")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Compare the fan-out and fused report modes of the user analysis graph.
+
+Runs ``user_analysis_graph`` on the same synthetic conversations in both
+``report_mode`` settings and reports wall-clock latency, token usage, an
+approximate cost and a quality proxy (share of the required ``【n】`` headings
+present in each section). Calls the real model, so ``OPENAI_API_KEY`` must be
+set.
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_report_modes.py [--conversations 5] [--turns 30]
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+from benchmarks.bench_transcript_tokens import build_conversation
+from huanmu_agent.analysis_report.user_analysis_reports_v1 import (
+    AI_STYLE_REPORT_INSTRUCTIONS,
+    RECOMMENDATION_REPORT_INSTRUCTIONS,
+    USER_SUMMARY_REPORT_INSTRUCTIONS,
+    user_analysis_graph,
+)
+
+# gpt-4o-mini 价格（美元 / 百万 token）
+PRICE_PER_MTOK = {"input": 0.15, "output": 0.60}
+SECTION_HEADING = re.compile(r"【(\d+)[】、]")
+MODES = ("fanout", "fused")
+
+
+def _required_headings(instructions: str) -> set:
+    return set(SECTION_HEADING.findall(instructions))
+
+
+REQUIRED_HEADINGS = [
+    _required_headings(RECOMMENDATION_REPORT_INSTRUCTIONS),
+    _required_headings(USER_SUMMARY_REPORT_INSTRUCTIONS),
+    _required_headings(AI_STYLE_REPORT_INSTRUCTIONS),
+]
+
+
+def heading_coverage(report: str) -> float:
+    """Fraction of the required headings present in each of the three sections."""
+    sections = [s for s in report.split("======================") if s.strip()]
+    if len(sections) != len(REQUIRED_HEADINGS):
+        return 0.0
+    found = sum(len(required & set(SECTION_HEADING.findall(section)))
+                for required, section in zip(REQUIRED_HEADINGS, sections))
+    return found / sum(len(required) for required in REQUIRED_HEADINGS)
+
+
+async def run_once(messages: list, mode: str) -> dict:
+    usage = UsageMetadataCallbackHandler()
+    start = time.perf_counter()
+    result = await user_analysis_graph.ainvoke(
+        {"messages": messages},
+        {"configurable": {"report_mode": mode}, "callbacks": [usage]},
+    )
+    latency = time.perf_counter() - start
+    input_tokens = sum(u.get("input_tokens", 0) for u in usage.usage_metadata.values())
+    output_tokens = sum(u.get("output_tokens", 0) for u in usage.usage_metadata.values())
+    cost = (input_tokens * PRICE_PER_MTOK["input"] + output_tokens * PRICE_PER_MTOK["output"]) / 1_000_000
+    return {
+        "latency": latency,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": cost,
+        "coverage": heading_coverage(result.get("structured_response") or ""),
+        "error": bool(result.get("error_message")),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    conversations = [build_conversation(args.turns, rng) for _ in range(args.conversations)]
+    results = {mode: [] for mode in MODES}
+    for messages in conversations:
+        for mode in MODES:
+            results[mode].append(await run_once(messages, mode))
+
+    print(f"{args.conversations} conversations x {args.turns} turns, mean per report")
+    print(f"{'mode':<8}{'latency':>9}{'p_max':>8}{'in_tok':>9}{'out_tok':>9}{'cost$':>10}{'headings':>10}{'errors':>8}")
+    for mode, runs in results.items():
+        latencies = [r["latency"] for r in runs]
+        print(
+            f"{mode:<8}{statistics.mean(latencies):>8.1f}s{max(latencies):>7.1f}s"
+            f"{statistics.mean(r['input_tokens'] for r in runs):>9.0f}"
+            f"{statistics.mean(r['output_tokens'] for r in runs):>9.0f}"
+            f"{statistics.mean(r['cost'] for r in runs):>10.5f}"
+            f"{statistics.mean(r['coverage'] for r in runs):>10.1%}"
+            f"{sum(r['error'] for r in runs):>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
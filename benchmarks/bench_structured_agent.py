@@ -0,0 +1,87 @@
+"""Compare create_react_agent(tools=[]) with the single-call structured agent.
+
+Builds both variants of the sales suggestion and profile agents from the same
+model, schema and prompt, runs them on the same synthetic conversations and
+reports LLM round-trips, latency and token usage per request. Calls the real
+model, so ``OPENAI_API_KEY`` must be set.
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_structured_agent.py [--conversations 5] [--turns 10]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from langchain_core.callbacks import AsyncCallbackHandler, UsageMetadataCallbackHandler
+from langgraph.prebuilt import create_react_agent
+
+from benchmarks.bench_transcript_tokens import build_conversation
+from constant import OPENAI_GPT4_MINI
+from huanmu_agent.sales import sale_advice_agent
+from huanmu_agent.user_profile import profile_agent
+from huanmu_agent.utils.langchain_utils import load_chat_model
+from huanmu_agent.utils.structured_output import create_structured_agent
+
+# The agents' own chat_model is a routed runnable; create_react_agent needs a real
+# BaseChatModel, and both variants should call the same model anyway.
+BENCH_MODEL = load_chat_model(OPENAI_GPT4_MINI, 0.7)
+
+AGENTS = {
+    "sales": (BENCH_MODEL, sale_advice_agent.FinalChatReplyResponseFormat, sale_advice_agent.prompt),
+    "profile": (BENCH_MODEL, profile_agent.ProfileAgentResponseFormat, profile_agent.build_profile_prompt),
+}
+
+
+class CountChatCalls(AsyncCallbackHandler):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def on_chat_model_start(self, *args, **kwargs) -> None:
+        self.calls += 1
+
+
+def build_variants(model, schema, prompt) -> dict:
+    return {
+        "react": create_react_agent(model=model, tools=[], response_format=schema, prompt=prompt),
+        "structured": create_structured_agent(model, schema, prompt),
+    }
+
+
+async def measure(agent, messages: list) -> dict:
+    counter, usage = CountChatCalls(), UsageMetadataCallbackHandler()
+    config = {"configurable": {"number": 3}, "callbacks": [counter, usage]}
+    start = time.perf_counter()
+    await agent.ainvoke({"messages": messages}, config)
+    latency = time.perf_counter() - start
+    return {
+        "calls": counter.calls,
+        "latency": latency,
+        "tokens": sum(u.get("total_tokens", 0) for u in usage.usage_metadata.values()),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    conversations = [build_conversation(args.turns, rng) for _ in range(args.conversations)]
+    print(f"{args.conversations} conversations x {args.turns} turns, mean per request")
+    print(f"{'agent':<10}{'variant':<12}{'calls':>7}{'latency':>10}{'tokens':>9}")
+    for agent_name, (model, schema, prompt) in AGENTS.items():
+        for variant, agent in build_variants(model, schema, prompt).items():
+            runs = [await measure(agent, messages) for messages in conversations]
+            print(
+                f"{agent_name:<10}{variant:<12}{statistics.mean(r['calls'] for r in runs):>7.1f}"
+                f"{statistics.mean(r['latency'] for r in runs):>9.2f}s"
+                f"{statistics.mean(r['tokens'] for r in runs):>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
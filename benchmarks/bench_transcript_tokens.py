@@ -0,0 +1,103 @@
+"""Measure prompt tokens of repr(messages) vs the compact transcript encoder.
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_transcript_tokens.py [--conversations 50] [--turns 30]
+"""
+
+import argparse
+import random
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, filter_messages
+
+from huanmu_agent.utils.transcript import format_transcript
+
+CUSTOMER_LINES = [
+    "你好，我想了解一下鼻综合大概多少钱？",
+    "恢复期要多久呀，我七月初想安排一下",
+    "刘主任这周有空吗？我比较喜欢自然一点的韩式风格",
+    "价格有点贵，能分期吗",
+    "我朋友做了感觉肿了很久，有点担心",
+    "好的，我再考虑一下",
+]
+ADVISOR_LINES = [
+    "您好，鼻综合根据方案不同价格在2万到4万之间，可以先面诊评估哦。",
+    "一般肿胀期在7到14天，一个月左右基本自然，我们会全程跟进术后护理。",
+    "刘主任周三和周五下午有面诊时间，需要帮您预约吗？",
+    "可以的，我们支持12期免息分期，压力会小很多。",
+    "理解您的顾虑，我可以发一些刘主任的真实案例和恢复流程给您参考。",
+]
+
+
+def _load_counter():
+    """Return (unit, counter); falls back to characters when tiktoken is unavailable."""
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("o200k_base")
+        return "tokens", lambda text: len(encoding.encode(text))
+    except Exception:
+        return "chars", len
+
+
+def build_conversation(turns: int, rng: random.Random) -> list:
+    messages = []
+    base_time = 1_750_000_000
+    for turn in range(turns):
+        timestamp = base_time + turn * 600
+        messages.append(HumanMessage(
+            content=rng.choice(CUSTOMER_LINES),
+            id=str(uuid.uuid4()),
+            additional_kwargs={"timestamp": timestamp},
+        ))
+        messages.append(AIMessage(
+            content=rng.choice(ADVISOR_LINES),
+            id=f"run-{uuid.uuid4()}-0",
+            additional_kwargs={"timestamp": timestamp + 30, "refusal": None},
+            response_metadata={
+                "token_usage": {"completion_tokens": 42, "prompt_tokens": 1203, "total_tokens": 1245},
+                "model_name": "gpt-4o-mini-2024-07-18",
+                "system_fingerprint": "fp_0123456789",
+                "finish_reason": "stop",
+                "logprobs": None,
+            },
+            usage_metadata={"input_tokens": 1203, "output_tokens": 42, "total_tokens": 1245},
+        ))
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    unit, count = _load_counter()
+    rng = random.Random(0)
+    totals = {"recommendation": [0, 0, 0], "user_summary": [0, 0, 0], "ai_style": [0, 0, 0]}
+    for _ in range(args.conversations):
+        messages = build_conversation(args.turns, rng)
+        human_content = [m.content for m in filter_messages(messages, include_types=["human"])]
+        ai_content = [m.content for m in filter_messages(messages, include_types=["ai"])]
+        cases = {
+            "recommendation": (f"{messages}", {}),
+            "user_summary": (f"{human_content}", {"include_roles": ("human",)}),
+            "ai_style": (f"{ai_content}", {"include_roles": ("ai",)}),
+        }
+        for section, (before, kwargs) in cases.items():
+            totals[section][0] += count(before)
+            totals[section][1] += count(format_transcript(messages, with_timestamps=False, **kwargs))
+            totals[section][2] += count(format_transcript(messages, **kwargs))
+
+    print(f"{args.conversations} conversations x {args.turns} turns, average {unit} per prompt")
+    print(f"{'section':<16}{'repr':>8}{'compact':>10}{'saved':>8}{'+time':>8}{'saved':>8}")
+    n = args.conversations
+    for section, (before, compact, timed) in totals.items():
+        print(
+            f"{section:<16}{before // n:>8}{compact // n:>10}{1 - compact / before:>8.1%}"
+            f"{timed // n:>8}{1 - timed / before:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 OPENAI_GPT4_MINI = "openai/gpt-4o-mini-2024-07-18"
+OPENAI_GPT41_MINI = "openai/gpt-4.1-mini"
 GOOGLE_GEMINI_FLASH_MODEL = "gemini-2.5-flash-preview-05-20"
 GOOGLE_GEMINI_PRO_MODEL = "gemini-2.5-pro-preview-05-06"
 GOOGLE_GEMINI_PRO_MODEL = "gemini-2.5-pro"
+GOOGLE_VERTEX_GEMINI_FLASH = f"google_vertexai/{GOOGLE_GEMINI_FLASH_MODEL}"
 GEMINI_EMBEDDING_MODEL = "gemini-embedding-001"
 GEMINI_EMBEDDING_MODEL_EX_03_07 = "gemini-embedding-exp-03-07"
\ No newline at end of file
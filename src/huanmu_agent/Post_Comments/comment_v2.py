@@ -1,14 +1,15 @@
 """朋友圈评论 Agent - 处理文本和图片，生成评论."""
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langchain_core.runnables import RunnableConfig
 from typing_extensions import TypedDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from pydantic import BaseModel, Field
 import asyncio
+from functools import lru_cache
+from huanmu_agent.Post_Comments.content_gate import SKIP_EMPTY, classify_post, record_gate_result
 from huanmu_agent.Post_Comments.url_to_text import process_images_to_descriptions
-from constant import OPENAI_GPT4_MINI
+from huanmu_agent.utils.model_router import routed_chat_model
 class CharacterprofileConfigSchema(TypedDict):
     """人物参数"""
     agent_name: str
@@ -25,21 +26,98 @@ class CommentState(TypedDict):
     context: Optional[str]
     urls: Optional[List[str]]  # 支持多个图片URL
     enhanced_content: Optional[str]
+    skip_reason: Optional[str]
     structured_response: Optional[str]
     error_message: Optional[str]
 
+class CommentPost(TypedDict, total=False):
+    """批量评论中的单条朋友圈."""
+    post_id: str
+    context: str
+    urls: Optional[List[str]]
+
+class BatchCommentConfigSchema(CharacterprofileConfigSchema, total=False):
+    """批量评论参数：人设 + 并发上限"""
+    max_concurrency: int
+
+class BatchCommentInput(TypedDict):
+    """批量评论输入，同一人设下的多条朋友圈."""
+    posts: List[CommentPost]
+
+class BatchCommentState(TypedDict):
+    """批量评论状态."""
+    posts: List[CommentPost]
+    results: List[Dict[str, Any]]
+
+class BatchCommentOutput(TypedDict):
+    """批量评论输出，与posts一一对应."""
+    results: List[Dict[str, Any]]
+
 class CommentOutput(BaseModel):
     """评论输出."""
     structured_response: Optional[str]
     error_message: Optional[str] = Field(default=None, description="出错时的错误信息")
+    skip_reason: Optional[str] = Field(default=None, description="本地过滤判定沉默的原因，未过滤时为空")
+
+# 初始化模型：评论和图片描述各走自己的模型路由
+llm = routed_chat_model("comment", temperature=0.7)
+vision_llm = routed_chat_model("vision_caption", temperature=0.7)
+
+COMMENT_PERSONA_PROMPT_TEMPLATE = """
+你是一个叫{agent_name}的{agent_gender}性，性格{agent_personality}。
+
+【核心目标】
+你的评论目的是给朋友留下好印象，展现你是一个{agent_personality}的人。通过合适的评论来维护和增进人际关系。
+
+【评论策略】
+1. 优先原则：能评论就评论，给人温暖正面的感受
+2. 内容判断：先识别朋友圈的情绪/意图和内容类型，选择最合适的回应方式
+3. 特殊情况：对于不适合评论的内容，选择沉默（返回None）
+
+【什么时候评论】
+- 日常生活分享：积极互动，表达关心
+- 开心喜悦：真诚祝福，分享快乐
+- 悲伤困难：给予支持，传递温暖
+- 成就展示：给予认可，表达赞美
+- 求助征询：提供建议，展现关心
+
+【什么时候保持沉默（返回None）】
+- 涉政、涉宗教、涉色情、涉暴力、涉歧视、敏感话题：避免争议
+- 负面情绪爆发：避免火上浇油
+- 纯商业广告链接：避免显得过于商业化
+- 内容不清晰或无法理解：避免误解
+- 内容太庄重或者太严肃：保持沉默
+
+【评论风格要求】
+- 字数：3-25字，简洁而有温度
+- 语调：符合你的人设{agent_personality}
+- 互动性：体现关心，鼓励进一步交流
+- 避免：敷衍客套、过度表情符号、具体邀约安排
+- 减少使用标点符号装饰（如"~~""##"等）
+
+【不同情境的评论示例】
+• 美食分享："看起来好香啊" "这家店在哪里"
+• 风景照片："好美的地方" "心情都变好了"
+• 工作成就："太棒了" "为你开心"
+• 生活日常："哈哈同感" "生活真美好"
+• 困难求助："抱抱，会好起来的" "需要帮忙随时找我"
+
+直接输出你的评论内容，不要包含任何解释或额外说明。
+"""
 
-provider, model_name = OPENAI_GPT4_MINI.split('/', 1)
-# 初始化模型
-llm = init_chat_model(
-    model=model_name,
-    model_provider=provider,
-    temperature=0.7,
-)
+
+@lru_cache(maxsize=256)
+def build_persona_system_prompt(agent_name: str, agent_gender: str, agent_personality: str) -> str:
+    """按人设编译并缓存评论系统提示词.
+
+    提示词只依赖人设，朋友圈内容放在后面的用户消息里，同一人设的请求共享相同的前缀，
+    既省去每次拼接长字符串，也能命中模型服务端的前缀缓存。
+    """
+    return COMMENT_PERSONA_PROMPT_TEMPLATE.format(
+        agent_name=agent_name,
+        agent_gender=agent_gender,
+        agent_personality=agent_personality,
+    )
 
 async def process_content_node(state: CommentState) -> Dict[str, Any]:
     """处理朋友圈内容，包括文字和图片，转换为合适的文本格式."""
@@ -64,7 +142,7 @@ async def process_content_node(state: CommentState) -> Dict[str, Any]:
         # 处理图片URL（如果提供了urls参数）
         if urls and isinstance(urls, list):
             print(f"[DEBUG] 开始处理{len(urls)}个图片URL...")
-            image_descriptions = await process_images_to_descriptions(urls, llm)
+            image_descriptions = await process_images_to_descriptions(urls, vision_llm)
 
             if image_descriptions:
                 enhanced_content += f"\n\n{' '.join(image_descriptions)}"
@@ -81,6 +159,26 @@ async def process_content_node(state: CommentState) -> Dict[str, Any]:
             "error_message": str(e)
         }
 
+async def content_gate_node(state: CommentState) -> Dict[str, Any]:
+    """本地预判是否需要沉默（空内容、纯链接广告、敏感词），命中则不调用LLM."""
+    reason = classify_post(state.get("context"), state.get("urls"), state.get("enhanced_content"))
+    record_gate_result(reason)
+    if reason is None:
+        return {"skip_reason": None}
+
+    print(f"[DEBUG] 内容过滤命中: {reason}，跳过LLM调用")
+    if reason == SKIP_EMPTY:
+        return {
+            "skip_reason": reason,
+            "structured_response": "",
+            "error_message": state.get("error_message") or "没有处理的内容可用于生成评论",
+        }
+    return {"skip_reason": reason, "structured_response": "", "error_message": None}
+
+def route_after_gate(state: CommentState) -> Literal["generate_comment", "__end__"]:
+    """过滤命中直接结束，否则进入评论生成."""
+    return "__end__" if state.get("skip_reason") else "generate_comment"
+
 async def generate_comment_node(state: CommentState, config: RunnableConfig) -> Dict[str, Any]:
     """生成朋友圈评论."""
     try:
@@ -98,55 +196,14 @@ async def generate_comment_node(state: CommentState, config: RunnableConfig) ->
         agent_gender = configurable.get("agent_gender", "女")
         agent_personality = configurable.get("agent_personality", "热情")
         
-        system_msg = f"""
-你是一个叫{agent_name}的{agent_gender}性，性格{agent_personality}。
-
-【核心目标】
-你的评论目的是给朋友留下好印象，展现你是一个{agent_personality}的人。通过合适的评论来维护和增进人际关系。
-
-【评论策略】
-1. 优先原则：能评论就评论，给人温暖正面的感受
-2. 内容判断：先识别朋友圈的情绪/意图和内容类型，选择最合适的回应方式
-3. 特殊情况：对于不适合评论的内容，选择沉默（返回None）
-
-【什么时候评论】
-- 日常生活分享：积极互动，表达关心
-- 开心喜悦：真诚祝福，分享快乐
-- 悲伤困难：给予支持，传递温暖
-- 成就展示：给予认可，表达赞美
-- 求助征询：提供建议，展现关心
-
-【什么时候保持沉默（返回None）】
-- 涉政、涉宗教、涉色情、涉暴力、涉歧视、敏感话题：避免争议
-- 负面情绪爆发：避免火上浇油
-- 纯商业广告链接：避免显得过于商业化
-- 内容不清晰或无法理解：避免误解
-- 内容太庄重或者太严肃：保持沉默
-
-【评论风格要求】
-- 字数：3-25字，简洁而有温度
-- 语调：符合你的人设{agent_personality}
-- 互动性：体现关心，鼓励进一步交流
-- 避免：敷衍客套、过度表情符号、具体邀约安排
-- 减少使用标点符号装饰（如"~~""##"等）
-
-【不同情境的评论示例】
-• 美食分享："看起来好香啊" "这家店在哪里"
-• 风景照片："好美的地方" "心情都变好了"
-• 工作成就："太棒了" "为你开心"
-• 生活日常："哈哈同感" "生活真美好"
-• 困难求助："抱抱，会好起来的" "需要帮忙随时找我"
-
-直接输出你的评论内容，不要包含任何解释或额外说明。
-========================================================
-朋友圈内容：
-{enhanced_content}
-========================================================
-"""
-        
         messages = [
-            SystemMessage(content=system_msg),
-            HumanMessage(content="请根据以上朋友圈内容生成评论")
+            SystemMessage(content=build_persona_system_prompt(agent_name, agent_gender, agent_personality)),
+            HumanMessage(content=(
+                "========================================================\n"
+                f"朋友圈内容：\n{enhanced_content}\n"
+                "========================================================\n"
+                "请根据以上朋友圈内容生成评论"
+            )),
         ]
         
         print(f"[DEBUG] 准备调用LLM生成评论")
@@ -177,9 +234,58 @@ comment_analysis_graph = (
         output=CommentOutput
     )
     .add_node("process_content", process_content_node)
+    .add_node("content_gate", content_gate_node)
     .add_node("generate_comment", generate_comment_node)
     .add_edge(START, "process_content")
-    .add_edge("process_content", "generate_comment")
+    .add_edge("process_content", "content_gate")
+    .add_conditional_edges("content_gate", route_after_gate)
     .add_edge("generate_comment", END)
     .compile()
-)
\ No newline at end of file
+)
+
+DEFAULT_BATCH_CONCURRENCY = 8
+
+async def batch_comment_node(state: BatchCommentState, config: RunnableConfig) -> Dict[str, Any]:
+    """批量生成朋友圈评论，按并发上限调度，单条失败不影响其他."""
+    posts = state.get("posts") or []
+    if not posts:
+        return {"results": []}
+
+    configurable = config.get("configurable", {}) if config else {}
+    max_concurrency = configurable.get("max_concurrency") or DEFAULT_BATCH_CONCURRENCY
+    print(f"[DEBUG] 批量评论 {len(posts)} 条，并发上限 {max_concurrency}")
+
+    inputs = [{"context": post.get("context", ""), "urls": post.get("urls")} for post in posts]
+    outputs = await comment_analysis_graph.abatch(
+        inputs,
+        {**config, "max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+
+    results = []
+    for index, (post, output) in enumerate(zip(posts, outputs)):
+        result = {"index": index, "post_id": post.get("post_id")}
+        if isinstance(output, Exception):
+            result.update({"structured_response": "", "error_message": str(output), "skip_reason": None})
+        else:
+            result.update({
+                "structured_response": output.get("structured_response"),
+                "error_message": output.get("error_message"),
+                "skip_reason": output.get("skip_reason"),
+            })
+        results.append(result)
+    return {"results": results}
+
+# 创建批量朋友圈评论 Workflow
+batch_comment_graph = (
+    StateGraph(
+        BatchCommentState,
+        input=BatchCommentInput,
+        config_schema=BatchCommentConfigSchema,
+        output=BatchCommentOutput
+    )
+    .add_node("batch_comment", batch_comment_node)
+    .add_edge(START, "batch_comment")
+    .add_edge("batch_comment", END)
+    .compile()
+)
@@ -0,0 +1,102 @@
+"""朋友圈评论前置过滤 - 本地判断哪些朋友圈应当保持沉默，不调用LLM."""
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+URL_PATTERN = re.compile(r"(https?://|www\.)\S+", re.IGNORECASE)
+
+# 命中即沉默：只收录不会出现在日常动态里的明确说法（涉政、邪教、自杀、色情、歧视、辱骂）。
+# "政府""杀了""弄死"这类词在日常用语里很常见；悲伤、悼念类动态交给模型按提示词给予支持或沉默。
+BLOCKED_KEYWORDS = (
+    "台独", "藏独", "法轮功", "法轮大法", "邪教",
+    "自杀",
+    "色情", "约炮", "裸聊",
+    "黑人都", "地域黑",
+    "傻逼", "傻b", "垃圾人",
+)
+
+# 只收录明显的推广话术；"下单""包邮""优惠券"这类日常购物用语不算，避免误伤个人动态。
+# 命中两个以上，或命中一个且带链接/联系方式，视为纯商业广告
+AD_KEYWORDS = (
+    "招代理", "诚招代理", "代理招募", "招商加盟", "月入过万", "稳赚不赔", "零门槛创业",
+    "点击链接", "私信下单", "扫码下单", "扫码进群", "限时抢购", "团购价", "一件代发", "厂家直销",
+)
+
+# 联系方式：手机号、微信号、加V/加微
+CONTACT_PATTERN = re.compile(
+    r"(?<!\d)1[3-9]\d{9}(?!\d)"
+    r"|(微信|微信号|vx|wx|v信)\s*[:：]?\s*[a-z][-_a-z0-9]{5,19}"
+    r"|加\s*(微信|微|v|vx|wx)",
+    re.IGNORECASE,
+)
+
+SKIP_EMPTY = "empty"
+SKIP_URL_ONLY = "url_only"
+SKIP_AD = "ad"
+SKIP_BLOCKED = "blocked_keyword"
+
+# 过滤计数：checked / passed / skipped / skipped:<原因>
+gate_stats: Counter = Counter()
+
+
+def _has_meaningful_text(text: str) -> bool:
+    """去掉空白、标点、符号和表情后是否还有文字."""
+    for ch in text:
+        category = unicodedata.category(ch)
+        if category[0] in ("L", "N"):
+            return True
+    return False
+
+
+def classify_post(context: Optional[str], urls: Optional[List[str]], enhanced_content: Optional[str]) -> Optional[str]:
+    """判断朋友圈是否应当直接沉默.
+
+    Args:
+        context: 朋友圈原始文字
+        urls: 朋友圈附带的图片URL
+        enhanced_content: 文字 + 图片描述后的内容
+
+    Returns:
+        需要沉默时返回原因（SKIP_*），否则返回 None
+    """
+    caption = (context or "").strip()
+    enhanced = (enhanced_content or "").strip()
+    has_images = bool(urls)
+
+    if not enhanced:
+        return SKIP_EMPTY
+
+    caption_without_urls = URL_PATTERN.sub("", caption)
+    has_link = caption_without_urls != caption
+    if has_link and not has_images and not _has_meaningful_text(caption_without_urls):
+        return SKIP_URL_ONLY
+
+    lowered = caption.lower()
+    if any(keyword in lowered for keyword in BLOCKED_KEYWORDS):
+        return SKIP_BLOCKED
+
+    ad_hits = sum(1 for keyword in AD_KEYWORDS if keyword in lowered)
+    has_contact = has_link or bool(CONTACT_PATTERN.search(caption))
+    if ad_hits >= 2 or (ad_hits >= 1 and has_contact):
+        return SKIP_AD
+
+    if not has_images and not _has_meaningful_text(caption):
+        return SKIP_EMPTY
+
+    return None
+
+
+def record_gate_result(reason: Optional[str]) -> None:
+    """累计过滤计数."""
+    gate_stats["checked"] += 1
+    if reason is None:
+        gate_stats["passed"] += 1
+    else:
+        gate_stats["skipped"] += 1
+        gate_stats[f"skipped:{reason}"] += 1
+
+
+def get_gate_stats() -> Dict[str, int]:
+    """返回过滤计数快照，skipped 即节省的LLM调用次数."""
+    return dict(gate_stats)
@@ -2,76 +2,88 @@ from langchain_core.messages import HumanMessage
 from typing import List
 import asyncio
 import base64
-import requests
 import re
 from constant import GOOGLE_GEMINI_FLASH_MODEL
+from huanmu_agent.utils.http_client import fetch_bytes
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+# 单条朋友圈内同时处理的图片数
+MAX_IMAGE_CONCURRENCY = 4
+
+
+async def describe_image(url: str, llm) -> str:
+    """
+    下载单张图片并调用视觉模型生成一句话描述
+
+    Args:
+        url: 图片URL
+        llm: 语言模型实例
+
+    Returns:
+        图片描述，如果处理失败则返回错误信息
+    """
+    print(f"[DEBUG] 处理图片URL: {url}")
+    # 检查是否为图片格式
+    if not any(ext in url.lower() for ext in IMAGE_EXTENSIONS):
+        print(f"[DEBUG] URL不是图片格式: {url}")
+        return f"URL不是图片格式: {url}"
+
+    try:
+        # 下载图片 - 走共享的异步连接池，复用 DNS/TCP/TLS 连接
+        print(f"[DEBUG] 开始下载图片: {url}")
+        image_bytes = await fetch_bytes(url, timeout=10)
+        print(f"[DEBUG] 图片下载成功，大小: {len(image_bytes)} 字节")
+
+        # 转换为base64
+        image_data = base64.b64encode(image_bytes).decode('utf-8')
+        print(f"[DEBUG] 图片转换为base64，长度: {len(image_data)}")
+
+        # 使用视觉模型分析图片
+        print("[DEBUG] 开始调用视觉模型分析图片...")
+        vision_message = HumanMessage(
+            content=[
+                {"type": "text", "text": "请一句话简洁描述这张图片的内容："},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}
+                }
+            ]
+        )
+
+        # 调用视觉模型 - 直接走异步接口，多张图片并发时不占用线程池
+        try:
+            vision_result = await llm.ainvoke([vision_message])
+            print(f"[DEBUG] 视觉分析结果: {vision_result.content}")
+            return vision_result.content
+        except Exception as vision_error:
+            print(f"[ERROR] 视觉模型调用失败: {vision_error}")
+            return f"图片分析失败: {str(vision_error)}"
+
+    except Exception as e:
+        print(f"[DEBUG] 图片处理异常: {str(e)}")
+        return f"图片处理失败: {str(e)}"
+
 
 # 图片处理函数
-async def process_images_to_descriptions(urls: List[str], llm) -> List[str]:
+async def process_images_to_descriptions(urls: List[str], llm, max_concurrency: int = MAX_IMAGE_CONCURRENCY) -> List[str]:
     """
     处理多个图片URL，返回图片描述列表
 
     Args:
         urls: 图片URL列表
         llm: 语言模型实例
+        max_concurrency: 同时处理的图片数上限
 
     Returns:
-        图片描述列表，如果处理失败则返回错误信息
+        图片描述列表（顺序与urls一致），如果处理失败则返回错误信息
     """
     if not urls:
         return []
 
-    descriptions = []
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
-    for url in urls:
-        print(f"[DEBUG] 处理图片URL: {url}")
-        # 检查是否为图片格式
-        if not any(ext in url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-            print(f"[DEBUG] URL不是图片格式: {url}")
-            descriptions.append(f"URL不是图片格式: {url}")
-            continue
+    async def _bounded(url: str) -> str:
+        async with semaphore:
+            return await describe_image(url, llm)
 
-        try:
-            # 下载图片 - 使用线程池避免阻塞事件循环
-            print(f"[DEBUG] 开始下载图片: {url}")
-            
-            def download_image(url):
-                """同步下载图片的函数，将在线程池中运行"""
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                return response
-            
-            # 在线程池中执行同步的网络请求
-            response = await asyncio.to_thread(download_image, url)
-            print(f"[DEBUG] 图片下载成功，状态码: {response.status_code}")
-
-            # 转换为base64
-            image_data = base64.b64encode(response.content).decode('utf-8')
-            print(f"[DEBUG] 图片转换为base64，长度: {len(image_data)}")
-
-            # 使用视觉模型分析图片
-            print("[DEBUG] 开始调用视觉模型分析图片...")
-            vision_message = HumanMessage(
-                content=[
-                    {"type": "text", "text": "请一句话简洁描述这张图片的内容："},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}
-                    }
-                ]
-            )
-
-            # 调用视觉模型 - 统一使用同步方法并在线程池中执行
-            try:
-                vision_result = await asyncio.to_thread(llm.invoke, [vision_message])
-                print(f"[DEBUG] 视觉分析结果: {vision_result.content}")
-                descriptions.append(vision_result.content)
-            except Exception as vision_error:
-                print(f"[ERROR] 视觉模型调用失败: {vision_error}")
-                descriptions.append(f"图片分析失败: {str(vision_error)}")
-
-        except Exception as e:
-            print(f"[DEBUG] 图片处理异常: {str(e)}")
-            descriptions.append(f"图片处理失败: {str(e)}")
-
-    return descriptions
\ No newline at end of file
+    return list(await asyncio.gather(*(_bounded(url) for url in urls)))
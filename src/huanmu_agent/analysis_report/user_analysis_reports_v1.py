@@ -1,36 +1,56 @@
-from langchain_core.messages import AnyMessage, BaseMessage, AIMessage,HumanMessage,filter_messages
+from langchain_core.messages import AnyMessage, BaseMessage, AIMessage,HumanMessage
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import create_react_agent
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from langchain.chat_models import init_chat_model
 from langchain_core.runnables import RunnableConfig
-from typing_extensions import TypedDict
-from typing import List, Optional, Dict, Any
+from langgraph.store.base import BaseStore
+from typing_extensions import Annotated, TypedDict
+from typing import List, Optional, Dict, Any, Sequence, Union
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from pydantic import BaseModel, Field
 import asyncio
-from constant import OPENAI_GPT4_MINI
+import operator
+from huanmu_agent.utils.cache import TTLCache, stable_hash
+from huanmu_agent.utils.model_router import routed_chat_model
+from huanmu_agent.utils.structured_output import create_structured_agent
+from huanmu_agent.utils.transcript import format_transcript
 
 class UserChunkSummaryResponse(BaseModel):
-    user_chunk_summary: Optional[str] = Field(description="用户情况总结")
+    user_chunk_summary: Optional[str] = Field(description="按要求格式撰写的完整报告全文（用户情况总结）")
     error_message: Optional[str] = Field(default=None, description="出错时的错误信息")
 
 class AiDialogStyleResponse(BaseModel):
-    ai_dialog_style: Optional[str] = Field(description="AI对话风格描述")
+    ai_dialog_style: Optional[str] = Field(description="按要求格式撰写的完整报告全文（AI对话风格描述）")
     error_message: Optional[str] = Field(default=None, description="出错时的错误信息")
 
 class RecommendationResponse(BaseModel):
-    recommendation: Optional[str] = Field(description="针对用户的服务建议或推荐")
+    recommendation: Optional[str] = Field(description="按要求格式撰写的完整报告全文（针对用户的服务建议或推荐）")
     error_message: Optional[str] = Field(default=None, description="出错时的错误信息")
 
+class UserAnalysisReportResponse(BaseModel):
+    """fused 模式下一次调用生成的三份报告."""
+    recommendation: str = Field(description="一、医美客户风险预警与个性化服务建议报告全文")
+    user_chunk_summary: str = Field(description="二、医美客户信息洞察与接待准备报告全文")
+    ai_dialog_style: str = Field(description="三、AI客服对话风格分析报告全文")
+
 class UserSummaryAgentState(AgentState):
+    history_summary: Optional[str]
+    prior_section: Optional[str]
+    incremental: Optional[bool]
     structured_response: Optional[UserChunkSummaryResponse]
     error_message: Optional[str]
 
 class AiStyleAgentState(AgentState):
+    history_summary: Optional[str]
+    prior_section: Optional[str]
+    incremental: Optional[bool]
     structured_response: Optional[AiDialogStyleResponse]
     error_message: Optional[str]
 
 class RecommendationAgentState(AgentState):
+    history_summary: Optional[str]
+    prior_section: Optional[str]
+    incremental: Optional[bool]
     structured_response: Optional[RecommendationResponse]
     error_message: Optional[str]
 
@@ -38,26 +58,55 @@ class UserAnalysisAgentState(AgentState):
     structured_response: Optional[str]
     error_message: Optional[str]
 
+class UserAnalysisReportState(AgentState):
+    """报告图状态：三个并行分支各写自己的字段，errors 用 reducer 合并."""
+    history_summary: Optional[str]
+    # 增量报告：上次持久化的中间结果
+    prior_report: Optional[Dict[str, Any]]
+    prior_sections: Optional[Dict[str, str]]
+    chunk_summaries: Optional[List[str]]
+    covered_count: Optional[int]
+    # 水位线之后新增的对话；没有分段摘要时报告只基于上一版报告 + 这些消息更新
+    new_messages: Optional[List[AnyMessage]]
+    report_reused: Optional[bool]
+    recommendation_report: Optional[str]
+    user_summary_report: Optional[str]
+    ai_style_report: Optional[str]
+    errors: Annotated[List[str], operator.add]
+    structured_response: Optional[str]
+    error_message: Optional[str]
+
 class ChatReplyAgentStateInput(TypedDict):
     messages: List[BaseMessage]
 
 class UserAnalysisAgentStateOutput(TypedDict):
     structured_response: Optional[str]
+    error_message: Optional[str]
+
+class UserAnalysisConfigSchema(TypedDict, total=False):
+    """报告参数.
+
+    report_mode: "fanout"（默认，三个 agent 并行各生成一份）/ "fused"（一次结构化调用生成三份）
+    analysis_mode: "auto"（默认，消息数超过 map_reduce_threshold 时分段）/ "direct" / "map_reduce"
+    chunk_size: 分段时每段的消息条数
+    map_reduce_threshold: auto 模式下触发分段总结的消息条数
+    max_chunk_concurrency: 分段总结的并发上限
+    customer_id: 客户ID；提供且运行环境配置了 store 时启用增量报告
+    incremental: 是否启用增量报告（默认 True）
+    """
+    customer_id: str
+    incremental: bool
+    report_mode: str
+    analysis_mode: str
+    chunk_size: int
+    map_reduce_threshold: int
+    max_chunk_concurrency: int
 
 
-provider, model_name = OPENAI_GPT4_MINI.split('/', 1)
 # llm = init_chat_model(model="gpt-4o", temperature=0.7, model_provider="openai")
-llm = init_chat_model(
-    model=model_name,
-    model_provider=provider,
-    temperature=0.7,  # Balanced creativity
-)
-def prompt_recommendation(state: AgentState) -> List[AnyMessage]:
-    # human_filtered = filter_messages(state["messages"], include_types=["human"])
-    # human_content=[msg.content for msg in human_filtered]
-    system_msg = f"""
-你是一名资深医美顾问，以下是医美AI客服与用户的完整多轮对话的所有内容：{state["messages"]}
+llm = routed_chat_model("report", temperature=0.7)  # Balanced creativity
 
+RECOMMENDATION_REPORT_INSTRUCTIONS = """
 请你基于该对话内容，撰写一份专业、结构化的医美客户风险预警与个性化服务建议。该报告将用于门店接待前会议或CRM系统录入，需内容详实、分类清晰、具备执行参考价值，覆盖以下六大核心模块：
 📌 时间线分析要求：(如果有对话时间或者用户提到的时间）
 - 请结合对话时间，评估信息的"新鲜度"，对用户最近表达的信息给予更高权重；
@@ -152,15 +201,8 @@ eg。
 ---------------------------------------------------------------------------------------------------------
 
 """
-    return [{"role": "system", "content": system_msg}]+[{"role": "human", "content": "请你按照上面要求，生成医美客户风险预警与个性化服务建议报告。"}]
-
-def prompt_user_chunk_summary(state: AgentState) -> List[AnyMessage]:
-    human_filtered = filter_messages(state["messages"], include_types=["human"])
-    human_content = [msg.content for msg in human_filtered]
-
-    system_prompt = f"""
-你是一名资深医美顾问，以下是完整多轮沟通内容中所有用户说的话：{human_content}
 
+USER_SUMMARY_REPORT_INSTRUCTIONS = """
 请你基于该对话内容，撰写一份结构化、专业、实用的医美客户信息洞察与接待准备。该报告将用于门店顾问接待前会议或客户管理系统录入，需突出用户特征、沟通风格、项目意图、成交潜力与潜在阻力等关键信息，具备明确的判断结论与执行建议价值。
 📌 时间线分析要求：(如果有对话时间或者用户提到的时间）
 - 请结合对话时间，评估信息的"新鲜度"，对用户最近表达的信息给予更高权重；
@@ -256,15 +298,8 @@ def prompt_user_chunk_summary(state: AgentState) -> List[AnyMessage]:
 ---------------------------------------------------------------------------------------------------------
 
 """
-    return [{"role": "system", "content": system_prompt}]+[{"role": "human", "content": "请你按照上面要求，生成医美客户信息洞察与接待准备报告。"}]
-
-
-def prompt_ai_dialog_style(state: AgentState) -> List[AnyMessage]:
-    ai_filtered = filter_messages(state["messages"], include_types=["ai"])
-    ai_content = [msg.content for msg in ai_filtered]
-    system_msg = f"""
-你是一名语言风格分析专家，以下是医美AI客服与用户的完整多轮沟通内容中所有ai说的话：{ai_content}
 
+AI_STYLE_REPORT_INSTRUCTIONS = """
 请你基于该对话内容，撰写一份结构化、专业、具培训价值的《AI客服对话风格分析报告》。该报告将用于人工客服接待前的沟通风格对齐和服务一致性培训，需突出AI客服在语气表达、策略运用和节奏把控方面的具体表现，并结合原话术举例支撑判断。
 📌 输出要求：
 - 报告语言统一采用正式、专业风格；
@@ -315,45 +350,117 @@ def prompt_ai_dialog_style(state: AgentState) -> List[AnyMessage]:
 ---------------------------------------------------------------------------------------------------------
 
 """
+
+def conversation_context(state: AgentState, include_roles: Sequence[str], description: str) -> str:
+    """生成提示词中的对话部分：超长对话用分段摘要，否则用紧凑的对话记录."""
+    history_summary = state.get("history_summary")
+    if history_summary:
+        context = f"以下是医美AI客服（顾问）与用户（客户）完整多轮对话按时间顺序分段整理的摘要（对话较长，已逐段总结）：\n{history_summary}"
+    elif state.get("incremental"):
+        context = f"以下是上一版报告生成之后新增的对话（{description}中的新增部分）：\n{format_transcript(state['messages'], include_roles=include_roles)}"
+    else:
+        context = f"以下是{description}：\n{format_transcript(state['messages'], include_roles=include_roles)}"
+    prior_section = state.get("prior_section")
+    if prior_section:
+        context += f"\n\n以下是上一版报告中本部分的内容，请结合新增对话更新，保留仍然有效的判断，修正已经变化的信息：\n{prior_section}"
+    return context
+
+def prompt_recommendation(state: AgentState) -> List[AnyMessage]:
+    conversation = conversation_context(state, ("human", "ai"), "医美AI客服（顾问）与用户（客户）的完整多轮对话的所有内容")
+    system_msg = f"你是一名资深医美顾问，{conversation}\n{RECOMMENDATION_REPORT_INSTRUCTIONS}"
+    return [{"role": "system", "content": system_msg}]+[{"role": "human", "content": "请你按照上面要求，生成医美客户风险预警与个性化服务建议报告。"}]
+
+def prompt_user_chunk_summary(state: AgentState) -> List[AnyMessage]:
+    conversation = conversation_context(state, ("human",), "完整多轮沟通内容中所有用户说的话")
+
+    system_prompt = f"你是一名资深医美顾问，{conversation}\n{USER_SUMMARY_REPORT_INSTRUCTIONS}"
+    return [{"role": "system", "content": system_prompt}]+[{"role": "human", "content": "请你按照上面要求，生成医美客户信息洞察与接待准备报告。"}]
+
+
+def prompt_ai_dialog_style(state: AgentState) -> List[AnyMessage]:
+    conversation = conversation_context(state, ("ai",), "医美AI客服与用户的完整多轮沟通内容中所有ai说的话")
+    system_msg = f"你是一名语言风格分析专家，{conversation}\n{AI_STYLE_REPORT_INSTRUCTIONS}"
     return  [{"role": "system", "content": system_msg}]+[{"role": "human", "content": "请你按照上面要求，生成AI客服对话风格分析报告。"}]
 
 
-user_summary_agent = create_react_agent(
-    model=llm,
-    tools=[],
+FUSED_REPORT_SYSTEM_PROMPT = """你是一名资深医美顾问，同时也是语言风格分析专家，{conversation}
+
+请基于以上对话内容一次性撰写以下三份报告，分别填入对应字段：
+- recommendation：第一份《医美客户风险预警与个性化服务建议报告》
+- user_chunk_summary：第二份《医美客户信息洞察与接待准备报告》（侧重用户说的话）
+- ai_dialog_style：第三份《AI客服对话风格分析报告》（侧重AI客服说的话）
+各报告中"本次输出有且只需要……"的要求，指对应字段只包含该报告本身的内容。
+
+=========================== 第一份报告要求（recommendation） ===========================
+{recommendation}
+=========================== 第二份报告要求（user_chunk_summary） ===========================
+{user_summary}
+=========================== 第三份报告要求（ai_dialog_style） ===========================
+{ai_style}
+{prior_reports}"""
+
+def incremental_messages(state: UserAnalysisReportState) -> Optional[List[AnyMessage]]:
+    """增量报告且没有分段摘要时，报告只需要看的新增消息；否则为 None（使用完整对话或摘要）."""
+    if state.get("history_summary"):
+        return None
+    return state.get("new_messages")
+
+def prompt_fused_report(state: UserAnalysisReportState) -> List[AnyMessage]:
+    """fused 模式：对话内容只出现一次，三份报告要求合并到同一个提示词."""
+    new_messages = incremental_messages(state)
+    if new_messages is not None:
+        state = {**state, "messages": new_messages, "incremental": True}
+    conversation = conversation_context(state, ("human", "ai"), "医美AI客服（顾问）与用户（客户）的完整多轮对话的所有内容")
+    prior_sections = state.get("prior_sections") or {}
+    prior_reports = ""
+    if any(prior_sections.values()):
+        prior_reports = "\n以下是上一版的三份报告，请结合新增对话更新，保留仍然有效的判断，修正已经变化的信息：\n" + "\n\n".join(
+            prior_sections.get(key, "") for key in ("recommendation_report", "user_summary_report", "ai_style_report")
+        )
+    system_msg = FUSED_REPORT_SYSTEM_PROMPT.format(
+        conversation=conversation,
+        recommendation=RECOMMENDATION_REPORT_INSTRUCTIONS,
+        user_summary=USER_SUMMARY_REPORT_INSTRUCTIONS,
+        ai_style=AI_STYLE_REPORT_INSTRUCTIONS,
+        prior_reports=prior_reports,
+    )
+    return [{"role": "system", "content": system_msg}, {"role": "human", "content": "请你按照上面要求，一次性生成三份报告。"}]
+
+# 三个分析 agent 都没有工具，报告正文直接由一次结构化输出调用写在对应字段里
+user_summary_agent = create_structured_agent(
+    llm,
+    UserChunkSummaryResponse,
+    prompt_user_chunk_summary,
     name="user_chunk_summary_agent",
-    state_schema=UserSummaryAgentState,
-    response_format=UserChunkSummaryResponse,
-    prompt=prompt_user_chunk_summary,
 )
 
-ai_style_agent = create_react_agent(
-    model=llm,
-    tools=[],
+ai_style_agent = create_structured_agent(
+    llm,
+    AiDialogStyleResponse,
+    prompt_ai_dialog_style,
     name="ai_dialog_style_agent",
-    state_schema=AiStyleAgentState,
-    response_format=AiDialogStyleResponse,
-    prompt=prompt_ai_dialog_style,
 )
 
-recommendation_agent = create_react_agent(
-    model=llm,
-    tools=[],
+recommendation_agent = create_structured_agent(
+    llm,
+    RecommendationResponse,
+    prompt_recommendation,
     name="recommendation_agent",
-    state_schema=RecommendationAgentState,
-    response_format=RecommendationResponse,
-    prompt=prompt_recommendation,
 )
 
 industry_name = "医美"
-async def run_agent_node(agent, state: UserAnalysisAgentState, config: RunnableConfig, messages_override=None):
+async def run_agent_node(agent, state: UserAnalysisAgentState, config: RunnableConfig, messages_override=None, prior_section=None, incremental=False):
 
     try:
-        # 直接传入原始state，让prompt函数处理消息格式和添加分析指令
-        agent_response = await asyncio.to_thread(
-            agent.invoke,
-            state,  # 传入包含原始对话的完整state
-            config
+        # 直接调用异步接口，三个分析分支在同一个事件循环里并发，不再各占一个工作线程
+        agent_response = await agent.ainvoke(
+            {
+                "messages": messages_override if messages_override is not None else state["messages"],
+                "history_summary": state.get("history_summary"),
+                "prior_section": prior_section,
+                "incremental": incremental,
+            },
+            config,
         )
         return {
             "structured_response": agent_response.get("structured_response"),
@@ -363,45 +470,287 @@ async def run_agent_node(agent, state: UserAnalysisAgentState, config: RunnableC
     except Exception as e:
         return {"error_message": str(e)}
 
-async def parallel_analysis_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
-    # 三个 Agent 并行运行
-    results = await asyncio.gather(
-        run_agent_node(recommendation_agent, state, config),
-        run_agent_node(user_summary_agent, state, config),
-        run_agent_node(ai_style_agent, state, config),
+def get_response_text(res: Dict[str, Any], response_field: str) -> str:
+    """从结构化输出中取报告正文."""
+    response = res.get("structured_response")
+    return (getattr(response, response_field, None) or "") if response is not None else ""
+
+async def run_report_section(agent, report_key: str, response_field: str, state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    """运行单个分析 agent，只写回自己的报告字段，错误追加到 errors."""
+    prior_section = (state.get("prior_sections") or {}).get(report_key)
+    new_messages = incremental_messages(state)
+    result = await run_agent_node(
+        agent, state, config,
+        messages_override=new_messages, prior_section=prior_section, incremental=new_messages is not None,
     )
+    update: Dict[str, Any] = {report_key: get_response_text(result, response_field)}
+    if result.get("error_message"):
+        update["errors"] = [f"{agent.name}: {result['error_message']}"]
+    return update
+
+CHUNK_SUMMARY_PROMPT = """
+你是一名资深医美顾问助理。用户会发来医美AI客服（顾问）与用户（客户）长期对话中的一段（第{index}段，共{total}段），按时间顺序排列。
+
+请提炼这一段中的关键信息，供后续撰写客户分析报告使用：
+- 客户基本信息（城市、年龄、职业、家庭等，如有）
+- 关注的部位、意向项目、美学偏好、医生偏好
+- 对价格、优惠、付款方式、时间安排的表达
+- 情绪变化、顾虑、犹豫或不满，以及他人经历对客户的影响
+- 关键时间节点（保留原始日期）
+- 顾问的典型话术与沟通策略（保留1-2句原话）
+只输出要点，没有的项不写，不超过300字。
+"""
 
-    rec_result, summary_result, style_result = results
-
-    def get_last_message_text(res):
-        msgs = res.get("messages", [])
-        if msgs and hasattr(msgs[-1], "content"):
-            return msgs[-1].content
-        elif msgs and isinstance(msgs[-1], dict) and "content" in msgs[-1]:
-            return msgs[-1]["content"]
-        return ""
+DEFAULT_CHUNK_SIZE = 40
+DEFAULT_MAP_REDUCE_THRESHOLD = 120
+DEFAULT_MAX_CHUNK_CONCURRENCY = 8
+
+# 分段摘要缓存：分段从对话开头按固定条数切分，已完整的分段内容不变，下次生成报告时直接命中，只需总结新增消息
+chunk_summary_cache: TTLCache[str] = TTLCache(maxsize=4096)
+
+REPORT_STORE_NAMESPACE = ("user_analysis_reports",)
+REPORT_SECTION_KEYS = ["recommendation_report", "user_summary_report", "ai_style_report"]
+
+def analysis_mode(config: RunnableConfig) -> str:
+    configurable = config.get("configurable", {}) if config else {}
+    return configurable.get("analysis_mode", "auto")
+
+def use_map_reduce(state: UserAnalysisReportState, config: RunnableConfig) -> bool:
+    configurable = config.get("configurable", {}) if config else {}
+    mode = analysis_mode(config)
+    if mode == "map_reduce":
+        return True
+    if mode == "direct":
+        return False
+    threshold = configurable.get("map_reduce_threshold") or DEFAULT_MAP_REDUCE_THRESHOLD
+    return len(state.get("messages") or []) > threshold
+
+def dialog_messages(messages: Sequence[AnyMessage]) -> List[AnyMessage]:
+    """只保留客户和顾问的消息，分段和水位线都基于这个序列."""
+    return [m for m in messages if getattr(m, "type", None) in ("human", "ai")]
+
+def dialog_fingerprint(messages: Sequence[AnyMessage]) -> str:
+    """对话内容指纹：网关每次请求都会重新生成消息ID，因此水位线按内容校验."""
+    return stable_hash([[m.type, format_transcript([m], include_roles=(m.type,))] for m in messages])
+
+def report_store_key(config: RunnableConfig) -> Optional[tuple]:
+    configurable = config.get("configurable", {}) if config else {}
+    customer_id = configurable.get("customer_id")
+    if not customer_id or not configurable.get("incremental", True):
+        return None
+    return (*REPORT_STORE_NAMESPACE, str(customer_id))
+
+async def load_prior_report_node(state: UserAnalysisReportState, config: RunnableConfig, *, store: Optional[BaseStore] = None) -> Dict[str, Any]:
+    """读取该客户上次报告的中间结果，并按水位线判断是否只需处理新增消息."""
+    namespace = report_store_key(config)
+    if namespace is None or store is None:
+        return {}
+    item = await store.aget(namespace, "latest")
+    if item is None:
+        return {}
+
+    prior = item.value
+    dialog = dialog_messages(state.get("messages") or [])
+    watermark_count = prior.get("message_count", 0)
+    if len(dialog) < watermark_count or dialog_fingerprint(dialog[:watermark_count]) != prior.get("watermark"):
+        # 历史被改写（删除/编辑），水位线失效，全量重新生成
+        print(f"[DEBUG] 客户 {namespace[-1]} 的报告水位线失效，全量生成")
+        return {}
+    if len(dialog) == watermark_count:
+        print(f"[DEBUG] 客户 {namespace[-1]} 没有新消息，直接复用上次报告")
+        return {"report_reused": True, "structured_response": prior.get("structured_response"), "error_message": None}
+
+    configurable = config.get("configurable", {}) if config else {}
+    chunk_size = configurable.get("chunk_size") or DEFAULT_CHUNK_SIZE
+    update: Dict[str, Any] = {
+        "prior_report": prior,
+        "prior_sections": prior.get("sections") or {},
+        "new_messages": dialog[watermark_count:],
+    }
+    if prior.get("chunk_size") == chunk_size:
+        update["chunk_summaries"] = prior.get("chunk_summaries") or []
+        update["covered_count"] = prior.get("covered_count") or 0
+    print(f"[DEBUG] 客户 {namespace[-1]} 增量生成，新增 {len(dialog) - watermark_count} 条消息")
+    return update
+
+async def summarize_chunk(transcript: str, index: int, total: int) -> str:
+    key = stable_hash(transcript)
+    cached = chunk_summary_cache.get(key)
+    if cached is not None:
+        return cached
+    # 对话放在用户消息里：只有系统消息的请求会被 google_vertexai / anthropic 拒绝
+    response = await llm.ainvoke([
+        {"role": "system", "content": CHUNK_SUMMARY_PROMPT.format(index=index, total=total)},
+        {"role": "human", "content": transcript},
+    ])
+    summary = response.content if isinstance(response.content, str) else str(response.content)
+    chunk_summary_cache.set(key, summary)
+    return summary
+
+async def summarize_chunks_node(state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    """Map：并行总结各分段；Reduce：按时间顺序合并为 history_summary 供三个报告分支使用.
+
+    已完成的分段从对话开头按固定条数切分，增量报告时复用上次持久化的分段摘要，
+    只总结 covered_count 之后新增的完整分段；不足一段的最新消息直接以原文附在最后。
+    """
+    configurable = config.get("configurable", {}) if config else {}
+    chunk_size = configurable.get("chunk_size") or DEFAULT_CHUNK_SIZE
+    semaphore = asyncio.Semaphore(configurable.get("max_chunk_concurrency") or DEFAULT_MAX_CHUNK_CONCURRENCY)
+    dialog = dialog_messages(state.get("messages") or [])
+    covered_count = state.get("covered_count") or 0
+    prior_summaries = list(state.get("chunk_summaries") or [])
+
+    new_complete = [
+        dialog[i:i + chunk_size]
+        for i in range(covered_count, len(dialog) - chunk_size + 1, chunk_size)
+    ]
+    tail = dialog[covered_count + len(new_complete) * chunk_size:]
+    total = len(prior_summaries) + len(new_complete) + (1 if tail else 0)
+
+    async def _bounded(chunk: List[AnyMessage], index: int) -> Union[str, Exception]:
+        async with semaphore:
+            try:
+                return await summarize_chunk(format_transcript(chunk), index, total)
+            except Exception as e:
+                return e
+
+    results = await asyncio.gather(*(
+        _bounded(chunk, len(prior_summaries) + i)
+        for i, chunk in enumerate(new_complete, 1)
+    ))
+
+    summaries = list(prior_summaries)
+    sections = [f"【第{index}段】\n{summary}" for index, summary in enumerate(prior_summaries, 1)]
+    errors = []
+    persisted = True
+    for index, result in enumerate(results, len(prior_summaries) + 1):
+        if isinstance(result, Exception):
+            errors.append(f"chunk_summary_{index}: {result}")
+            result = "（该段总结失败）"
+            # 失败之后的分段不再记为已完成，保证下次从失败处重新总结
+            persisted = False
+        elif persisted:
+            summaries.append(result)
+        sections.append(f"【第{index}段】\n{result}")
+    if tail:
+        sections.append(f"【最新对话（原文）】\n{format_transcript(tail)}")
+
+    update: Dict[str, Any] = {
+        "history_summary": "\n\n".join(sections),
+        "chunk_summaries": summaries,
+        "covered_count": covered_count + (len(summaries) - len(prior_summaries)) * chunk_size,
+    }
+    if errors:
+        update["errors"] = errors
+    return update
+
+REPORT_SECTION_NODES = ["recommendation_node", "user_summary_node", "ai_style_node"]
+
+def route_report_sections(state: UserAnalysisReportState, config: RunnableConfig) -> Union[str, List[str]]:
+    """fused 模式走单次结构化调用，否则扇出到三个报告分支."""
+    configurable = config.get("configurable", {}) if config else {}
+    if configurable.get("report_mode", "fanout") == "fused":
+        return "fused_report_node"
+    return REPORT_SECTION_NODES
+
+def route_analysis_mode(state: UserAnalysisReportState, config: RunnableConfig) -> Union[str, List[str]]:
+    """没有新消息直接结束；超长对话先分段总结；否则直接生成报告.
+
+    增量报告：上次有分段摘要时接着总结新增分段；上次是直接生成（或显式指定 direct）时
+    只把上一版报告和水位线之后的新增消息交给报告分支，成本与新增消息数成正比。
+    """
+    if state.get("report_reused"):
+        return END
+    if state.get("prior_report"):
+        mode = analysis_mode(config)
+        if mode == "map_reduce" or (mode == "auto" and state.get("chunk_summaries")):
+            return "summarize_chunks_node"
+        return route_report_sections(state, config)
+    if use_map_reduce(state, config):
+        return "summarize_chunks_node"
+    return route_report_sections(state, config)
+
+async def recommendation_node(state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    return await run_report_section(recommendation_agent, "recommendation_report", "recommendation", state, config)
+
+async def user_summary_node(state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    return await run_report_section(user_summary_agent, "user_summary_report", "user_chunk_summary", state, config)
+
+async def ai_style_node(state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    return await run_report_section(ai_style_agent, "ai_style_report", "ai_dialog_style", state, config)
+
+async def fused_report_node(state: UserAnalysisReportState, config: RunnableConfig) -> Dict[str, Any]:
+    """一次结构化输出调用生成三份报告，对话内容只发送一次."""
+    try:
+        structured_llm = llm.with_structured_output(UserAnalysisReportResponse)
+        response = await structured_llm.ainvoke(prompt_fused_report(state), config)
+        return {
+            "recommendation_report": response.recommendation,
+            "user_summary_report": response.user_chunk_summary,
+            "ai_style_report": response.ai_dialog_style,
+        }
+    except Exception as e:
+        return {"errors": [f"fused_report: {e}"]}
 
-    # 取每个 agent 最后一条消息的文本，拼成字符串
+async def combine_reports_node(state: UserAnalysisReportState) -> Dict[str, Any]:
+    # 三个分支全部完成后汇总，按固定顺序拼成字符串
     combined_text = (
-        "\n\n======================\n" + get_last_message_text(rec_result) +
-        "\n\n======================\n" + get_last_message_text(summary_result) +
-        "\n\n======================\n" + get_last_message_text(style_result)
+        "\n\n======================\n" + (state.get("recommendation_report") or "") +
+        "\n\n======================\n" + (state.get("user_summary_report") or "") +
+        "\n\n======================\n" + (state.get("ai_style_report") or "")
     )
+    errors = state.get("errors") or []
     return {
         "structured_response": combined_text,  # 🔥 结构化输出
-        "error_message": None,
-        "messages": []
+        "error_message": "; ".join(errors) if errors else None,
     }
 
-user_analysis_graph = (
+async def save_report_node(state: UserAnalysisReportState, config: RunnableConfig, *, store: Optional[BaseStore] = None) -> Dict[str, Any]:
+    """持久化本次报告的中间结果和水位线，供下次增量生成."""
+    namespace = report_store_key(config)
+    if namespace is None or store is None or state.get("errors"):
+        # 有分支失败时不更新水位线，下次仍按上一版成功的报告增量生成
+        return {}
+    configurable = config.get("configurable", {}) if config else {}
+    dialog = dialog_messages(state.get("messages") or [])
+    await store.aput(namespace, "latest", {
+        "message_count": len(dialog),
+        "watermark": dialog_fingerprint(dialog),
+        "last_message_id": dialog[-1].id if dialog else None,
+        "chunk_size": configurable.get("chunk_size") or DEFAULT_CHUNK_SIZE,
+        "chunk_summaries": state.get("chunk_summaries") or [],
+        "covered_count": state.get("covered_count") or 0,
+        "sections": {key: state.get(key) or "" for key in REPORT_SECTION_KEYS},
+        "structured_response": state.get("structured_response"),
+        "updated_at": datetime.now(tz=ZoneInfo("Asia/Shanghai")).isoformat(),
+    })
+    return {}
+
+user_analysis_builder = (
     StateGraph(
-        UserSummaryAgentState,  # 可以继续用这个 State，AgentState 结构相同即可
+        UserAnalysisReportState,
         input=ChatReplyAgentStateInput,
-        config_schema=RunnableConfig,
+        config_schema=UserAnalysisConfigSchema,
         output=UserAnalysisAgentStateOutput
     )
-    .add_node("parallel_analysis_node", parallel_analysis_node)     # 新并行节点
-    .add_edge(START, "parallel_analysis_node")                      # 从 START 到并行节点
-    .add_edge("parallel_analysis_node", END)                          # 汇总后结束
-    .compile()
+    .add_node("load_prior_report_node", load_prior_report_node)
+    .add_node("summarize_chunks_node", summarize_chunks_node)
+    .add_node("recommendation_node", recommendation_node)
+    .add_node("user_summary_node", user_summary_node)
+    .add_node("ai_style_node", ai_style_node)
+    .add_node("fused_report_node", fused_report_node)
+    .add_edge(START, "load_prior_report_node")
+    # 扇出：增量报告/超长对话先分段总结，再进入三个报告分支（或 fused 单次调用）
+    .add_conditional_edges("load_prior_report_node", route_analysis_mode, ["summarize_chunks_node", "fused_report_node", *REPORT_SECTION_NODES, END])
+    .add_conditional_edges("summarize_chunks_node", route_report_sections, ["fused_report_node", *REPORT_SECTION_NODES])
+    # 扇入：三个分支都完成（或 fused 完成）后汇总
+    .add_node("combine_reports_node", combine_reports_node)
+    .add_edge(REPORT_SECTION_NODES, "combine_reports_node")
+    .add_edge("fused_report_node", "combine_reports_node")
+    .add_node("save_report_node", save_report_node)
+    .add_edge("combine_reports_node", "save_report_node")
+    .add_edge("save_report_node", END)
 )
+
+# 部署到 LangGraph 服务时 store 由服务端注入；本地可用 user_analysis_builder.compile(store=...) 启用增量报告
+user_analysis_graph = user_analysis_builder.compile()
@@ -0,0 +1,33 @@
+"""Request/response graphs served by langgraph.json, each behind request coalescing.
+
+Concurrent identical requests to the same graph (e.g. gateway retries on
+timeout) share one execution; see ``huanmu_agent.utils.coalesce``. The
+original compiled graphs in each module are unchanged and can still be
+imported directly.
+
+The multi-turn ``agent`` graph keeps its original entry: its nodes read state
+from earlier turns of the thread, which a re-run from the request input cannot
+reproduce.
+"""
+
+from huanmu_agent.analysis_report.user_analysis_reports_v1 import user_analysis_graph
+from huanmu_agent.Post_Comments.comment_v2 import batch_comment_graph, comment_analysis_graph
+from huanmu_agent.rag.workflow.doc_deleting import doc_deleting_workflow
+from huanmu_agent.rag.workflow.doc_ingestion import doc_ingestion_workflow
+from huanmu_agent.sales.sale_advice_agent import sales_chat_suggestion_graph
+from huanmu_agent.user_profile.combined_profile_agent import combined_profile_graph
+from huanmu_agent.user_profile.label_agent import profile_label_graph
+from huanmu_agent.user_profile.profile_agent import profile_graph
+from huanmu_agent.utils.coalesce import coalesce_graph
+from huanmu_agent.wechat.moment_agent import wechat_moment_graph
+
+wechat_moment_agent = coalesce_graph(wechat_moment_graph, "wechat_moment_agent")
+sales_chat_suggestion_agent = coalesce_graph(sales_chat_suggestion_graph, "sales_chat_suggestion_agent")
+user_analysis_reports_agent = coalesce_graph(user_analysis_graph, "user_analysis_reports_agent")
+profile_label_agent = coalesce_graph(profile_label_graph, "profile_label_agent")
+profile_agent = coalesce_graph(profile_graph, "profile_agent")
+combined_profile_agent = coalesce_graph(combined_profile_graph, "combined_profile_agent")
+doc_ingestion = coalesce_graph(doc_ingestion_workflow, "doc_ingestion")
+doc_deleting = coalesce_graph(doc_deleting_workflow, "doc_deleting")
+friend_post_comment_agent = coalesce_graph(comment_analysis_graph, "friend_post_comment_agent")
+friend_post_comment_batch_agent = coalesce_graph(batch_comment_graph, "friend_post_comment_batch_agent")
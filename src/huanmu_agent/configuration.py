@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
-from typing import Annotated
+from typing import Annotated, Optional
 
 from langchain_core.runnables import ensure_config
 from langgraph.config import get_config
@@ -40,6 +40,30 @@ class Configuration:
     
    
 
+    hedge_enabled: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to hedge the triage and main model calls: if no first token "
+            "arrives within hedge_percentile of recent first-token latencies, a duplicate request "
+            "is sent and the first responder wins."
+        },
+    )
+
+    hedge_percentile: float = field(
+        default=95.0,
+        metadata={
+            "description": "First-token latency percentile to wait before sending the hedged request."
+        },
+    )
+
+    hedge_backup_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Model for the hedged request, in the form provider/model-name. "
+            "Defaults to the primary model."
+        },
+    )
+
     # max_search_results: int = field(
     #     default=10,
     #     metadata={
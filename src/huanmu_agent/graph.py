@@ -5,10 +5,10 @@ Works with a chat model with tool calling support.
 
 import asyncio
 from datetime import UTC, datetime
-from typing import Dict, List, Literal, cast, Any
+from typing import Dict, List, Literal, Sequence, cast, Any
 from zoneinfo import ZoneInfo
 
-from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, ToolMessage, HumanMessage, SystemMessage, message_chunk_to_message
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
 
@@ -16,7 +16,28 @@ from huanmu_agent.configuration import Configuration
 from huanmu_agent.prompts import TRIAGE_SYSTEM_PROMPT
 from huanmu_agent.state import InputState, State, SalesAgentStateOutput, HumanControlState
 from huanmu_agent.tools import TOOLS, request_human_assistance
-from huanmu_agent.utils.langchain_utils import load_chat_model
+from huanmu_agent.utils.hedging import hedged_invoke
+from huanmu_agent.utils.model_router import routed_chat_model
+
+
+async def invoke_chat_model(
+    task: str, temperature: float, tools: Sequence[Any], messages: List[Any], configuration: Configuration
+) -> AIMessage:
+    """Call the routed model for ``task``, hedging on a slow first token when enabled."""
+    model = routed_chat_model(task, temperature, primary=configuration.model).bind_tools(tools)
+    if not configuration.hedge_enabled:
+        return cast(AIMessage, await asyncio.to_thread(model.invoke, messages))
+    backup_model = configuration.hedge_backup_model or configuration.model
+    backup = routed_chat_model(task, temperature, primary=backup_model).bind_tools(tools)
+    response = await hedged_invoke(
+        model,
+        messages,
+        backup=backup,
+        key=f"{task}:{configuration.model}",
+        percentile=configuration.hedge_percentile,
+    )
+    # Streaming returns an AIMessageChunk; store a plain AIMessage in the state
+    return cast(AIMessage, message_chunk_to_message(response))
 
 # Define the new routing node
 async def route_to_human_or_ai(state: State) -> Dict[str, Any]:
@@ -63,16 +84,12 @@ async def route_to_human_or_ai(state: State) -> Dict[str, Any]:
         return {"last_message": ""}
         
     configuration = Configuration.from_context()
-    triage_model = load_chat_model(configuration.model, 0.0).bind_tools(
-        [request_human_assistance]
-    )
-    
-    response = cast(
-        AIMessage,
-        await asyncio.to_thread(
-            triage_model.invoke,
-            [{"role": "system", "content": TRIAGE_SYSTEM_PROMPT}, state.messages[-1]],
-        ),
+    response = await invoke_chat_model(
+        "triage",
+        0.0,
+        [request_human_assistance],
+        [{"role": "system", "content": TRIAGE_SYSTEM_PROMPT}, state.messages[-1]],
+        configuration,
     )
     
     # If the router decides to call a tool, it means we need human assistance.
@@ -129,9 +146,6 @@ async def call_model(state: State) -> Dict[str, Any]:
         
     configuration = Configuration.from_context()
 
-    # Initialize the model with tool binding in a background thread to avoid blocking.
-    model = load_chat_model(configuration.model, configuration.temperature).bind_tools(TOOLS)
-
     def _prepare_system_message():
         # Use Beijing time (UTC+8) instead of UTC and append the current time in Chinese.
         beijing_now = datetime.now(tz=ZoneInfo("Asia/Shanghai")).isoformat()
@@ -144,12 +158,12 @@ async def call_model(state: State) -> Dict[str, Any]:
 
     cleaned_messages = state.messages
     # Get the model's response using cleaned messages
-    response = cast(
-        AIMessage,
-        await asyncio.to_thread(
-            model.invoke,
-            [{"role": "system", "content": system_message}, *cleaned_messages],
-        ),
+    response = await invoke_chat_model(
+        "main_reply",
+        configuration.temperature,
+        TOOLS,
+        [{"role": "system", "content": system_message}, *cleaned_messages],
+        configuration,
     )
 
     # Handle the case when it's the last step and the model still wants to use a tool
@@ -0,0 +1,179 @@
+"""离线批处理后端 - 通过提供方的异步 Batch API 执行非实时任务.
+
+画像、标签、分析报告这类夜间任务不关心延迟，走 Batch API 价格更低，
+也不占用实时接口的速率配额。流程：
+
+1. ``BatchJob.build_messages`` 用与在线 graph 相同的提示词构建每条请求；
+2. 所有请求写成一个 JSONL 文件上传，创建 batch；
+3. 轮询 batch 状态直到结束；
+4. 下载结果文件，用 ``BatchJob.to_output`` 映射回与 graph 相同的输出结构。
+
+客户端按 OpenAI SDK 的异步接口鸭子类型调用（files.create / batches.create /
+batches.retrieve / files.content），测试时可以换成本地的假客户端。
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from langchain_core.messages import convert_to_openai_messages
+from langchain_core.utils.function_calling import convert_to_openai_function
+from pydantic import BaseModel
+
+from constant import OPENAI_GPT4_MINI
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+DEFAULT_POLL_INTERVAL = 30.0
+DEFAULT_COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+BatchItem = Tuple[str, Dict[str, Any]]
+
+
+@dataclass
+class BatchJob:
+    """一种可以离线执行的 graph.
+
+    Attributes:
+        name: 任务名，与 langgraph.json 中的 graph 名一致
+        build_messages: 由 graph 输入构建发送给模型的消息（与在线提示词相同）
+        response_model: 结构化输出的 Pydantic 模型
+        to_output: 把解析后的结构化输出映射回 graph 的输出
+    """
+
+    name: str
+    build_messages: Callable[[Dict[str, Any]], Sequence[Any]]
+    response_model: Type[BaseModel]
+    to_output: Callable[[BaseModel], Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+    temperature: float = 0.7
+    strict: bool = False  # 约束解码：输出严格符合 schema（如枚举标签）
+
+
+def response_format_for(model: Type[BaseModel], strict: bool = False) -> Dict[str, Any]:
+    """把 Pydantic 模型转换成 chat completions 的 json_schema response_format."""
+    if strict:
+        function = convert_to_openai_function(model, strict=True)
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": function["name"], "schema": function["parameters"], "strict": True},
+        }
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": model.model_json_schema(), "strict": False},
+    }
+
+
+class BatchFailedError(RuntimeError):
+    """batch 以 failed / expired / cancelled 结束."""
+
+
+class OpenAIBatchBackend:
+    """通过 OpenAI Batch API 执行 BatchJob."""
+
+    def __init__(
+        self,
+        client: Any = None,
+        *,
+        model: Optional[str] = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        completion_window: str = DEFAULT_COMPLETION_WINDOW,
+    ) -> None:
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI()
+        self.client = client
+        self.model = model or OPENAI_GPT4_MINI.split("/", 1)[1]
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def build_request(self, job: BatchJob, custom_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """构建 batch 输入文件中的一行."""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": CHAT_COMPLETIONS_ENDPOINT,
+            "body": {
+                "model": self.model,
+                "temperature": job.temperature,
+                "messages": convert_to_openai_messages(list(job.build_messages(state))),
+                "response_format": response_format_for(job.response_model, job.strict),
+            },
+        }
+
+    async def submit(self, job: BatchJob, items: Sequence[BatchItem]) -> str:
+        """上传请求文件并创建 batch，返回 batch id."""
+        custom_ids = [custom_id for custom_id, _ in items]
+        if len(set(custom_ids)) != len(custom_ids):
+            raise ValueError("batch 内 custom_id 不能重复")
+        lines = [json.dumps(self.build_request(job, custom_id, state), ensure_ascii=False) for custom_id, state in items]
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        input_file = await self.client.files.create(file=(f"{job.name}.jsonl", payload), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_ENDPOINT,
+            completion_window=self.completion_window,
+            metadata={"job": job.name},
+        )
+        print(f"[DEBUG] 已提交 batch {batch.id}: {job.name}, {len(items)} 条请求")
+        return batch.id
+
+    async def wait(self, batch_id: str, timeout: Optional[float] = None) -> Any:
+        """轮询直到 batch 结束，返回最终的 batch 对象."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if batch.status in TERMINAL_STATUSES:
+                print(f"[DEBUG] batch {batch_id} 结束: {batch.status}")
+                return batch
+            if deadline and loop.time() >= deadline:
+                raise TimeoutError(f"batch {batch_id} 在 {timeout} 秒内未完成，当前状态: {batch.status}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _read_file(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        content = await self.client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    async def _parse_line(self, job: BatchJob, line: Dict[str, Any]) -> Dict[str, Any]:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error") or response
+            return {"error_message": json.dumps(error, ensure_ascii=False)}
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+            parsed = job.response_model.model_validate_json(content)
+            output = job.to_output(parsed)
+            if asyncio.iscoroutine(output):
+                output = await output
+            return output
+        except Exception as e:
+            return {"error_message": f"结果解析失败: {e}"}
+
+    async def collect(self, job: BatchJob, batch: Any, custom_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """下载结果并映射回 graph 输出；没有结果的请求返回 error_message."""
+        if batch.status != "completed":
+            raise BatchFailedError(f"batch {batch.id} 状态为 {batch.status}")
+        results: Dict[str, Dict[str, Any]] = {}
+        for line in await self._read_file(batch.output_file_id) + await self._read_file(getattr(batch, "error_file_id", None)):
+            results[line["custom_id"]] = await self._parse_line(job, line)
+        for custom_id in custom_ids:
+            results.setdefault(custom_id, {"error_message": "batch 结果中缺少该请求"})
+        return results
+
+    async def run(self, job: BatchJob, items: Sequence[BatchItem], timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """提交、等待并收集一个 batch.
+
+        Args:
+            job: 要执行的任务
+            items: (custom_id, graph 输入) 列表，custom_id 通常是客户 id
+            timeout: 等待上限（秒），默认一直等到 batch 结束
+
+        Returns:
+            custom_id -> graph 输出（失败时为 {"error_message": ...}）
+        """
+        batch_id = await self.submit(job, items)
+        batch = await self.wait(batch_id, timeout=timeout)
+        return await self.collect(job, batch, [custom_id for custom_id, _ in items])
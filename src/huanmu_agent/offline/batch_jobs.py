@@ -0,0 +1,97 @@
+"""可以走 Batch API 离线执行的 graph.
+
+每个 BatchJob 复用在线 graph 的提示词和结构化输出模型，结果映射成与
+``graph.ainvoke`` 相同的输出。分析报告使用 fused 模式（一次调用生成三份报告）。
+
+用法:
+    PYTHONPATH=src:. python -m huanmu_agent.offline.batch_jobs profile_label_agent inputs.jsonl results.jsonl
+
+输入 JSONL 每行: {"custom_id": "...", "input": {"messages": [...]}}
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from huanmu_agent.analysis_report.user_analysis_reports_v1 import (
+    UserAnalysisReportResponse,
+    combine_reports_node,
+    prompt_fused_report,
+)
+from huanmu_agent.offline.batch_backend import BatchJob, OpenAIBatchBackend
+from huanmu_agent.user_profile import label_agent, profile_agent
+from huanmu_agent.user_profile.label_vocabulary import enum_labels_to_fields
+
+
+async def report_to_output(response: UserAnalysisReportResponse) -> Dict[str, Any]:
+    return await combine_reports_node({
+        "recommendation_report": response.recommendation,
+        "user_summary_report": response.user_chunk_summary,
+        "ai_style_report": response.ai_dialog_style,
+    })
+
+
+PROFILE_JOB = BatchJob(
+    name="profile_agent",
+    build_messages=lambda state: profile_agent.build_profile_prompt(state, {}),
+    response_model=profile_agent.ProfileAgentResponseFormat,
+    to_output=lambda response: {"structured_response": response},
+)
+
+def label_to_output(labels: BaseModel) -> Dict[str, Any]:
+    profile = label_agent.UserProfileStructure(**enum_labels_to_fields(labels))
+    return {"structured_response": label_agent.ProfileLabelAgentResponseFormat(user_profile_label=profile)}
+
+
+# 标签任务使用枚举 schema + strict 约束解码，与在线 openai 默认路径一致
+PROFILE_LABEL_JOB = BatchJob(
+    name="profile_label_agent",
+    build_messages=label_agent.build_constrained_profile_prompt,
+    response_model=label_agent.ProfileLabelEnums,
+    to_output=label_to_output,
+    strict=True,
+)
+
+USER_ANALYSIS_REPORTS_JOB = BatchJob(
+    name="user_analysis_reports_agent",
+    build_messages=prompt_fused_report,
+    response_model=UserAnalysisReportResponse,
+    to_output=report_to_output,
+)
+
+BATCH_JOBS: Dict[str, BatchJob] = {
+    job.name: job for job in (PROFILE_JOB, PROFILE_LABEL_JOB, USER_ANALYSIS_REPORTS_JOB)
+}
+
+
+def _jsonable(output: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value.model_dump() if hasattr(value, "model_dump") else value for key, value in output.items()}
+
+
+async def run_offline(job_name: str, input_path: str, output_path: str, *, timeout: Optional[float] = None) -> int:
+    """读取输入 JSONL，走 Batch API 执行并写出 {"custom_id", "output"} JSONL."""
+    job = BATCH_JOBS[job_name]
+    with open(input_path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    items = [(str(row["custom_id"]), row["input"]) for row in rows]
+    results = await OpenAIBatchBackend().run(job, items, timeout=timeout)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for custom_id, _ in items:
+            f.write(json.dumps({"custom_id": custom_id, "output": _jsonable(results[custom_id])}, ensure_ascii=False) + "\n")
+    return len(items)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="通过 Batch API 离线执行 graph")
+    parser.add_argument("job", choices=sorted(BATCH_JOBS))
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--timeout", type=float, default=None, help="等待上限（秒）")
+    args = parser.parse_args()
+    asyncio.run(run_offline(args.job, args.input, args.output, timeout=args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 import operator
 import os
 from typing import TypedDict, Annotated, List
@@ -24,7 +25,7 @@ class GraphState(GraphStateInput):
     error: str
     messages: Annotated[List[BaseMessage], operator.add]
 
-def ingest_doc_node(state: GraphState):
+async def ingest_doc_node(state: GraphState):
     """
     Downloads the document from the URL provided in the state.
 
@@ -37,11 +38,12 @@ def ingest_doc_node(state: GraphState):
     print("---DOWNLOADING DOCUMENT---")
     try:
         file_url = state['file_url']
-        local_path = download_doc(file_url)
+        local_path = await download_doc(file_url)
         print(f"---DOCUMENT DOWNLOADED to {local_path}---")
-        chunked_docs = load_and_chunk_word_document(local_path)
+        # 解析、向量化、写入 Milvus 都是同步阻塞调用，放到线程池避免阻塞事件循环
+        chunked_docs = await asyncio.to_thread(load_and_chunk_word_document, local_path)
         page_contents = [doc.page_content for doc in chunked_docs]
-        doc_vectors = embedding_docs(page_contents)
+        doc_vectors = await asyncio.to_thread(embedding_docs, page_contents)
         data = [
         {
             "vector": doc_vectors[i],
@@ -51,9 +53,10 @@ def ingest_doc_node(state: GraphState):
         for i, doc in enumerate(chunked_docs)
     ]
 
-        res = milvus_client.insert(
+        res = await asyncio.to_thread(
+            milvus_client.insert,
             collection_name="company_info_primary_key",
-            data=data,      
+            data=data,
         )
         # delete the local fileq
         os.remove(local_path)
@@ -2,15 +2,17 @@ from langchain_core.messages import AnyMessage
 from pydantic import BaseModel, Field
 from typing_extensions import Annotated, TypedDict
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langgraph.prebuilt import create_react_agent
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from langchain.chat_models import init_chat_model
 from typing import List, Optional, Sequence
 from langchain_core.runnables import RunnableConfig
-import asyncio
-from constant import OPENAI_GPT4_MINI
+from langgraph.config import get_stream_writer
+from huanmu_agent.utils.model_router import routed_chat_model
+from huanmu_agent.utils.cache import TTLCache, stable_hash
+from huanmu_agent.utils.langchain_utils import get_message_text
+from huanmu_agent.utils.single_flight import SingleFlight
+from huanmu_agent.utils.structured_output import create_structured_agent
 
 # --- System Prompt ---
 
@@ -49,20 +51,19 @@ class ChatReplyAgentState(AgentState):
 
 class ChatReplyConfigSchema(TypedDict):
     number: int
+    # 流式模式：每条建议生成完整后立即通过 stream_mode="custom" 推送
+    stream_suggestions: bool
+    # 是否使用结果缓存（默认开启）；"换一批"之类需要新结果的请求传 False
+    use_cache: bool
     
 class ChatReplyAgentStateInput(TypedDict):
-    Annotated[Sequence[BaseMessage], add_messages]
+    messages: Annotated[Sequence[BaseMessage], add_messages]
 
 class ChatReplyAgentOutput(TypedDict):
     structured_response: Optional[FinalChatReplyResponseFormat]
 
-provider, model_name = OPENAI_GPT4_MINI.split('/', 1)
 # Initialize chat model (reuse constant to avoid import issues)
-chat_model = init_chat_model(
-    model=model_name,
-    model_provider=provider,
-    temperature=0.7,  # Balanced creativity
-)
+chat_model = routed_chat_model("suggestion", temperature=0.7)  # Balanced creativity
 # Prompt builder
 
 def prompt(state: AgentState, config: RunnableConfig) -> List[AnyMessage]:
@@ -71,16 +72,71 @@ def prompt(state: AgentState, config: RunnableConfig) -> List[AnyMessage]:
     return [{"role": "system", "content": system_msg_content}] + state["messages"] + [{"role": "user", "content": "根据对话记录，请帮我生成销售或客服人员的聊天回复。"}]
 
 
-# Create agent
-chat_reply_generator_agent = create_react_agent(
-    model=chat_model,
-    tools=[],  # No external tools needed for this agent
+# Streaming: a JSON-schema dict (instead of the Pydantic class) makes the parser
+# yield partial dicts as tokens arrive, so finished suggestions can be emitted early.
+streaming_reply_model = chat_model.with_structured_output(
+    FinalChatReplyResponseFormat.model_json_schema(), method="json_schema"
+)
+
+
+async def stream_chat_reply_suggestions(messages: List[AnyMessage], config: RunnableConfig) -> FinalChatReplyResponseFormat:
+    """Stream the structured output and emit each suggestion once it is complete.
+
+    A suggestion is complete when the next one has started or the stream ends.
+    Each is sent to the stream writer as ``{"index": i, "suggestion": {...}}``.
+    """
+    writer = get_stream_writer()
+    emitted = 0
+    latest: dict = {}
+    async for partial in streaming_reply_model.astream(messages, config):
+        if not isinstance(partial, dict):
+            continue
+        latest = partial
+        suggestions = partial.get("suggestions") or []
+        while emitted < len(suggestions) - 1:
+            writer({"index": emitted, "suggestion": ChatReplyStructure(**suggestions[emitted]).model_dump()})
+            emitted += 1
+    final = FinalChatReplyResponseFormat(**latest) if latest else FinalChatReplyResponseFormat(suggestions=[])
+    for index in range(emitted, len(final.suggestions)):
+        writer({"index": index, "suggestion": final.suggestions[index].model_dump()})
+    return final
+
+
+# Create agent: no tools, so a single structured-output call is enough
+chat_reply_generator_agent = create_structured_agent(
+    chat_model,
+    FinalChatReplyResponseFormat,
+    prompt,
     name="chat_reply_generator_agent",
-    state_schema=ChatReplyAgentState,
-    config_schema=ChatReplyConfigSchema,
-    response_format=FinalChatReplyResponseFormat,
-    prompt=prompt,
 )
+# --- Result cache ---
+
+# Repeated clicks on an unchanged conversation reuse the last result for a short
+# while; concurrent identical requests share one LLM call.
+SUGGESTION_CACHE_TTL = 60.0
+SUGGESTION_CACHE_WINDOW = 20
+suggestion_cache: TTLCache[FinalChatReplyResponseFormat] = TTLCache(maxsize=2048, ttl=SUGGESTION_CACHE_TTL)
+suggestion_flight = SingleFlight()
+
+
+def suggestion_cache_key(messages: Sequence, reply_number: int) -> str:
+    """Hash of the last SUGGESTION_CACHE_WINDOW messages plus the requested number."""
+    window = []
+    for msg in list(messages)[-SUGGESTION_CACHE_WINDOW:]:
+        if isinstance(msg, BaseMessage):
+            window.append((msg.type, get_message_text(msg)))
+        elif isinstance(msg, dict):
+            window.append((msg.get("role") or msg.get("type"), str(msg.get("content", ""))))
+    return stable_hash({"messages": window, "number": reply_number})
+
+
+def emit_suggestions(response: FinalChatReplyResponseFormat) -> None:
+    """Send every suggestion of a cached result to the custom stream at once."""
+    writer = get_stream_writer()
+    for index, suggestion in enumerate(response.suggestions):
+        writer({"index": index, "suggestion": suggestion.model_dump()})
+
+
 # --- Agent Node ---
 
 async def chat_reply_agent_node(state: ChatReplyAgentState, config: RunnableConfig):
@@ -102,19 +158,54 @@ async def chat_reply_agent_node(state: ChatReplyAgentState, config: RunnableConf
         new_current_conversation_messages = system_msg + user_msg
     else:
         new_current_conversation_messages = current_conversation_messages
-    try:
+    stream = config["configurable"].get("stream_suggestions", False)
+    use_cache = config["configurable"].get("use_cache", True)
+    cache_key = suggestion_cache_key(current_conversation_messages, reply_number)
 
-        # Run blocking agent in a thread
-        agent_response = await asyncio.to_thread(
-            chat_reply_generator_agent.invoke,
+    async def generate() -> Optional[FinalChatReplyResponseFormat]:
+        agent_response = await chat_reply_generator_agent.ainvoke(
             {"messages": new_current_conversation_messages},
             config,
         )
-        
         print(f"agent_response: {agent_response}")
+        structured_response = agent_response.get("structured_response")
+        if use_cache and structured_response is not None:
+            suggestion_cache.set(cache_key, structured_response)
+        return structured_response
+
+    streamed = False
+
+    async def generate_streaming() -> FinalChatReplyResponseFormat:
+        # Runs only for the request that leads the flight; it streams to its own writer
+        nonlocal streamed
+        streamed = True
+        structured_response = await stream_chat_reply_suggestions(
+            prompt({"messages": new_current_conversation_messages}, config), config
+        )
+        if use_cache:
+            suggestion_cache.set(cache_key, structured_response)
+        return structured_response
+
+    try:
+        structured_response = suggestion_cache.get(cache_key) if use_cache else None
+        if structured_response is not None:
+            print(f"suggestion cache hit: {suggestion_cache.stats()}")
+            if stream:
+                emit_suggestions(structured_response)
+        elif stream and use_cache:
+            # Followers of an in-flight request get all suggestions once it finishes
+            structured_response = await suggestion_flight.do(cache_key, generate_streaming)
+            if not streamed and structured_response is not None:
+                emit_suggestions(structured_response)
+        elif stream:
+            structured_response = await generate_streaming()
+        elif use_cache:
+            structured_response = await suggestion_flight.do(cache_key, generate)
+        else:
+            structured_response = await generate()
 
         return {
-            "structured_response": agent_response.get("structured_response"),
+            "structured_response": structured_response,
             "error_message": None,
             "messages": current_conversation_messages,
         }
@@ -6,14 +6,19 @@ These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
 """
 
-from typing import Any, Callable, List, Optional, cast
+from typing import Any, Callable, Dict, List, Optional, cast
 import datetime
+import os
+import unicodedata
 import zoneinfo
 from langchain_core.tools import tool
 from langgraph.types import interrupt
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from huanmu_agent.configuration import Configuration
+from huanmu_agent.utils import http_client
+from huanmu_agent.utils.cache import TTLCache
+from huanmu_agent.utils.single_flight import SingleFlight
 
 
 @tool
@@ -107,6 +112,79 @@ async def resume_ai_control(reason: str = "人工处理完成") -> str:
     return f"人工处理已完成，恢复AI控制。恢复时间：{time_str}，原因：{reason}"
 
 
+# 热门问题（如热门项目价格）在不同客户之间大量重复，搜索结果按规范化后的查询缓存
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_TIMEOUT = 30.0
+
+search_cache: TTLCache[List[Dict[str, Any]]] = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+search_flight = SingleFlight()
+
+_QUERY_TRAILING_PUNCTUATION = "?？。.!！~～,，;；、 "
+
+
+def normalize_search_query(query: str) -> str:
+    """规范化查询：全角转半角、小写、合并空白、去掉结尾标点."""
+    normalized = unicodedata.normalize("NFKC", query).lower()
+    normalized = " ".join(normalized.split())
+    return normalized.rstrip(_QUERY_TRAILING_PUNCTUATION)
+
+
+async def tavily_search(query: str, max_results: int) -> List[Dict[str, Any]]:
+    """调用 Tavily 搜索接口，复用共享的 HTTP 连接池."""
+    api_key = os.environ.get("TAVILY_API_KEY")
+    if not api_key:
+        raise RuntimeError("未配置 TAVILY_API_KEY")
+    response = await http_client.post_json(
+        TAVILY_SEARCH_URL,
+        {
+            "query": query,
+            "max_results": max_results,
+            "search_depth": "advanced",  # 更深入的搜索
+            "include_answer": True,  # 包含AI生成的答案
+            "include_raw_content": False,  # 不包含原始内容以节省空间
+        },
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=SEARCH_TIMEOUT,
+    )
+    return response.get("results") or []
+
+
+async def cached_search(query: str, max_results: int) -> List[Dict[str, Any]]:
+    """带缓存的搜索：命中缓存直接返回，并发的相同查询只请求一次；失败结果不缓存."""
+    key = (normalize_search_query(query), max_results)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    async def fetch() -> List[Dict[str, Any]]:
+        fetched = await tavily_search(query, max_results)
+        search_cache.set(key, fetched)
+        return fetched
+
+    return await search_flight.do(key, fetch)
+
+
+def format_search_results(search_results: List[Dict[str, Any]], max_results: int) -> str:
+    if not search_results:
+        return "未找到相关的网络信息。"
+    formatted_results = "🌐 网络搜索结果：\n\n"
+    for i, result in enumerate(search_results[:max_results], 1):
+        title = result.get("title", "无标题")
+        content = result.get("content", "")
+        url = result.get("url", "")
+        # 限制内容长度，防止输出过长
+        if len(content) > 200:
+            content = content[:200] + "..."
+        formatted_results += f"{i}. {title}\n"
+        formatted_results += f"   {content}\n"
+        if url:
+            formatted_results += f"   来源: {url}\n"
+        formatted_results += "\n"
+    return formatted_results
+
+
 @tool
 async def search_web(query: str) -> str:
     """
@@ -122,41 +200,14 @@ async def search_web(query: str) -> str:
     返回：
         str: 搜索结果的简要摘要，或错误提示信息
     异常处理：
-        - 如果未安装Tavily依赖，返回安装提示
+        - 如果未配置 TAVILY_API_KEY，返回配置提示
         - 其它异常返回详细错误信息，便于排查
     """
     try:
-        from langchain_community.tools.tavily_search import TavilySearchResults
-        
         configuration = Configuration.from_context()
-        # 创建Tavily搜索工具，参数可根据配置灵活调整
-        tavily_search = TavilySearchResults(
-            max_results=getattr(configuration, 'max_search_results', 3),
-            search_depth="advanced",  # 更深入的搜索
-            include_answer=True,      # 包含AI生成的答案
-            include_raw_content=False, # 不包含原始内容以节省空间
-        )
-        # 执行异步搜索
-        search_results = await tavily_search.ainvoke({"query": query})
-        # 格式化搜索结果
-        if not search_results:
-            return "未找到相关的网络信息。"
-        formatted_results = "🌐 网络搜索结果：\n\n"
-        for i, result in enumerate(search_results[:getattr(configuration, 'max_search_results', 3)], 1):
-            title = result.get("title", "无标题")
-            content = result.get("content", "")
-            url = result.get("url", "")
-            # 限制内容长度，防止输出过长
-            if len(content) > 200:
-                content = content[:200] + "..."
-            formatted_results += f"{i}. {title}\n"
-            formatted_results += f"   {content}\n"
-            if url:
-                formatted_results += f"   来源: {url}\n"
-            formatted_results += "\n"
-        return formatted_results
-    except ImportError:
-        return "❌ Tavily搜索功能未安装。请安装 tavily-python 包。"
+        max_results = getattr(configuration, 'max_search_results', 3)
+        search_results = await cached_search(query, max_results)
+        return format_search_results(search_results, max_results)
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
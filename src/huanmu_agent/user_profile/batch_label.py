@@ -0,0 +1,294 @@
+"""批量用户画像标签 - CRM 夜间刷新时对大量客户批量打标签.
+
+输入是 (customer_id, messages) 记录流，按有限并发调用 ``profile_label_graph``，
+每个模型提供方共用一个限流器；每完成一个客户就追加一行到 JSONL 结果文件，
+进程崩溃后用同一个结果文件重跑会跳过已经成功的客户。
+
+用法:
+    PYTHONPATH=src:. python -m huanmu_agent.user_profile.batch_label customers.jsonl labels.jsonl \
+        [--concurrency 16] [--rps 5] [--parquet labels.parquet]
+
+输入 JSONL 每行: {"customer_id": "...", "messages": [{"role": "user", "content": "..."}, ...]}
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from huanmu_agent.user_profile.label_agent import label_provider, profile_label_graph
+
+try:  # Parquet 导出需要安装 pyarrow，没有时只输出 JSONL
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DEFAULT_CONCURRENCY = int(os.environ.get("LABEL_BATCH_CONCURRENCY", "16"))
+# 每个提供方的默认每秒请求数，可用 LABEL_RPS_<PROVIDER>（如 LABEL_RPS_OPENAI）覆盖
+DEFAULT_REQUESTS_PER_SECOND = float(os.environ.get("LABEL_BATCH_RPS", "5"))
+DEFAULT_MAX_RETRIES = 3
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+LabelRecord = Tuple[str, List[Any]]
+LabelFn = Callable[[List[Any]], Awaitable[Dict[str, Any]]]
+
+# 按提供方共享限流器：同一进程内多个批任务也不会超过提供方的速率上限
+_rate_limiters: Dict[str, InMemoryRateLimiter] = {}
+
+
+def get_rate_limiter(provider: str, requests_per_second: Optional[float] = None) -> InMemoryRateLimiter:
+    """返回某个模型提供方的共享限流器."""
+    if provider not in _rate_limiters:
+        rps = requests_per_second or float(
+            os.environ.get(f"LABEL_RPS_{provider.upper()}", DEFAULT_REQUESTS_PER_SECOND)
+        )
+        _rate_limiters[provider] = InMemoryRateLimiter(
+            requests_per_second=rps,
+            check_every_n_seconds=0.05,
+            max_bucket_size=max(1, rps),
+        )
+    return _rate_limiters[provider]
+
+
+@dataclass
+class BatchLabelStats:
+    """批任务计数."""
+
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        done = self.succeeded + self.failed
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 2),
+            "customers_per_second": round(done / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+def read_records_jsonl(path: str) -> Iterator[LabelRecord]:
+    """逐行读取输入文件，不会一次性把所有客户加载到内存."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield str(record["customer_id"]), record.get("messages") or []
+
+
+def load_completed_ids(output_path: str) -> Set[str]:
+    """读取已有结果文件中成功的客户，并截掉崩溃时写了一半的最后一行."""
+    completed: Set[str] = set()
+    if not os.path.exists(output_path):
+        return completed
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                result = json.loads(raw)
+            except json.JSONDecodeError:
+                break
+            valid_size += len(raw)
+            if result.get("status") == STATUS_OK:
+                completed.add(result["customer_id"])
+    if valid_size != os.path.getsize(output_path):
+        print(f"[DEBUG] 结果文件末尾不完整，截断到 {valid_size} 字节: {output_path}")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_size)
+    return completed
+
+
+async def label_customer(messages: List[Any]) -> Dict[str, Any]:
+    """调用 profile_label_graph 为单个客户生成标签；失败时异常信息为 graph 的 error_message."""
+    # error_message 不在 graph 的输出 schema 里，显式取回，最终的错误行才能带上原始错误
+    result = await profile_label_graph.ainvoke(
+        {"messages": messages}, output_keys=["structured_response", "error_message"]
+    )
+    response = result.get("structured_response")
+    error_message = result.get("error_message") or (response.error_message if response is not None else None)
+    if error_message:
+        raise RuntimeError(error_message)
+    if response is None:
+        raise RuntimeError("profile_label_graph 未返回 structured_response")
+    return response.user_profile_label.model_dump(exclude_none=True)
+
+
+def retry_delay(attempt: int) -> float:
+    """第 attempt 次重试前的退避秒数."""
+    return min(2 ** attempt, 30)
+
+
+async def _iterate(records: Union[Iterable[LabelRecord], AsyncIterable[LabelRecord]]):
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
+
+
+async def run_batch_labeling(
+    records: Union[Iterable[LabelRecord], AsyncIterable[LabelRecord]],
+    output_path: str,
+    *,
+    max_concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_second: Optional[float] = None,
+    provider: Optional[str] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    label_fn: LabelFn = label_customer,
+) -> Dict[str, Any]:
+    """批量打标签并增量写入 JSONL.
+
+    Args:
+        records: (customer_id, messages) 记录，可以是同步或异步迭代器
+        output_path: 结果 JSONL 路径；已存在时跳过其中成功的客户（断点续跑）
+        max_concurrency: 同时处理的客户数
+        requests_per_second: 提供方限流速率，默认读取环境变量
+        provider: 模型提供方，默认取 label_agent 标签路由当前首选模型的提供方
+        max_retries: 单个客户失败后的重试次数（指数退避）
+        label_fn: 单个客户的打标签函数
+
+    Returns:
+        批任务计数
+    """
+    provider = provider or label_provider()
+    rate_limiter = get_rate_limiter(provider, requests_per_second)
+    completed = load_completed_ids(output_path)
+    stats = BatchLabelStats()
+    # 队列有界：输入流再大也只预读少量记录
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency * 2)
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        def write_result(result: Dict[str, Any]) -> None:
+            # 单事件循环内整行写入 + flush，崩溃时最多丢失正在处理的客户
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+        async def process(customer_id: str, messages: List[Any]) -> None:
+            error = None
+            for attempt in range(max_retries + 1):
+                if attempt:
+                    stats.retries += 1
+                    await asyncio.sleep(retry_delay(attempt))
+                await rate_limiter.aacquire()
+                try:
+                    labels = await label_fn(messages)
+                except Exception as e:
+                    error = str(e)
+                    print(f"[DEBUG] 客户 {customer_id} 打标签失败（第{attempt + 1}次）: {e}")
+                    continue
+                stats.succeeded += 1
+                write_result({
+                    "customer_id": customer_id,
+                    "status": STATUS_OK,
+                    "labels": labels,
+                    "labeled_at": int(time.time()),
+                })
+                return
+            stats.failed += 1
+            write_result({
+                "customer_id": customer_id,
+                "status": STATUS_ERROR,
+                "error_message": error,
+                "labeled_at": int(time.time()),
+            })
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    await process(*item)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, max_concurrency))]
+        try:
+            async for customer_id, messages in _iterate(records):
+                stats.total += 1
+                if customer_id in completed:
+                    stats.skipped += 1
+                    continue
+                completed.add(customer_id)  # 输入里重复的客户只处理一次
+                await queue.put((customer_id, messages))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    print(f"[DEBUG] 批量打标签完成: {stats.as_dict()}")
+    return stats.as_dict()
+
+
+def export_parquet(jsonl_path: str, parquet_path: str) -> str:
+    """把 JSONL 结果转成 Parquet，每个标签字段一列；同一客户以最后一次结果为准."""
+    if not PARQUET_AVAILABLE:
+        raise ImportError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+    latest: Dict[str, Dict[str, Any]] = {}
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                latest[result["customer_id"]] = result
+    rows = []
+    for result in latest.values():
+        row = {
+            "customer_id": result["customer_id"],
+            "status": result["status"],
+            "error_message": result.get("error_message"),
+            "labeled_at": result.get("labeled_at"),
+        }
+        row.update(result.get("labels") or {})
+        rows.append(row)
+    pq.write_table(pa.Table.from_pylist(rows), parquet_path)
+    return parquet_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量生成用户画像标签")
+    parser.add_argument("input", help="输入 JSONL：每行 customer_id + messages")
+    parser.add_argument("output", help="结果 JSONL，重跑时自动断点续跑")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rps", type=float, default=None, help="每秒请求数上限")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--parquet", default=None, help="完成后另存为 Parquet")
+    args = parser.parse_args()
+
+    asyncio.run(run_batch_labeling(
+        read_records_jsonl(args.input),
+        args.output,
+        max_concurrency=args.concurrency,
+        requests_per_second=args.rps,
+        max_retries=args.retries,
+    ))
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""合并的用户画像模块 - 一次模型调用同时生成画像描述和画像标签.
+
+CRM 对每个客户都会同时调用 profile_agent（画像描述）和 profile_label_agent（画像标签），
+两个 graph 各自读取一遍同样的聊天记录。这里用一个联合 schema 在一次调用中同时输出两者，
+结果结构与两个原 graph 的 structured_response 保持一致；原 graph 继续保留以兼容旧调用方。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from pydantic import BaseModel, Field, create_model
+from typing_extensions import Annotated, TypedDict
+
+from huanmu_agent.user_profile import label_agent, profile_agent
+from huanmu_agent.user_profile.label_vocabulary import enum_labels_to_fields, validate_label_fields
+
+COMBINED_PROFILE_SYSTEM_PROMPT = """
+你是一个专业的医美/美容行业用户画像助手。请分析用户聊天记录，一次性输出两部分结果：
+
+1. user_profile：用户画像描述
+  - demographic：人口统计特征（年龄、性别、职业等）
+  - behavioral：行为特征（消费习惯、使用频率等）
+  - psychological：心理特征（价值观、兴趣爱好等）
+  - pain_points：需求痛点
+  聊天记录中没有依据的字段返回空字符串。
+
+2. user_profile_label：用户画像标签，为每个字段从可选标签中选择符合的标签，可以多选；
+  没有依据的字段返回 null，不要猜测。purchase_intent_score 为 0-10 的购买意向评分。
+"""
+
+# 画像描述部分：所有字段必填，满足 strict JSON schema 的要求
+ProfileDescription = create_model(
+    "ProfileDescription",
+    **{
+        name: (str, Field(..., description=field.description))
+        for name, field in profile_agent.UserProfileStructure.model_fields.items()
+    },
+)
+
+# 联合 schema：约束解码时标签部分使用枚举（故障转移到其他提供方时换成 Fallback），
+# 否则使用普通字符串再按词表校验
+CombinedProfileEnums = create_model(
+    "CombinedProfileEnums",
+    user_profile=(ProfileDescription, Field(..., description="用户画像描述")),
+    user_profile_label=(label_agent.ProfileLabelEnums, Field(..., description="用户画像标签")),
+)
+CombinedProfileFallback = create_model(
+    "CombinedProfileFallback",
+    user_profile=(ProfileDescription, Field(..., description="用户画像描述")),
+    user_profile_label=(label_agent.ProfileLabelFallback, Field(..., description="用户画像标签")),
+)
+CombinedProfileLoose = create_model(
+    "CombinedProfileLoose",
+    user_profile=(ProfileDescription, Field(..., description="用户画像描述")),
+    user_profile_label=(label_agent.UserProfileStructure, Field(..., description="用户画像标签，多个标签用逗号分隔")),
+)
+
+
+class CombinedProfileResponse(BaseModel):
+    """合并 graph 的输出：两部分分别与 profile_graph / profile_label_graph 的 structured_response 相同."""
+    profile: profile_agent.UserProfileStructure = Field(description="用户画像描述")
+    profile_label: label_agent.ProfileLabelAgentResponseFormat = Field(description="用户画像标签")
+
+
+class CombinedProfileState(AgentState):
+    error_message: Optional[str]
+    structured_response: Optional[CombinedProfileResponse]
+
+class CombinedProfileConfigSchema(TypedDict, total=False):
+    """可选配置.
+
+    constrained_decoding: 同 profile_label_agent，不传时 openai 提供方默认开启
+    """
+    constrained_decoding: Optional[bool]
+
+class CombinedProfileStateInput(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+
+class CombinedProfileStateOutput(TypedDict):
+    structured_response: CombinedProfileResponse
+    error_message: Optional[str]
+
+
+def build_combined_profile_prompt(state: AgentState, constrained: bool) -> List[BaseMessage]:
+    """系统提示 -> 历史消息 -> 当前用户请求；非约束解码时附上完整标签词表"""
+    system_msg = COMBINED_PROFILE_SYSTEM_PROMPT
+    if not constrained:
+        system_msg += "\n标签只能从以下标签中选择：\n" + label_agent.PROFILE_SYSTEM_PROMPT
+    history = state.get("messages", [])
+    return [SystemMessage(content=system_msg)] + list(history) + [HumanMessage(content="请帮我生成用户画像和用户画像标签。")]
+
+
+constrained_combined_model = label_agent.chat_model.with_structured_output(
+    CombinedProfileEnums, fallback_schema=CombinedProfileFallback, method="json_schema", strict=True
+)
+combined_model = label_agent.chat_model.with_structured_output(CombinedProfileLoose)
+
+
+def to_combined_response(response: BaseModel) -> CombinedProfileResponse:
+    """把联合 schema 的输出映射回两个原 graph 的结构；三种 schema 的标签都按词表校验."""
+    label_fields, report = validate_label_fields(enum_labels_to_fields(response.user_profile_label))
+    if report.changed:
+        print(f"[DEBUG] 标签校验修正: {report}")
+    labels = label_agent.UserProfileStructure(**label_fields)
+    return CombinedProfileResponse(
+        profile=profile_agent.UserProfileStructure(**response.user_profile.model_dump()),
+        profile_label=label_agent.ProfileLabelAgentResponseFormat(user_profile_label=labels),
+    )
+
+
+async def combined_profile_node(state: CombinedProfileState, config: RunnableConfig) -> Dict[str, Any]:
+    """一次调用同时生成画像描述和画像标签"""
+    if not state.get("messages"):
+        return {
+            "structured_response": CombinedProfileResponse(
+                profile=profile_agent.UserProfileStructure(),
+                profile_label=label_agent.ProfileLabelAgentResponseFormat(
+                    user_profile_label=label_agent.UserProfileStructure(),
+                ),
+            ),
+            "error_message": None,
+        }
+
+    constrained = label_agent.use_constrained_decoding(config)
+    try:
+        model = constrained_combined_model if constrained else combined_model
+        response = await model.ainvoke(build_combined_profile_prompt(state, constrained), config)
+        return {"structured_response": to_combined_response(response), "error_message": None}
+    except Exception as e:
+        print(f"Error during combined profile invocation: {e}")
+        return {"error_message": str(e)}
+
+
+# 构建工作流
+combined_profile_graph = (
+    StateGraph(CombinedProfileState, input=CombinedProfileStateInput, config_schema=CombinedProfileConfigSchema, output=CombinedProfileStateOutput)
+    .add_node("combined_profile_generator", combined_profile_node)
+    .add_edge(START, "combined_profile_generator")
+    .compile()
+)
@@ -3,30 +3,25 @@ from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any
 from typing import Sequence
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langgraph.prebuilt import create_react_agent
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from langchain.chat_models import init_chat_model
 from typing_extensions import Annotated, TypedDict
 from langchain_core.runnables import RunnableConfig
-import asyncio
-from pathlib import Path
+import json
 
-from constant import OPENAI_GPT4_MINI
-
-# 加载profile_variables.py
-def load_profile_variables() -> Dict[str, Any]:
-    """安全加载profile_variables字典"""
-    profile_vars_path = Path(__file__).parent / "profile_variables.py"
-    with open(profile_vars_path, 'r', encoding='utf-8') as f:
-        code = compile(f.read(), profile_vars_path, 'exec')
-        exec_globals = {}
-        exec(code, exec_globals)
-        return exec_globals['profile_variables']
-
-# 初始化profile_variables
-profile_variables = load_profile_variables()
+from huanmu_agent.user_profile.label_vocabulary import (
+    SINGLE_VALUED_FIELDS,
+    build_label_delta_model,
+    build_label_enum_model,
+    enum_labels_to_fields,
+    merge_label_delta,
+    validate_label_fields,
+    validate_profile_labels,
+)
+from huanmu_agent.user_profile.profile_variables import profile_variables
+from huanmu_agent.utils.model_router import provider_of, routed_chat_model
+from huanmu_agent.utils.structured_output import create_structured_agent
 
 PROFILE_SYSTEM_PROMPT = """
 你是一个专业的医美/美容行业用户画像标签生成助手，必须严格遵循以下规则：
@@ -89,6 +84,25 @@ PROFILE_SYSTEM_PROMPT = """
     "retention_strategy_list": ",".join(profile_variables["customer_lifecycle"]["retention_strategy"])
 }
 
+# 约束解码模式的提示词：合法标签已经写在 schema 的枚举里，不再在提示词中重复整个词表
+PROFILE_CONSTRAINED_SYSTEM_PROMPT = """
+你是一个专业的医美/美容行业用户画像标签生成助手。
+分析用户聊天记录，为每个字段从给定的可选标签中选择符合的标签，可以多选；
+没有依据的字段返回 null，不要猜测。purchase_intent_score 为 0-10 的购买意向评分。
+"""
+
+# 增量模式：只发送上次标签 + 新消息，模型只输出需要新增/移除的标签，合并在本地完成
+PROFILE_DELTA_SYSTEM_PROMPT = """
+你是一个专业的医美/美容行业用户画像标签生成助手。
+下面是该用户上一次生成的画像标签（JSON，null 表示暂无）：
+{previous_labels}
+
+接下来的聊天记录只包含上次打标签之后的新消息。请只根据新消息判断标签的变化：
+- additions：新消息中出现了新依据、需要新增的标签；单值字段（{single_valued}）填写新的取值
+- removals：新消息表明已经不再成立、需要移除的旧标签
+没有变化的字段一律返回 null，不要重复输出仍然成立的旧标签。
+{vocabulary_hint}"""
+
 class socialProfilestructure(BaseModel):
     occupation: Optional[str] = Field(default=None)
     age: Optional[str] = Field(default=None) 
@@ -149,12 +163,20 @@ class UserProfileStructure(BaseModel):
 class ProfileLabelAgentState(AgentState):
     error_message: Optional[str]
     structured_response: Optional[UserProfileStructure]
+    previous_labels: Optional[Dict[str, Optional[str]]]
 
-class ProfileLabelAgentConfigSchema(TypedDict):
-    pass
+class ProfileLabelAgentConfigSchema(TypedDict, total=False):
+    """可选配置.
+
+    constrained_decoding: 是否使用枚举 schema + 约束解码（strict JSON schema）；
+        不传时 openai 提供方默认开启
+    """
+    constrained_decoding: Optional[bool]
 
 class ProfileLabelAgentStateInput(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # 增量模式：传入上次的标签，messages 只需包含上次打标签之后的新消息
+    previous_labels: Optional[Dict[str, Optional[str]]]
 
 class ProfileLabelAgentResponseFormat(BaseModel):
     user_profile_label: UserProfileStructure = Field(description="用户画像标签，可以为空")
@@ -163,13 +185,21 @@ class ProfileLabelAgentResponseFormat(BaseModel):
 class ProfileLabelAgentStateOutput(TypedDict):
     structured_response: ProfileLabelAgentResponseFormat
 
-provider, model_name = OPENAI_GPT4_MINI.split('/', 1)
+# 由 profile_variables 生成的枚举 schema，每个字段只能取词表中的标签
+ProfileLabelEnums = build_label_enum_model()
+ProfileLabelDelta = build_label_delta_model()
+# 不支持约束解码时的增量 schema：普通字符串，合并时按词表校验
+ProfileLabelDeltaLoose = build_label_delta_model("ProfileLabelDeltaLoose", enum=False)
+# 约束解码的调用故障转移到非 openai 模型时使用：普通字符串 + 字段描述里的词表，输出再按词表校验
+ProfileLabelFallback = build_label_enum_model("ProfileLabelFallback", enum=False, describe_choices=True)
+ProfileLabelDeltaFallback = build_label_delta_model("ProfileLabelDeltaFallback", enum=False, describe_choices=True)
+
 # 初始化模型
-chat_model = init_chat_model(
-    model=model_name,
-    model_provider=provider,
-    temperature=0.7,  # Balanced creativity
-)
+chat_model = routed_chat_model("labeling", temperature=0.7)  # Balanced creativity
+
+def label_provider() -> str:
+    """本次调用首选模型的提供方：随路由的健康排序和 MODEL_ROUTE_LABELING 覆盖实时变化"""
+    return provider_of(chat_model.current_model())
 
 def build_profile_prompt(state: AgentState, config: RunnableConfig) -> List[BaseMessage]:
     """构建用户画像生成的提示"""
@@ -187,15 +217,76 @@ def build_profile_prompt(state: AgentState, config: RunnableConfig) -> List[Base
     # 顺序: 系统提示 -> 历史消息 -> 当前用户请求
     return [system_message] + history + [user_message]
 
+def build_constrained_profile_prompt(state: AgentState) -> List[BaseMessage]:
+    """约束解码模式的提示：简短系统提示 -> 历史消息 -> 当前用户请求"""
+    history = state.get("messages", [])
+    return [SystemMessage(content=PROFILE_CONSTRAINED_SYSTEM_PROMPT)] + list(history) + [HumanMessage(content="请帮我生成用户画像标签。")]
+
+def use_constrained_decoding(config: RunnableConfig) -> bool:
+    configurable = config.get("configurable", {}) if config else {}
+    enabled = configurable.get("constrained_decoding")
+    if enabled is None:
+        # OpenAI 的 strict JSON schema 保证输出符合枚举；每次调用按当前首选模型判断
+        return label_provider() == "openai"
+    return bool(enabled)
+
+def build_delta_profile_prompt(state: ProfileLabelAgentState, constrained: bool) -> List[BaseMessage]:
+    """增量模式的提示：上次标签 -> 新消息 -> 当前用户请求"""
+    previous_labels = {key: value for key, value in (state.get("previous_labels") or {}).items() if value}
+    vocabulary_hint = "" if constrained else "新增的标签只能从以下标签中选择：\n" + PROFILE_SYSTEM_PROMPT
+    system_msg = PROFILE_DELTA_SYSTEM_PROMPT.format(
+        previous_labels=json.dumps(previous_labels, ensure_ascii=False),
+        single_valued="、".join(sorted(SINGLE_VALUED_FIELDS)),
+        vocabulary_hint=vocabulary_hint,
+    )
+    history = state.get("messages", [])
+    return [SystemMessage(content=system_msg)] + list(history) + [HumanMessage(content="请根据新消息输出标签的新增和移除。")]
+
+# 约束解码：一次结构化输出调用，输出只能是词表内的标签
+constrained_label_model = chat_model.with_structured_output(
+    ProfileLabelEnums, fallback_schema=ProfileLabelFallback, method="json_schema", strict=True
+)
+constrained_delta_model = chat_model.with_structured_output(
+    ProfileLabelDelta, fallback_schema=ProfileLabelDeltaFallback, method="json_schema", strict=True
+)
+delta_model = chat_model.with_structured_output(ProfileLabelDeltaLoose)
+
+async def delta_label_node(state: ProfileLabelAgentState, config: RunnableConfig):
+    """增量更新：模型只输出新增/移除，本地按标签词表合并到上次的标签"""
+    constrained = use_constrained_decoding(config)
+    try:
+        model = constrained_delta_model if constrained else delta_model
+        delta = await model.ainvoke(build_delta_profile_prompt(state, constrained), config)
+        labels, report = merge_label_delta(
+            state.get("previous_labels") or {},
+            enum_labels_to_fields(delta.additions),
+            enum_labels_to_fields(delta.removals),
+        )
+        if report.changed:
+            print(f"[DEBUG] 标签校验修正: {report}")
+        return {
+            "structured_response": ProfileLabelAgentResponseFormat(
+                user_profile_label=UserProfileStructure(**labels),
+            ),
+            "error_message": None,
+        }
+    except Exception as e:
+        print(f"Error during profile delta invocation: {e}")
+        return {"error_message": str(e)}
+
+def route_label_mode(state: ProfileLabelAgentState) -> str:
+    """传入上次标签时走增量模式，否则全量生成"""
+    if any((state.get("previous_labels") or {}).values()):
+        return "delta_label_generator"
+    return "profile_generator"
+
 # 创建agent
-profile_agent = create_react_agent(
-    model=chat_model,
-    tools=[],
+# 没有工具，一次结构化输出调用即可
+profile_agent = create_structured_agent(
+    chat_model,
+    ProfileLabelAgentResponseFormat,
+    build_profile_prompt,
     name="profile_agent",
-    state_schema=ProfileLabelAgentState,
-    config_schema=ProfileLabelAgentConfigSchema,
-    response_format=ProfileLabelAgentResponseFormat,
-    prompt=build_profile_prompt,
 )
 
 async def profile_agent_node(state: ProfileLabelAgentState, config: RunnableConfig):
@@ -213,15 +304,40 @@ async def profile_agent_node(state: ProfileLabelAgentState, config: RunnableConf
         current_conversation_messages = system_msg + user_msg
     
     try:
-        agent_response = await asyncio.to_thread(
-            profile_agent.invoke,
+        if use_constrained_decoding(config):
+            labels = await constrained_label_model.ainvoke(
+                build_constrained_profile_prompt({"messages": state.get("messages", [])}),
+                config,
+            )
+            # 故障转移到其他提供方时输出不受约束，同样按词表校验
+            label_fields, report = validate_label_fields(enum_labels_to_fields(labels))
+            if report.changed:
+                print(f"[DEBUG] 标签校验修正: {report}")
+            return {
+                "structured_response": ProfileLabelAgentResponseFormat(
+                    user_profile_label=UserProfileStructure(**label_fields),
+                ),
+                "messages": current_conversation_messages,
+                "error_message": None,
+            }
+
+        # 直接走异步接口，批量打标签时并发数不受默认线程池大小限制
+        agent_response = await profile_agent.ainvoke(
             {"messages": current_conversation_messages},
             config,
         )
         
+        structured_response = agent_response.get("structured_response")
+        if structured_response is not None:
+            # 按标签词表校验：近似标签纠正为合法标签，词表外的标签直接丢弃，无需重试
+            labels, report = validate_profile_labels(structured_response.user_profile_label)
+            if report.changed:
+                print(f"[DEBUG] 标签校验修正: {report}")
+            structured_response = structured_response.model_copy(update={"user_profile_label": labels})
+
         # 直接返回UserProfileStructure实例
         return {
-            "structured_response": agent_response.get("structured_response"),
+            "structured_response": structured_response,
             "messages": current_conversation_messages,
             "error_message": None,
         }
@@ -236,6 +352,7 @@ async def profile_agent_node(state: ProfileLabelAgentState, config: RunnableConf
 profile_label_graph = (
     StateGraph(ProfileLabelAgentState, input=ProfileLabelAgentStateInput, config_schema=ProfileLabelAgentConfigSchema, output=ProfileLabelAgentStateOutput)
     .add_node("profile_generator", profile_agent_node)
-    .add_edge(START, "profile_generator")
+    .add_node("delta_label_generator", delta_label_node)
+    .add_conditional_edges(START, route_label_mode, ["profile_generator", "delta_label_generator"])
     .compile()
 )
@@ -0,0 +1,294 @@
+"""用户画像标签词表 - 由 profile_variables 预编译，用于校验和规范化模型输出的标签.
+
+模块导入时一次性构建：
+- ``LABEL_VOCABULARY``：字段 -> 合法标签 frozenset
+- ``LABEL_FIELDS``：标签 -> 所属字段（反向索引，同一标签可属于多个字段）
+- 每个字段的模糊匹配索引（规范化形式 + 二元组倒排），近似标签直接纠正为合法标签
+- ``build_label_enum_model``：每个字段取值为枚举的结构化输出模型，供支持约束解码的提供方使用
+
+校验只对未精确命中的标签做模糊匹配，整体开销与标签数量成正比。
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Literal, Mapping, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, Field, create_model
+
+from huanmu_agent.user_profile.profile_variables import profile_variables
+
+# 字段 -> 所属分组，如 occupation -> social_profile
+FIELD_SECTIONS: Dict[str, str] = {
+    field_name: section for section, fields in profile_variables.items() for field_name in fields
+}
+
+# 评分字段不是枚举，而是 0-10 的整数
+SCORE_FIELDS = frozenset({"purchase_intent_score"})
+SCORE_RANGE = (0, 10)
+
+# 单值字段：增量更新时新标签替换旧标签，其余字段为多值集合
+SINGLE_VALUED_FIELDS = frozenset({"age", "region", "ability", "stage", "value", "purchase_intent_score"})
+
+# 字段 -> 合法标签（保持 profile_variables 中的顺序，用于生成枚举）
+LABEL_CHOICES: Dict[str, Tuple[str, ...]] = {
+    field_name: tuple(dict.fromkeys(profile_variables[section][field_name]))
+    for field_name, section in FIELD_SECTIONS.items()
+    if field_name not in SCORE_FIELDS
+}
+
+LABEL_VOCABULARY: Dict[str, FrozenSet[str]] = {
+    field_name: frozenset(labels) for field_name, labels in LABEL_CHOICES.items()
+}
+
+# 模糊匹配的最低相似度（1 - 编辑距离 / 较长标签长度）
+FUZZY_MIN_SIMILARITY = 0.66
+LABEL_SEPARATORS = re.compile(r"[,，、;；/|\n]+")
+_NORMALIZE_DROP = re.compile(r"[\s\"'“”‘’`·.。!！?？()（）\[\]【】]+")
+_SCORE_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# 否定字：模糊匹配不能增删它们，否则 "不吸烟" 会被纠正成相反的 "吸烟"
+NEGATION_CHARS = "不未非没无"
+
+
+def normalize_label(label: str) -> str:
+    """全角转半角、去空白和标点、统一大小写."""
+    return _NORMALIZE_DROP.sub("", unicodedata.normalize("NFKC", label)).casefold()
+
+
+def _bigrams(text: str) -> Set[str]:
+    if len(text) < 2:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _negations(text: str) -> List[str]:
+    return sorted(c for c in text if c in NEGATION_CHARS)
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class FuzzyLabelIndex:
+    """单个字段的近似标签索引."""
+
+    def __init__(self, labels: FrozenSet[str]) -> None:
+        self.normalized: Dict[str, str] = {normalize_label(label): label for label in labels}
+        self.bigram_index: Dict[str, Set[str]] = {}
+        for key in self.normalized:
+            for gram in _bigrams(key):
+                self.bigram_index.setdefault(gram, set()).add(key)
+
+    def match(self, label: str) -> Optional[str]:
+        """返回最接近的合法标签；没有足够接近或有多个并列候选时返回 None."""
+        key = normalize_label(label)
+        if not key:
+            return None
+        if key in self.normalized:
+            return self.normalized[key]
+        candidates: Set[str] = set()
+        for gram in _bigrams(key):
+            candidates |= self.bigram_index.get(gram, set())
+        # 否定字必须与标签一致（"不太满意" -> "不满意" 可以，"不焦虑" -> "焦虑"、"未婚未育" -> "未婚" 不行）
+        negations = _negations(key)
+        candidates = {c for c in candidates if _negations(c) == negations}
+        # 省略了后缀/前缀（"谨慎" -> "谨慎型"）且只包含于一个标签时直接采用；
+        # 反方向（标签包含于输出）会把 "不吸烟" 之类的限定词丢掉，只走下面的编辑距离
+        containing = [c for c in candidates if len(key) >= 2 and key in c]
+        if len(containing) == 1:
+            return self.normalized[containing[0]]
+        scored = []
+        for candidate in candidates:
+            similarity = 1 - _edit_distance(key, candidate) / max(len(key), len(candidate))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, candidate))
+        if not scored:
+            return None
+        scored.sort(reverse=True)
+        if len(scored) > 1 and scored[0][0] == scored[1][0]:
+            return None
+        return self.normalized[scored[0][1]]
+
+
+FUZZY_INDEXES: Dict[str, FuzzyLabelIndex] = {
+    field_name: FuzzyLabelIndex(labels) for field_name, labels in LABEL_VOCABULARY.items()
+}
+
+LABEL_FIELDS: Dict[str, Tuple[str, ...]] = {}
+for _field_name, _labels in LABEL_VOCABULARY.items():
+    for _label in _labels:
+        LABEL_FIELDS[_label] = LABEL_FIELDS.get(_label, ()) + (_field_name,)
+
+
+@dataclass
+class LabelValidationReport:
+    """一次校验中被修改的标签."""
+
+    snapped: List[Tuple[str, str, str]] = field(default_factory=list)  # (字段, 原标签, 纠正后)
+    moved: List[Tuple[str, str, str]] = field(default_factory=list)  # (原字段, 标签, 新字段)
+    dropped: List[Tuple[str, str]] = field(default_factory=list)  # (字段, 原标签)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.snapped or self.moved or self.dropped)
+
+
+def split_labels(value: Optional[str]) -> List[str]:
+    """把逗号等分隔的标签字符串拆成列表."""
+    if not value:
+        return []
+    return [part.strip() for part in LABEL_SEPARATORS.split(value) if part.strip()]
+
+
+def normalize_score(value: Optional[str]) -> Optional[str]:
+    """把评分规范成 0-10 的整数字符串，如 "8分" -> "8"、"7.5/10" -> "8"."""
+    if not value:
+        return None
+    match = _SCORE_NUMBER.search(unicodedata.normalize("NFKC", str(value)))
+    if not match:
+        return None
+    score = round(float(match.group()))
+    return str(min(max(score, SCORE_RANGE[0]), SCORE_RANGE[1]))
+
+
+def resolve_label(field_name: str, label: str) -> Tuple[Optional[str], Optional[str]]:
+    """把单个标签解析成 (字段, 合法标签)，无法解析时返回 (None, None).
+
+    依次尝试：本字段精确命中 -> 本字段模糊匹配 -> 反向索引中唯一归属的其他字段。
+    """
+    vocabulary = LABEL_VOCABULARY[field_name]
+    if label in vocabulary:
+        return field_name, label
+    snapped = FUZZY_INDEXES[field_name].match(label)
+    if snapped:
+        return field_name, snapped
+    owners = LABEL_FIELDS.get(label, ())
+    if len(owners) == 1:
+        return owners[0], label
+    return None, None
+
+
+def validate_label_fields(labels: Mapping[str, Optional[str]]) -> Tuple[Dict[str, Optional[str]], LabelValidationReport]:
+    """校验并规范化 {字段: "标签1,标签2"}，只保留词表中的标签.
+
+    Returns:
+        (规范化后的字段值，没有合法标签的字段为 None；修改记录)
+    """
+    report = LabelValidationReport()
+    resolved: Dict[str, List[str]] = {field_name: [] for field_name in labels}
+
+    for field_name, value in labels.items():
+        if field_name in SCORE_FIELDS:
+            score = normalize_score(value)
+            if value and score is None:
+                report.dropped.append((field_name, value))
+            resolved[field_name] = [score] if score is not None else []
+            continue
+        if field_name not in LABEL_VOCABULARY:
+            continue
+        for label in split_labels(value):
+            target_field, canonical = resolve_label(field_name, label)
+            if canonical is None:
+                report.dropped.append((field_name, label))
+                continue
+            if target_field != field_name:
+                report.moved.append((field_name, label, target_field))
+            elif canonical != label:
+                report.snapped.append((field_name, label, canonical))
+            bucket = resolved.setdefault(target_field, [])
+            if canonical not in bucket:
+                bucket.append(canonical)
+
+    normalized = {field_name: ",".join(values) or None for field_name, values in resolved.items()}
+    return normalized, report
+
+
+def validate_profile_labels(profile):
+    """校验 label_agent 的 UserProfileStructure，返回 (规范化后的新实例, 修改记录)."""
+    normalized, report = validate_label_fields(profile.model_dump())
+    known = {name: value for name, value in normalized.items() if name in type(profile).model_fields}
+    return profile.model_copy(update=known), report
+
+
+def build_label_enum_model(name: str = "ProfileLabelEnums", enum: bool = True, describe_choices: bool = False) -> Type[BaseModel]:
+    """由词表生成每个字段都是枚举的结构化输出模型.
+
+    标签字段为 ``Optional[List[Literal[...]]]``，评分字段为 0-10 的整数枚举。
+    所有字段都是必填（可为 null），满足 OpenAI strict 模式对 schema 的要求，
+    模型在约束解码下只能输出词表内的标签。``enum=False`` 时字段为普通字符串列表，
+    用于不支持约束解码的提供方（输出再经 ``validate_label_fields`` 校验）。
+    ``describe_choices=True`` 把可选标签写进字段描述，供提示词里没有词表的场景使用
+    （约束解码的调用故障转移到其他提供方时）。
+    """
+    fields: Dict[str, Any] = {}
+    for field_name in FIELD_SECTIONS:
+        description = FIELD_SECTIONS[field_name]
+        if field_name in SCORE_FIELDS:
+            score_values = tuple(range(SCORE_RANGE[0], SCORE_RANGE[1] + 1))
+            annotation = Optional[Literal[score_values]] if enum else Optional[int]
+        else:
+            annotation = Optional[List[Literal[LABEL_CHOICES[field_name]]]] if enum else Optional[List[str]]
+            if describe_choices:
+                description = f"{description}，只能从以下标签中选择：{'、'.join(LABEL_CHOICES[field_name])}"
+        fields[field_name] = (annotation, Field(..., description=description))
+    return create_model(name, **fields)
+
+
+def build_label_delta_model(name: str = "ProfileLabelDelta", enum: bool = True, describe_choices: bool = False) -> Type[BaseModel]:
+    """增量更新的结构化输出：相对上次标签新增和移除的标签."""
+    additions = build_label_enum_model(f"{name}Additions", enum=enum, describe_choices=describe_choices)
+    removals = build_label_enum_model(f"{name}Removals", enum=enum, describe_choices=describe_choices)
+    return create_model(
+        name,
+        additions=(additions, Field(..., description="根据新消息需要新增的标签，单值字段填写新的取值，没有变化的字段为 null")),
+        removals=(removals, Field(..., description="根据新消息已经不再成立、需要移除的标签，没有则为 null")),
+    )
+
+
+def enum_labels_to_fields(labels: BaseModel) -> Dict[str, Optional[str]]:
+    """把枚举模型的输出转换回 UserProfileStructure 的逗号分隔字符串."""
+    fields: Dict[str, Optional[str]] = {}
+    for field_name, value in labels.model_dump().items():
+        if value is None or value == []:
+            fields[field_name] = None
+        elif isinstance(value, list):
+            fields[field_name] = ",".join(dict.fromkeys(value))
+        else:
+            fields[field_name] = str(value)
+    return fields
+
+
+def merge_label_delta(
+    previous: Mapping[str, Optional[str]],
+    additions: Mapping[str, Optional[str]],
+    removals: Mapping[str, Optional[str]],
+) -> Tuple[Dict[str, Optional[str]], LabelValidationReport]:
+    """把增量结果合并到上次的标签上.
+
+    三者都先按词表校验规范化；先移除再新增，单值字段的新增直接替换旧值。
+
+    Returns:
+        (合并后的字段值，新增标签的校验修改记录)
+    """
+    previous_fields, _ = validate_label_fields(previous)
+    addition_fields, report = validate_label_fields(additions)
+    removal_fields, _ = validate_label_fields(removals)
+
+    merged: Dict[str, Optional[str]] = {}
+    for field_name in FIELD_SECTIONS:
+        current = split_labels(previous_fields.get(field_name))
+        removed = set(split_labels(removal_fields.get(field_name)))
+        added = split_labels(addition_fields.get(field_name))
+        if field_name in SINGLE_VALUED_FIELDS:
+            kept = [] if added else [label for label in current if label not in removed]
+            values = (added or kept)[:1]
+        else:
+            values = [label for label in current if label not in removed]
+            values += [label for label in added if label not in values]
+        merged[field_name] = ",".join(values) or None
+    return merged, report
@@ -2,15 +2,13 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage, HumanMessage
-from langgraph.prebuilt import create_react_agent
 from langgraph.graph import StateGraph, START
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from langchain.chat_models import init_chat_model
 from typing_extensions import TypedDict
 from langchain_core.runnables import RunnableConfig
-import asyncio
 
-from constant import OPENAI_GPT4_MINI
+from huanmu_agent.utils.model_router import routed_chat_model
+from huanmu_agent.utils.structured_output import create_structured_agent
 
 PROFILE_SYSTEM_PROMPT = """
 你是一个专业的用户画像生成助手。根据用户提供的基本信息、行为数据和偏好，生成详细的用户画像。
@@ -53,13 +51,8 @@ class ProfileAgentStateOutput(TypedDict):
     structured_response: UserProfileStructure
 
 
-provider, model_name = OPENAI_GPT4_MINI.split('/', 1)
 # 初始化模型
-chat_model = init_chat_model(
-    model=model_name,
-    model_provider=provider,
-    temperature=0.7,  # Balanced creativity
-)
+chat_model = routed_chat_model("labeling", temperature=0.7)  # Balanced creativity
 
 def build_profile_prompt(state: AgentState, config: RunnableConfig) -> List[BaseMessage]:
     messages = [{
@@ -77,14 +70,12 @@ def build_profile_prompt(state: AgentState, config: RunnableConfig) -> List[Base
     return messages
 
 # 创建agent
-profile_agent = create_react_agent(
-    model=chat_model,
-    tools=[],
+# 没有工具，一次结构化输出调用即可
+profile_agent = create_structured_agent(
+    chat_model,
+    ProfileAgentResponseFormat,
+    build_profile_prompt,
     name="profile_agent",
-    state_schema=ProfileAgentState,
-    config_schema=ProfileConfigSchema,
-    response_format=ProfileAgentResponseFormat,
-    prompt=build_profile_prompt,
 )
 
 async def profile_agent_node(state: ProfileAgentState, config: RunnableConfig):
@@ -99,8 +90,7 @@ async def profile_agent_node(state: ProfileAgentState, config: RunnableConfig):
         }
     
     try:
-        agent_response = await asyncio.to_thread(
-            profile_agent.invoke,
+        agent_response = await profile_agent.ainvoke(
             {"messages": current_conversation_messages},
             config,
         )
@@ -0,0 +1,105 @@
+"""Request coalescing in front of compiled graphs.
+
+Gateways retry on timeout, so the same request can reach a graph several times
+while the first run is still going. ``coalesce_graph`` wraps a compiled graph
+in a one-node graph with the same input, output and config schemas; the node
+runs the original graph through a shared ``SingleFlight`` keyed on
+graph name + normalized input + configurable, so concurrent duplicates wait on
+one execution and all receive its result.
+
+The "updates" stream of a wrapped graph shows a single ``<name>_coalesced``
+node carrying the graph's output instead of the original per-node updates;
+the caller that runs the execution still sees the inner nodes with
+``subgraphs=True``. Set ``GRAPH_COALESCING=0`` where clients depend on node
+names.
+
+The wrapper hands back every state channel of the inner run, not just the
+output schema, so a checkpointed thread keeps the same history as with the
+plain graph. The inner run only sees the input-schema fields, though, so do not
+wrap multi-turn graphs whose nodes depend on other state from earlier turns.
+"""
+
+import os
+from typing import Any, Dict, Iterable
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import START, StateGraph
+from langgraph.graph.state import CompiledStateGraph
+from pydantic import BaseModel
+
+from huanmu_agent.utils.cache import stable_hash
+from huanmu_agent.utils.langchain_utils import get_message_text
+from huanmu_agent.utils.single_flight import SingleFlight
+
+COALESCING_ENABLED = os.environ.get("GRAPH_COALESCING", "1") not in ("0", "false", "False")
+
+# Per-run identifiers injected by the server; they differ between retries of the same request.
+# thread_id stays in the key: checkpointed threads with the same input must not share a result.
+IGNORED_CONFIG_KEYS = frozenset({"run_id", "assistant_id", "graph_id", "user_id", "checkpoint_id", "checkpoint_ns"})
+IGNORED_CONFIG_PREFIXES = ("__", "checkpoint_", "langgraph_", "x-")
+
+graph_flight = SingleFlight()
+
+
+def normalize_value(value: Any) -> Any:
+    """Reduce a state value to plain data, dropping message ids and metadata."""
+    if isinstance(value, BaseMessage):
+        return {"type": value.type, "content": get_message_text(value)}
+    if isinstance(value, BaseModel):
+        return normalize_value(value.model_dump())
+    if isinstance(value, dict):
+        if "role" in value and "content" in value:
+            return {"type": value["role"], "content": value["content"]}
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    return value
+
+
+def request_input(state: Any, input_keys: Iterable[str]) -> Dict[str, Any]:
+    """The input-schema fields of a state, whether it is a dict, dataclass or pydantic model."""
+    if isinstance(state, dict):
+        return {key: state[key] for key in input_keys if state.get(key) is not None}
+    return {key: getattr(state, key) for key in input_keys if getattr(state, key, None) is not None}
+
+
+def coalesce_key(graph_name: str, state: Dict[str, Any], config: RunnableConfig) -> str:
+    configurable = (config or {}).get("configurable", {})
+    relevant = {
+        key: value for key, value in configurable.items()
+        if key not in IGNORED_CONFIG_KEYS and not key.startswith(IGNORED_CONFIG_PREFIXES)
+    }
+    return stable_hash({
+        "graph": graph_name,
+        "input": normalize_value({k: v for k, v in state.items() if v is not None}),
+        "configurable": normalize_value(relevant),
+    })
+
+
+def coalesce_graph(graph: CompiledStateGraph, graph_name: str) -> CompiledStateGraph:
+    """Wrap ``graph`` so concurrent identical requests share one execution.
+
+    Set ``GRAPH_COALESCING=0`` to return the graph unchanged.
+    """
+    if not COALESCING_ENABLED:
+        return graph
+    builder = graph.builder
+    input_keys = list(builder.schemas[builder.input])
+    # Everything the inner run writes, so the outer thread's checkpoint matches the plain graph's
+    state_keys = [key for key in builder.schemas[builder.schema] if key in graph.channels]
+
+    async def run(state: Any, config: RunnableConfig) -> Dict[str, Any]:
+        # The node sees the full state schema (possibly a dataclass); key and re-run on the request input only
+        request = request_input(state, input_keys)
+        key = coalesce_key(graph_name, request, config)
+        return await graph_flight.do(key, lambda: graph.ainvoke(request, config, output_keys=state_keys))
+
+    # Suffix the node name so it cannot clash with a state key of the same name.
+    node = f"{graph_name}_coalesced"
+    return (
+        StateGraph(builder.schema, builder.config_schema, input=builder.input, output=builder.output)
+        .add_node(node, run)
+        .add_edge(START, node)
+        .compile(name=graph.name)
+    )
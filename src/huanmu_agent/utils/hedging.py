@@ -0,0 +1,191 @@
+"""Hedged LLM requests for tail-latency reduction.
+
+``hedged_invoke`` streams from the primary runnable. If no first token has
+arrived within the chosen percentile of recently observed first-token
+latencies, it fires the same request at a backup runnable (the same model or
+a different one). Whichever responder produces a first token first wins; the
+other request is cancelled. Failures before the first token fall through to
+the other responder, so a hedge also masks a fast-failing primary.
+
+Hedges and wins are counted in ``get_hedge_stats()``.
+
+The delay percentile is taken over primary requests only. A primary cancelled
+because the hedge won is recorded with its elapsed time at cancel (a lower
+bound of its real latency), so the window does not fill up with the fast
+responders and push the delay, and with it the hedge rate, ever lower.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# Delay used until enough first-token samples exist for a percentile
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_HEDGE_DELAY = 0.2
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW_SIZE = 500
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    hedged: int = 0
+    primary_wins: int = 0
+    backup_wins: int = 0
+    errors: int = 0
+    first_token_latencies: Dict[str, Deque[float]] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "primary_wins": self.primary_wins,
+            "backup_wins": self.backup_wins,
+            "errors": self.errors,
+        }
+
+
+_stats = HedgeStats()
+
+
+def record_first_token(key: str, latency: float) -> None:
+    _stats.first_token_latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW_SIZE)).append(latency)
+
+
+def hedge_delay(key: str, percentile: float, default: Optional[float] = None) -> float:
+    """Seconds to wait for a first token before hedging: the given percentile of recent samples."""
+    samples = sorted(_stats.first_token_latencies.get(key) or ())
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return DEFAULT_HEDGE_DELAY if default is None else default
+    index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return max(MIN_HEDGE_DELAY, samples[index])
+
+
+class _Attempt:
+    """One streaming request; ``first_token`` is set when output starts or the request ends.
+
+    Only attempts with ``record=True`` (the primary) feed the latency window.
+    """
+
+    def __init__(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig], key: str, record: bool = True) -> None:
+        self.first_token = asyncio.Event()
+        self.started_at = time.monotonic()
+        self.key = key
+        self.record = record
+        self.task = asyncio.ensure_future(self._run(runnable, input, config))
+
+    async def _run(self, runnable: Runnable, input: Any, config: Optional[RunnableConfig]) -> Any:
+        output = None
+        try:
+            async for chunk in runnable.astream(input, config):
+                if not self.first_token.is_set():
+                    if self.record:
+                        record_first_token(self.key, time.monotonic() - self.started_at)
+                    self.first_token.set()
+                output = chunk if output is None else output + chunk
+        finally:
+            self.first_token.set()
+        return output
+
+    def cancel(self) -> None:
+        """Cancel the request; a recorded attempt still waiting for output leaves a censored sample."""
+        if self.task.done() or self.task.cancelling():
+            return
+        if self.record and not self.first_token.is_set():
+            record_first_token(self.key, time.monotonic() - self.started_at)
+        self.task.cancel()
+
+    @property
+    def failed(self) -> bool:
+        return self.task.done() and not self.task.cancelled() and self.task.exception() is not None
+
+
+async def _first_responder(attempts: List[_Attempt], timeout: Optional[float] = None) -> Optional[_Attempt]:
+    """Wait until some attempt has output (or succeeded); None on timeout. Raises if all fail."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = list(attempts)
+    while pending:
+        for attempt in pending:
+            if attempt.first_token.is_set() and not attempt.failed:
+                return attempt
+        pending = [a for a in pending if not a.failed]
+        if not pending:
+            break
+        waiters = [asyncio.ensure_future(a.first_token.wait()) for a in pending]
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, _ = await asyncio.wait(waiters, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        if not done:
+            return None
+    # Every attempt failed before producing output
+    raise [a.task.exception() for a in attempts if a.failed][-1]
+
+
+async def hedged_invoke(
+    primary: Runnable,
+    input: Any,
+    config: Optional[RunnableConfig] = None,
+    *,
+    backup: Optional[Runnable] = None,
+    key: str = "default",
+    percentile: float = 95.0,
+) -> Any:
+    """Invoke ``primary`` with a hedge to ``backup`` (defaults to ``primary``) on a slow first token.
+
+    Args:
+        primary: Streaming runnable, e.g. a chat model with tools bound.
+        input: Model input.
+        config: Runnable config forwarded to both requests.
+        backup: Runnable for the hedged request.
+        key: Latency bucket for the delay percentile, e.g. ``"main_reply:openai/gpt-4o-mini"``.
+        percentile: First-token latency percentile to wait before hedging.
+
+    Returns:
+        The winning responder's aggregated output (an ``AIMessageChunk`` for chat models).
+    """
+    _stats.requests += 1
+    first = _Attempt(primary, input, config, key)
+    attempts = [first]
+    try:
+        try:
+            winner = await _first_responder(attempts, timeout=hedge_delay(key, percentile))
+        except Exception:
+            winner = None  # Primary failed fast: the hedge doubles as a retry
+        if winner is None:
+            _stats.hedged += 1
+            print(f"[DEBUG] No first token from {key} within p{percentile:g} delay, sending hedged request")
+            attempts.append(_Attempt(backup or primary, input, config, key, record=False))
+            winner = await _first_responder(attempts)
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.cancel()
+        if winner is first:
+            _stats.primary_wins += 1
+        else:
+            _stats.backup_wins += 1
+        return await winner.task
+    except Exception:
+        _stats.errors += 1
+        raise
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+
+def get_hedge_stats() -> Dict[str, Any]:
+    """Return a snapshot of the hedging metrics."""
+    return _stats.as_dict()
+
+
+def reset_hedge_stats() -> Dict[str, Any]:
+    """Clear counters and latency samples, returning the final snapshot."""
+    global _stats
+    snapshot = _stats.as_dict()
+    _stats = HedgeStats()
+    return snapshot
@@ -0,0 +1,181 @@
+"""Shared async HTTP client for outbound downloads.
+
+Every image and document download goes through one pooled ``httpx.AsyncClient``
+per event loop, so DNS lookups, TCP connections and TLS sessions are reused
+across requests instead of being paid again for every file.
+"""
+
+import asyncio
+import json
+import os
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:  # HTTP/2 需要安装 h2（pip install "httpx[http2]"），没有时退回 HTTP/1.1
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class HttpClientStats:
+    """Connection-reuse counters for the shared client."""
+
+    requests: int = 0
+    new_connections: int = 0
+    http2_responses: int = 0
+    bytes_received: int = 0
+    errors: int = 0
+
+    @property
+    def reused_connections(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        reuse_ratio = self.reused_connections / self.requests if self.requests else 0.0
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "connection_reuse_ratio": round(reuse_ratio, 4),
+            "http2_responses": self.http2_responses,
+            "bytes_received": self.bytes_received,
+            "errors": self.errors,
+        }
+
+
+_stats = HttpClientStats()
+# httpx 的连接池绑定在创建它的事件循环上，所以按事件循环各维护一个 client
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_host_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+async def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    """httpcore trace hook: count connections that had to be freshly opened."""
+    if event_name == "connection.connect_tcp.complete":
+        _stats.new_connections += 1
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=True,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose_async_client() -> None:
+    """Close the client bound to the running event loop (e.g. on shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _host_semaphores.setdefault(loop, {})
+    host = urlsplit(url).netloc
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return semaphores[host]
+
+
+@asynccontextmanager
+async def stream(
+    method: str,
+    url: str,
+    *,
+    timeout: Optional[float] = None,
+    **kwargs: Any,
+) -> AsyncIterator[httpx.Response]:
+    """Open a streaming request on the shared client.
+
+    The per-host semaphore is held until the body has been consumed, so a single
+    slow host can never occupy the whole pool. Non-2xx responses raise
+    ``httpx.HTTPStatusError`` before any body is read.
+    """
+    client = get_async_client()
+    extensions = {"trace": _trace}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    async with _host_semaphore(url):
+        try:
+            async with client.stream(method, url, extensions=extensions, **kwargs) as response:
+                _stats.requests += 1
+                if response.http_version == "HTTP/2":
+                    _stats.http2_responses += 1
+                response.raise_for_status()
+                yield response
+        except httpx.HTTPError:
+            _stats.errors += 1
+            raise
+
+
+async def fetch_bytes(url: str, *, timeout: Optional[float] = None) -> bytes:
+    """Download a URL into memory, streaming the body in chunks."""
+    chunks = []
+    async with stream("GET", url, timeout=timeout) as response:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            _stats.bytes_received += len(chunk)
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def download_to_file(url: str, path: str, *, timeout: Optional[float] = None) -> str:
+    """Stream a URL straight to ``path`` without buffering the whole body.
+
+    File I/O runs in a worker thread so a slow disk does not stall the event loop.
+    """
+    async with stream("GET", url, timeout=timeout) as response:
+        f = await asyncio.to_thread(open, path, "wb")
+        try:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                _stats.bytes_received += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+    return path
+
+
+async def post_json(
+    url: str,
+    payload: Any,
+    *,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> Any:
+    """POST a JSON body on the shared client and decode the JSON response."""
+    async with stream("POST", url, json=payload, headers=headers, timeout=timeout) as response:
+        body = await response.aread()
+        _stats.bytes_received += len(body)
+    return json.loads(body)
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """Return a snapshot of the connection-reuse metrics."""
+    return _stats.as_dict()
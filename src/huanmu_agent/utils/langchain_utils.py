@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
@@ -13,9 +15,16 @@ def get_message_text(msg: BaseMessage) -> str:
     else:
         txts = [c if isinstance(c, str) else (c.get("text") or "") for c in content]
         return "".join(txts).strip()
+
+
+@lru_cache(maxsize=32)
 def load_chat_model(fully_specified_name: str, temperature: float) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
+    Instances are pooled per (name, temperature): chat models are stateless
+    between calls, and reusing one keeps its HTTP connection pool warm instead
+    of building a new client on every request.
+
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
     """
@@ -0,0 +1,263 @@
+"""Task-based model routing with latency/error-aware failover.
+
+Each task (triage, main reply, suggestion, ...) maps to an ordered list of
+fully specified model names. ``routed_chat_model(task, temperature)`` returns
+a drop-in stand-in for a chat model: ``invoke``/``ainvoke``/``astream`` plus
+``with_structured_output`` and ``bind_tools``, which stay routed. Each call
+tries the task's models in order and fails over to the next one on error.
+
+Every call is recorded per model in a rolling window. A model whose recent
+p95 latency exceeds the task's budget, or whose error rate exceeds
+``MAX_ERROR_RATE``, moves behind the healthy models until its samples age
+out of the window, so a slow provider stops receiving first-choice traffic.
+
+Routes can be overridden per task with ``MODEL_ROUTE_<TASK>`` (comma
+separated, e.g. ``MODEL_ROUTE_SUGGESTION=openai/gpt-4.1-mini,openai/gpt-4o``).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from constant import GOOGLE_VERTEX_GEMINI_FLASH, OPENAI_GPT41_MINI, OPENAI_GPT4_MINI
+from huanmu_agent.utils.langchain_utils import load_chat_model
+
+HEALTH_WINDOW_SECONDS = 300.0
+HEALTH_WINDOW_SIZE = 200
+# Fewer samples than this are too noisy to demote a model
+MIN_HEALTH_SAMPLES = 10
+MAX_ERROR_RATE = 0.2
+
+DEFAULT_FALLBACKS = [OPENAI_GPT4_MINI, OPENAI_GPT41_MINI, GOOGLE_VERTEX_GEMINI_FLASH]
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Ordered model candidates for a task and its p95 latency budget in seconds."""
+
+    models: Tuple[str, ...]
+    max_p95_latency: float
+
+
+MODEL_ROUTES: Dict[str, ModelRoute] = {
+    "triage": ModelRoute(tuple(DEFAULT_FALLBACKS), 5.0),
+    "main_reply": ModelRoute(tuple(DEFAULT_FALLBACKS), 15.0),
+    "suggestion": ModelRoute(tuple(DEFAULT_FALLBACKS), 15.0),
+    "comment": ModelRoute(tuple(DEFAULT_FALLBACKS), 10.0),
+    "vision_caption": ModelRoute((OPENAI_GPT4_MINI, GOOGLE_VERTEX_GEMINI_FLASH), 10.0),
+    "labeling": ModelRoute(tuple(DEFAULT_FALLBACKS), 30.0),
+    "report": ModelRoute(tuple(DEFAULT_FALLBACKS), 90.0),
+    "moment": ModelRoute(tuple(DEFAULT_FALLBACKS), 20.0),
+}
+
+
+class ModelHealth:
+    """Rolling latency/error window for one model. Thread-safe (sync calls run in worker threads)."""
+
+    def __init__(self, window_seconds: float = HEALTH_WINDOW_SECONDS, maxlen: int = HEALTH_WINDOW_SIZE) -> None:
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            return [s for s in self._samples if s[0] >= cutoff]
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = self._recent()
+        latencies = sorted(latency for _, latency, ok in recent if ok)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        errors = sum(1 for _, _, ok in recent if not ok)
+        return {
+            "samples": len(recent),
+            "p95_latency": p95,
+            "error_rate": errors / len(recent) if recent else 0.0,
+        }
+
+    def is_healthy(self, max_p95_latency: float) -> bool:
+        stats = self.snapshot()
+        if stats["samples"] < MIN_HEALTH_SAMPLES:
+            return True
+        if stats["error_rate"] > MAX_ERROR_RATE:
+            return False
+        return stats["p95_latency"] is None or stats["p95_latency"] <= max_p95_latency
+
+
+class ModelRouter:
+    """Orders each task's candidate models by recent health."""
+
+    def __init__(self, routes: Dict[str, ModelRoute]) -> None:
+        self.routes = dict(routes)
+        self._health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def route(self, task: str) -> ModelRoute:
+        override = os.environ.get(f"MODEL_ROUTE_{task.upper()}")
+        route = self.routes.get(task) or ModelRoute(tuple(DEFAULT_FALLBACKS), MODEL_ROUTES["main_reply"].max_p95_latency)
+        if override:
+            return ModelRoute(tuple(m.strip() for m in override.split(",") if m.strip()), route.max_p95_latency)
+        return route
+
+    def health(self, model: str) -> ModelHealth:
+        with self._lock:
+            if model not in self._health:
+                self._health[model] = ModelHealth()
+            return self._health[model]
+
+    def candidates(self, task: str, primary: Optional[str] = None) -> List[str]:
+        """Task models in order (``primary`` first), healthy ones ahead of unhealthy ones."""
+        route = self.route(task)
+        models = list(dict.fromkeys(([primary] if primary else []) + list(route.models)))
+        healthy = [m for m in models if self.health(m).is_healthy(route.max_p95_latency)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        self.health(model).record(latency, ok)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            models = list(self._health)
+        return {model: self.health(model).snapshot() for model in models}
+
+
+model_router = ModelRouter(MODEL_ROUTES)
+
+
+def provider_of(model: str) -> str:
+    """Provider prefix of a fully specified model name, e.g. ``openai``."""
+    return model.split("/", 1)[0]
+
+
+def structured_output_kwargs(model: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Adapt ``with_structured_output`` arguments to the provider of ``model``.
+
+    ``method="json_schema"`` with ``strict=True`` is OpenAI's constrained decoding;
+    other providers reject it, so on failover they get their default method.
+    """
+    if provider_of(model) == "openai":
+        return kwargs
+    return {k: v for k, v in kwargs.items() if k not in ("strict", "method")}
+
+
+class RoutedChatModel(Runnable):
+    """Chat-model stand-in that sends each call to the task's healthiest model.
+
+    ``build(chat_model, model)`` turns a loaded chat model and its fully specified
+    name into the runnable actually called (e.g. a ``with_structured_output``
+    chain adapted to the provider); ``with_structured_output`` and
+    ``bind_tools`` return new routed models with the step appended.
+    """
+
+    def __init__(
+        self,
+        task: str,
+        temperature: float,
+        *,
+        primary: Optional[str] = None,
+        router: Optional[ModelRouter] = None,
+        build: Optional[Callable[[Any, str], Runnable]] = None,
+    ) -> None:
+        self.task = task
+        self.temperature = temperature
+        self.primary = primary
+        self.router = router or model_router
+        self.build = build or (lambda chat_model, model: chat_model)
+        self._bound: Dict[str, Runnable] = {}
+
+    def _derive(self, step: Callable[[Runnable, str], Runnable]) -> "RoutedChatModel":
+        build = self.build
+        return RoutedChatModel(
+            self.task, self.temperature, primary=self.primary, router=self.router,
+            build=lambda chat_model, model: step(build(chat_model, model), model),
+        )
+
+    def with_structured_output(self, schema: Any, *, fallback_schema: Any = None, **kwargs: Any) -> "RoutedChatModel":
+        """Routed structured output; ``fallback_schema`` replaces ``schema`` on non-OpenAI models.
+
+        Without constrained decoding an enum schema turns an off-vocabulary value
+        into a validation error, so strict callers pass a plain-string variant
+        here and validate its output themselves.
+        """
+        def step(runnable: Runnable, model: str) -> Runnable:
+            target = schema if fallback_schema is None or provider_of(model) == "openai" else fallback_schema
+            return runnable.with_structured_output(target, **structured_output_kwargs(model, kwargs))
+
+        return self._derive(step)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "RoutedChatModel":
+        return self._derive(lambda runnable, model: runnable.bind_tools(tools, **kwargs))
+
+    def current_model(self) -> str:
+        """The model the next call tries first, given the route's current health order."""
+        return self.router.candidates(self.task, self.primary)[0]
+
+    def runnable_for(self, model: str) -> Runnable:
+        if model not in self._bound:
+            self._bound[model] = self.build(load_chat_model(model, self.temperature), model)
+        return self._bound[model]
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        error: Optional[Exception] = None
+        for model in self.router.candidates(self.task, self.primary):
+            start = time.monotonic()
+            try:
+                output = self.runnable_for(model).invoke(input, config, **kwargs)
+            except Exception as e:
+                self.router.record(model, time.monotonic() - start, False)
+                print(f"[DEBUG] {self.task} model {model} failed, trying next: {e}")
+                error = e
+                continue
+            self.router.record(model, time.monotonic() - start, True)
+            return output
+        raise error or RuntimeError(f"No models configured for task {self.task}")
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        error: Optional[Exception] = None
+        for model in self.router.candidates(self.task, self.primary):
+            start = time.monotonic()
+            try:
+                output = await self.runnable_for(model).ainvoke(input, config, **kwargs)
+            except Exception as e:
+                self.router.record(model, time.monotonic() - start, False)
+                print(f"[DEBUG] {self.task} model {model} failed, trying next: {e}")
+                error = e
+                continue
+            self.router.record(model, time.monotonic() - start, True)
+            return output
+        raise error or RuntimeError(f"No models configured for task {self.task}")
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        """Stream from the first model that produces output; failover only before the first chunk."""
+        error: Optional[Exception] = None
+        for model in self.router.candidates(self.task, self.primary):
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in self.runnable_for(model).astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.router.record(model, time.monotonic() - start, False)
+                if started:
+                    raise
+                print(f"[DEBUG] {self.task} model {model} failed, trying next: {e}")
+                error = e
+                continue
+            self.router.record(model, time.monotonic() - start, True)
+            return
+        raise error or RuntimeError(f"No models configured for task {self.task}")
+
+
+def routed_chat_model(task: str, temperature: float = 0.0, primary: Optional[str] = None) -> RoutedChatModel:
+    """Routed chat model for ``task``; ``primary`` (e.g. a per-request configured model) is tried first."""
+    return RoutedChatModel(task, temperature, primary=primary)
@@ -3,7 +3,9 @@ from typing import List
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import UnstructuredWordDocumentLoader
-import requests
+import httpx
+
+from huanmu_agent.utils.http_client import download_to_file
 
 
 def load_and_chunk_word_document(
@@ -61,7 +63,7 @@ def load_and_chunk_word_document(
 
     return chunked_docs
   
-def download_doc(file_url: str) -> str:
+async def download_doc(file_url: str) -> str:
     """
     Downloads a doc file from the given URL and saves it to the project root directory.
 
@@ -72,23 +74,20 @@ def download_doc(file_url: str) -> str:
         str: The path to the saved file.
 
     What does it do:
-        Downloads a file from a URL and saves it locally, returning the filename. Handles exceptions and reports errors.
+        Streams a file from a URL to local disk through the shared pooled HTTP client,
+        returning the filename. Handles exceptions and reports errors.
 
     When to use it:
         Use when you need to programmatically download a document from a URL and save it to your local environment, with error handling.
 
     How to use it:
-        Call pre_process_doc(url) with a valid file URL. It returns the saved filename or raises an exception if download fails.
+        Call `await download_doc(url)` with a valid file URL. It returns the saved filename or raises an exception if download fails.
     """
     try:
-        doc_response = requests.get(file_url)
-        doc_response.raise_for_status()
         # split url to get the filename
         filename = file_url.split("/")[-1]
-        with open(filename, "wb") as f:
-            f.write(doc_response.content)
-        return filename
-    except requests.exceptions.RequestException as e:
+        return await download_to_file(file_url, filename)
+    except httpx.HTTPError as e:
         print(f"Error downloading file from {file_url}: {e}")
         raise
     except Exception as e:
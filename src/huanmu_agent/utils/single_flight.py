@@ -0,0 +1,52 @@
+"""Single-flight deduplication for concurrent identical async calls.
+
+While a call for a key is in flight, later callers with the same key await
+that call instead of starting their own, and all of them receive the same
+result (or exception). Nothing is remembered once the call finishes; combine
+with ``TTLCache`` for that.
+"""
+
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one in-flight execution per key among concurrent callers."""
+
+    def __init__(self) -> None:
+        # 进行中的任务绑定在创建它的事件循环上，所以按事件循环分开保存
+        self._calls: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Task]]" = weakref.WeakKeyDictionary()
+        self.executions = 0
+        self.shared = 0
+
+    def _inflight(self) -> Dict[Hashable, asyncio.Task]:
+        return self._calls.setdefault(asyncio.get_running_loop(), {})
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn()`` unless an identical call is already in flight, and return its result.
+
+        The shared call runs as its own task, so a caller being cancelled does
+        not cancel the execution the other callers are waiting on.
+        """
+        inflight = self._inflight()
+        task = inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None) if inflight.get(key) is task else None)
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        try:
+            return len(self._inflight())
+        except RuntimeError:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"executions": self.executions, "shared": self.shared, "in_flight": self.in_flight()}
@@ -0,0 +1,73 @@
+"""Single-call structured generation for tool-less agents.
+
+``create_react_agent(tools=[], response_format=...)`` first runs a free-form
+chat call and then a second call to produce the structured response. Agents
+without tools only need the second one. ``create_structured_agent`` keeps the
+same call shape (state in; ``messages`` plus ``structured_response`` out) while
+making a single ``with_structured_output`` request.
+"""
+
+import inspect
+from typing import Any, Callable, Dict, Optional, Sequence, Type, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AnyMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+Prompt = Callable[..., Sequence[Union[AnyMessage, Dict[str, Any]]]]
+
+
+def _prompt_takes_config(prompt: Prompt) -> bool:
+    """Whether the prompt builder accepts ``(state, config)`` like create_react_agent prompts."""
+    try:
+        params = inspect.signature(prompt).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    positional = [
+        p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.VAR_POSITIONAL)
+    ]
+    return len(positional) >= 2 or any(p.kind == p.VAR_POSITIONAL for p in positional)
+
+
+def create_structured_agent(
+    model: BaseChatModel,
+    response_format: Type[BaseModel],
+    prompt: Prompt,
+    *,
+    name: Optional[str] = None,
+    **structured_output_kwargs: Any,
+) -> Runnable:
+    """Build a tool-less agent that makes exactly one structured-output call.
+
+    Args:
+        model: Chat model to call.
+        response_format: Pydantic model for the structured response.
+        prompt: Builds the model input from ``(state)`` or ``(state, config)``,
+            the same callables that were passed to ``create_react_agent``.
+        name: Run name shown in traces.
+        **structured_output_kwargs: Forwarded to ``with_structured_output``
+            (e.g. ``method="json_schema", strict=True``).
+
+    Returns:
+        A runnable mapping a state dict to the state plus ``structured_response``;
+        ``messages`` gets the structured response appended as an ``AIMessage``.
+    """
+    structured_model = model.with_structured_output(response_format, **structured_output_kwargs)
+    takes_config = _prompt_takes_config(prompt)
+
+    def build_messages(state: Dict[str, Any], config: Optional[RunnableConfig]):
+        return prompt(state, config or {}) if takes_config else prompt(state)
+
+    def result(state: Dict[str, Any], response: BaseModel) -> Dict[str, Any]:
+        messages = list(state.get("messages") or [])
+        messages.append(AIMessage(content=response.model_dump_json(), name=name))
+        return {**state, "messages": messages, "structured_response": response}
+
+    def invoke(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        return result(state, structured_model.invoke(build_messages(state, config), config))
+
+    async def ainvoke(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        return result(state, await structured_model.ainvoke(build_messages(state, config), config))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=name or response_format.__name__)
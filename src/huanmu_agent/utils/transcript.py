@@ -0,0 +1,117 @@
+"""Compact transcript encoding for analysis prompts.
+
+Interpolating a list of ``BaseMessage`` objects into a prompt embeds their
+Python repr (ids, ``additional_kwargs``, ``response_metadata`` and escaped
+unicode). ``format_transcript`` renders the same conversation as one
+``客户: …`` / ``顾问: …`` line per message instead.
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from langchain_core.messages import BaseMessage
+
+from huanmu_agent.utils.langchain_utils import get_message_text
+
+ROLE_LABELS: Dict[str, str] = {"human": "客户", "ai": "顾问"}
+
+# 常见的消息时间字段（网关写在 additional_kwargs / response_metadata 或 dict 消息里）
+TIMESTAMP_KEYS = ("timestamp", "create_time", "created_at", "send_time", "time")
+
+_ROLE_ALIASES = {"user": "human", "human": "human", "assistant": "ai", "ai": "ai"}
+_WHITESPACE = re.compile(r"\s+")
+_DATE_TIME = re.compile(r"^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2})")
+_BEIJING_TZ = ZoneInfo("Asia/Shanghai")
+
+
+def _message_role(msg: Any) -> Optional[str]:
+    if isinstance(msg, BaseMessage):
+        return _ROLE_ALIASES.get(msg.type)
+    if isinstance(msg, dict):
+        return _ROLE_ALIASES.get(msg.get("role") or msg.get("type"))
+    return None
+
+
+def _message_content(msg: Any) -> str:
+    if isinstance(msg, BaseMessage):
+        return get_message_text(msg)
+    content = msg.get("content", "") if isinstance(msg, dict) else ""
+    if isinstance(content, list):
+        content = "".join(c if isinstance(c, str) else (c.get("text") or "") for c in content)
+    return content if isinstance(content, str) else str(content)
+
+
+def _format_timestamp(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        # 兼容毫秒时间戳
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, tz=_BEIJING_TZ).strftime("%Y-%m-%d %H:%M")
+    return str(value)
+
+
+def _message_timestamp(msg: Any) -> Optional[str]:
+    if isinstance(msg, BaseMessage):
+        sources = (msg.additional_kwargs, msg.response_metadata)
+    elif isinstance(msg, dict):
+        sources = (msg, msg.get("additional_kwargs") or {})
+    else:
+        return None
+    for source in sources:
+        for key in TIMESTAMP_KEYS:
+            if key in source:
+                return _format_timestamp(source[key])
+    return None
+
+
+def format_transcript(
+    messages: Iterable[Any],
+    *,
+    include_roles: Sequence[str] = ("human", "ai"),
+    with_timestamps: bool = True,
+    role_labels: Optional[Dict[str, str]] = None,
+) -> str:
+    """Render messages as one compact ``角色: 内容`` line each.
+
+    Timestamps are written as ``HH:MM`` per line, with a ``[YYYY-MM-DD]`` line
+    whenever the date changes, so long histories do not repeat the date.
+
+    Args:
+        messages: ``BaseMessage`` objects or ``{"role", "content"}`` dicts.
+        include_roles: Which roles to keep ("human" and/or "ai"); system and
+            tool messages are always dropped. With a single role the speaker
+            label is redundant and omitted.
+        with_timestamps: Include message times when the message carries one.
+        role_labels: Override the speaker labels.
+
+    Returns:
+        str: The transcript, or an empty string if nothing matched.
+    """
+    labels = role_labels or ROLE_LABELS
+    show_labels = len(set(include_roles)) > 1
+    lines = []
+    current_date = None
+    for msg in messages:
+        role = _message_role(msg)
+        if role is None or role not in include_roles:
+            continue
+        text = _WHITESPACE.sub(" ", _message_content(msg)).strip()
+        if not text:
+            continue
+        line = f"{labels[role]}: {text}" if show_labels else text
+        if with_timestamps:
+            timestamp = _message_timestamp(msg)
+            match = _DATE_TIME.match(timestamp) if timestamp else None
+            if match:
+                date, time = match.groups()
+                if date != current_date:
+                    lines.append(f"[{date}]")
+                    current_date = date
+                line = f"{time} {line}"
+            elif timestamp:
+                line = f"[{timestamp}] {line}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -8,7 +8,7 @@ from typing import Annotated
 from langchain_core.runnables import ensure_config
 from langgraph.config import get_config
 
-from huanmu_agent.wechat.moment_agent import MOMENT_SYSTEM_PROMPT
+from huanmu_agent.wechat.prompts import MOMENT_SYSTEM_PROMPT
 
 @dataclass(kw_only=True)
 class Configuration:
@@ -30,6 +30,31 @@ class Configuration:
         },
     )
 
+    temperature: float = field(
+        default=0.7,
+        metadata={
+            "description": "The sampling temperature; a bit higher than usual for more creative social media copy."
+        },
+    )
+
+    topic: str = field(
+        default="",
+        metadata={"description": "The user's topic for the generated moments."},
+    )
+
+    generation_mode: str = field(
+        default="batch",
+        metadata={
+            "description": "'batch': one call returns all posts; "
+            "'parallel': one call per post, run concurrently."
+        },
+    )
+
+    max_variant_retries: int = field(
+        default=2,
+        metadata={"description": "Retries per post in parallel generation mode."},
+    )
+
     @classmethod
     def from_context(cls) -> Configuration:
         """Create a Configuration instance from a RunnableConfig object."""
@@ -1,43 +1,18 @@
-from langchain_core.messages import AnyMessage
+import asyncio
+from difflib import SequenceMatcher
+from langchain_core.messages import AIMessage, AnyMessage
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langgraph.prebuilt import create_react_agent
 from langgraph.graph import StateGraph, START
 from langgraph.prebuilt.chat_agent_executor import AgentState
-from langchain.chat_models import init_chat_model
+from functools import lru_cache
 from typing import List, Optional
-from langchain_core.runnables import RunnableConfig
-import asyncio
-
-MOMENT_SYSTEM_PROMPT = """
-你是一个微信朋友圈文案生成助手。
-根据以下输入参数，内容主题, 行业, 语言, 每个内容的字数限制, 生成数量, 来生成朋友圈文案。
-
-你需要从以下三个模板中选择一个最合适的来生成文案:
-
-模板1：生活分享类
-公式：[心情/槽点] + [讲个小故事] + [求互动/求推荐]
-示例 (晒咖啡)：续命水来了！😴 一上午被三个会轰炸，感觉灵魂已掏空。这杯拿铁是最后的倔强。大家今天都还好吗？
-
-模板2：工作/成长类
-公式：[抛出痛点/金句] + [你的感悟/解决方案] + [引发共鸣]
-示例 (晒加班)：所谓"稳定"，不是呆在原地，而是在任何变化中都有破局的能力。又是一个奋斗到深夜的晚上，敬给所有在路上奔跑的我们。#晚安，打工人#
-
-模板3：知识/好物分享类
-公式：[吸睛标题] + [核心亮点1, 2, 3] + [号召行动/在哪买]
-示例 (推荐一本书)：这本书，治好了我的精神内耗！年度必读Top3！
-作者关于"课题分离"的观点，简直醍醐灌顶。
-学会了如何拒绝别人，太爽了！
-如果你也常感到焦虑，一定要读读看！
-
-若数量大于1，则生成多个内容。
-你的输出应该是一个 list[WeChatMomentStructure] 对象。
-WeChatMomentStructure包含以下字段:
-- improved_moment: str (朋友圈文案内容)
-
-请根据 row_moments 的具体内容来决定使用哪个模板，并生成优化后的朋友圈文案。
-"""
+from langchain_core.runnables import Runnable, RunnableConfig
+from huanmu_agent.utils.model_router import routed_chat_model
+from huanmu_agent.utils.structured_output import create_structured_agent
+from huanmu_agent.wechat.configuration import Configuration
+from huanmu_agent.wechat.prompts import MOMENT_SYSTEM_PROMPT
 
 class WeChatMomentStructure(BaseModel):
     """Structure for a single WeChat Moments post."""
@@ -58,44 +33,131 @@ class WeChatAgentState(AgentState):
     error_message: Optional[str]
     structured_response: Optional[FinalWeChatMomentResponseFormat]
 
-class WeChatMomentConfigSchema(TypedDict):
-    system_prompt: str = MOMENT_SYSTEM_PROMPT
-    topic: str
-
 class WeChatAgentStateInput(TypedDict):
     row_moment: str
     moment_number: int
 
-# --- System Prompt ---
+# --- Model ---
 
-# Initialize chat model with OpenAI
-chat_model = init_chat_model(
-    model="gpt-3.5-turbo",
-    model_provider="openai",
-    temperature=0.7 # A bit more creative for social media
-)
+# The model comes from wechat.Configuration per call, so each tenant can pick its own
+# model via `configurable` without a redeploy. It is tried first, then the "moment"
+# route's fallbacks; load_chat_model pools the instances.
 
 def prompt(
     state: AgentState,
     config: RunnableConfig,
 ) -> list[AnyMessage]:
-    topic = config["configurable"].get("topic","")
-    system_prompt = config["configurable"].get("system_prompt", MOMENT_SYSTEM_PROMPT)
-    if not topic == "":
-        system_msg = f"{system_prompt} User's topic is {topic}"
+    configuration = Configuration.from_context()
+    if configuration.topic:
+        system_msg = f"{configuration.system_prompt} User's topic is {configuration.topic}"
     else:
-        system_msg = system_prompt
+        system_msg = configuration.system_prompt
     return [{"role": "system", "content": system_msg}] + state["messages"]
 
-wechat_generator_agent = create_react_agent(
-    model=chat_model,
-    tools=[],  # No external tools needed for this agent
-    name="wechat_moment_agent",
-    state_schema=WeChatAgentState,
-    config_schema=WeChatMomentConfigSchema,
-    response_format=FinalWeChatMomentResponseFormat,
-    prompt=prompt
-)
+@lru_cache(maxsize=16)
+def get_generator_agent(model: str, temperature: float) -> Runnable:
+    """Batch-mode agent for a model; no tools, so a single structured-output call is enough."""
+    return create_structured_agent(
+        routed_chat_model("moment", temperature, primary=model),
+        FinalWeChatMomentResponseFormat,
+        prompt,
+        name="wechat_moment_agent",
+    )
+
+@lru_cache(maxsize=16)
+def get_variant_model(model: str, temperature: float) -> Runnable:
+    """Parallel-mode model returning a single post."""
+    return routed_chat_model("moment", temperature, primary=model).with_structured_output(WeChatMomentStructure)
+
+# --- Parallel variant generation ---
+
+DEFAULT_MAX_VARIANT_CONCURRENCY = 8
+# Posts at least this similar (difflib ratio) to an earlier one are treated as duplicates
+VARIANT_SIMILARITY_THRESHOLD = 0.85
+
+def build_variant_messages(
+    row_moment: str, topic: str, system_prompt: str, index: int, total: int
+) -> list[dict]:
+    """Messages for generating the ``index``-th of ``total`` posts in its own call."""
+    user_msg = (
+        f"请帮我生成朋友圈文案。\n\n微信朋友圈原始内容：{row_moment}\n\n用户主题：{topic}\n\n"
+        f"本次只生成 1 条文案（第{index}条，共{total}条）。"
+    )
+    if total > 1:
+        user_msg += "请换一个切入角度或模板，不要与其他版本雷同。"
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_msg}]
+
+async def generate_variant(
+    variant_model: Runnable, messages: list[dict], config: RunnableConfig, retries: int
+) -> Optional[str]:
+    """Generate one post, retrying failed or empty outputs; None if every attempt fails."""
+    for attempt in range(retries + 1):
+        try:
+            response = await variant_model.ainvoke(messages, config)
+        except Exception as e:
+            print(f"[DEBUG] Moment variant failed (attempt {attempt + 1}): {e}")
+            continue
+        text = (response.improved_moment or "").strip() if response else ""
+        if text:
+            return text
+    return None
+
+def is_near_duplicate(text: str, kept: List[str], threshold: float = VARIANT_SIMILARITY_THRESHOLD) -> bool:
+    return any(SequenceMatcher(None, text, other).ratio() >= threshold for other in kept)
+
+async def wechat_variants_node(state: WeChatAgentState, config: RunnableConfig):
+    """
+    Node that generates each requested post in its own concurrent call.
+
+    Wall-clock time stays close to a single post regardless of moment_number,
+    and one malformed output only costs that variant's retry. Near-identical
+    posts are dropped and replaced by one extra round of calls.
+    """
+    configuration = Configuration.from_context()
+    row_moment = state.get("row_moment", "N/A")
+    moment_number = max(1, state.get("moment_number") or 1)
+    topic = configuration.topic or "N/A"
+    variant_model = get_variant_model(configuration.model, configuration.temperature)
+    semaphore = asyncio.Semaphore(DEFAULT_MAX_VARIANT_CONCURRENCY)
+
+    async def bounded(index: int, total: int) -> Optional[str]:
+        async with semaphore:
+            messages = build_variant_messages(row_moment, topic, configuration.system_prompt, index, total)
+            return await generate_variant(variant_model, messages, config, configuration.max_variant_retries)
+
+    kept: List[str] = []
+    # The second round only refills slots lost to failures or duplicates
+    for _ in range(2):
+        missing = moment_number - len(kept)
+        if missing <= 0:
+            break
+        start = len(kept) + 1
+        results = await asyncio.gather(*(bounded(start + i, moment_number) for i in range(missing)))
+        for text in results:
+            if text and len(kept) < moment_number and not is_near_duplicate(text, kept):
+                kept.append(text)
+
+    print(f"---WECHAT VARIANTS: {len(kept)}/{moment_number} generated---")
+    if not kept:
+        return {"error_message": "Error generating WeChat Moments content: all variants failed"}
+    error_message = None
+    if len(kept) < moment_number:
+        error_message = f"Only {len(kept)} of {moment_number} distinct moments were generated"
+    response = FinalWeChatMomentResponseFormat(
+        moments=[WeChatMomentStructure(improved_moment=text) for text in kept],
+        error_message=error_message,
+    )
+    return {
+        "structured_response": response,
+        "error_message": error_message,
+        "messages": [AIMessage(content=response.model_dump_json(), name="wechat_moment_agent")],
+    }
+
+def route_generation_mode(state: WeChatAgentState) -> str:
+    """Parallel mode generates one post per call; the default keeps the single batched call."""
+    if Configuration.from_context().generation_mode == "parallel":
+        return "wechat_variants"
+    return "wechat_generator"
 
 async def wechat_agent_node(state: WeChatAgentState, config: RunnableConfig):
     """
@@ -103,8 +165,9 @@ async def wechat_agent_node(state: WeChatAgentState, config: RunnableConfig):
     """    
     row_moment = state.get("row_moment", "N/A")
     moment_number = state.get("moment_number", 1)
-    topic = config["configurable"].get("topic", "N/A")
-    system_prompt = config["configurable"].get("system_prompt", MOMENT_SYSTEM_PROMPT)
+    configuration = Configuration.from_context()
+    topic = configuration.topic or "N/A"
+    system_prompt = configuration.system_prompt
     print(f"-------------------------------topic-----------------------------------------{topic}")
     print(f"-------------------------------system_prompt-----------------------------------------{system_prompt}")
     current_conversation_messages = state.get("messages", [])
@@ -119,11 +182,10 @@ async def wechat_agent_node(state: WeChatAgentState, config: RunnableConfig):
     
     try:
         print("---WECHAT AGENT EXECUTING---")
-        print(f"Invoking WeChat agent with topic: {row_moment}")
+        print(f"Invoking WeChat agent with topic: {row_moment}, model: {configuration.model}")
         
-        # run the blocking agent in a thread
-        agent_response = await asyncio.to_thread(
-            wechat_generator_agent.invoke,   # sync version
+        wechat_generator_agent = get_generator_agent(configuration.model, configuration.temperature)
+        agent_response = await wechat_generator_agent.ainvoke(
             {"messages": current_conversation_messages},
             config
         )
@@ -142,8 +204,9 @@ async def wechat_agent_node(state: WeChatAgentState, config: RunnableConfig):
 # --- Graph Definition ---
 
 wechat_moment_graph = (
-    StateGraph(WeChatAgentState, input=WeChatAgentStateInput, config_schema=WeChatMomentConfigSchema)
+    StateGraph(WeChatAgentState, input=WeChatAgentStateInput, config_schema=Configuration)
     .add_node("wechat_generator", wechat_agent_node)
-    .add_edge(START, "wechat_generator")
+    .add_node("wechat_variants", wechat_variants_node)
+    .add_conditional_edges(START, route_generation_mode, ["wechat_generator", "wechat_variants"])
     .compile()
 )
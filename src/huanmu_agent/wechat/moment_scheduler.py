@@ -0,0 +1,335 @@
+"""朋友圈定时生成队列 - 在发布时间之前预生成文案.
+
+生成任务带发布时间（publish_at）写入本地 SQLite，提前 ``lead_time`` 秒变为可执行；
+固定数量的 worker 协程从队列领取到期任务，调用 ``wechat_moment_graph`` 生成文案并把
+结果写回数据库。高峰期发布时直接读取已生成的内容，不再等待模型调用。
+
+任务状态: pending -> running -> ready -> published；失败会带退避重新排队，
+超过最大尝试次数或重试时间已到发布时间后为 failed。worker 崩溃时，租约过期的 running 任务会被重新领取，
+同样受最大尝试次数和发布时间限制；写回结果时按尝试次数校验租约，过期 worker 的结果会被丢弃。
+
+用法:
+    PYTHONPATH=src:. python -m huanmu_agent.wechat.moment_scheduler enqueue moments.db \
+        --row-moment "..." --publish-at 1767225600 [--number 3] [--topic ...]
+    PYTHONPATH=src:. python -m huanmu_agent.wechat.moment_scheduler worker moments.db [--concurrency 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_LEAD_TIME = float(os.environ.get("MOMENT_SCHEDULE_LEAD_TIME", "1800"))
+DEFAULT_CONCURRENCY = int(os.environ.get("MOMENT_SCHEDULE_CONCURRENCY", "4"))
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_MAX_ATTEMPTS = 3
+# running 任务超过租约仍未完成，视为 worker 已崩溃
+DEFAULT_LEASE_SECONDS = 600.0
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_READY = "ready"
+STATUS_PUBLISHED = "published"
+STATUS_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moment_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_key TEXT UNIQUE,
+    row_moment TEXT NOT NULL,
+    moment_number INTEGER NOT NULL,
+    configurable TEXT NOT NULL,
+    publish_at REAL NOT NULL,
+    run_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    moments TEXT,
+    error_message TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_moment_jobs_due ON moment_jobs (status, run_at);
+"""
+
+# (row_moment, moment_number, configurable) -> 文案列表
+GenerateFn = Callable[[str, int, Dict[str, Any]], Awaitable[List[str]]]
+
+
+@dataclass
+class MomentJob:
+    id: int
+    job_key: Optional[str]
+    row_moment: str
+    moment_number: int
+    configurable: Dict[str, Any]
+    publish_at: float
+    run_at: float
+    status: str
+    attempts: int
+    moments: Optional[List[str]] = None
+    error_message: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "MomentJob":
+        return cls(
+            id=row["id"],
+            job_key=row["job_key"],
+            row_moment=row["row_moment"],
+            moment_number=row["moment_number"],
+            configurable=json.loads(row["configurable"]),
+            publish_at=row["publish_at"],
+            run_at=row["run_at"],
+            status=row["status"],
+            attempts=row["attempts"],
+            moments=json.loads(row["moments"]) if row["moments"] else None,
+            error_message=row["error_message"],
+        )
+
+
+class MomentJobStore:
+    """SQLite 持久化的任务队列；每次操作都很小，直接在事件循环里同步执行."""
+
+    def __init__(self, path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # isolation_level=None：事务由下面显式的 BEGIN IMMEDIATE 控制
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(
+        self,
+        row_moment: str,
+        publish_at: float,
+        *,
+        moment_number: int = 1,
+        configurable: Optional[Dict[str, Any]] = None,
+        lead_time: float = DEFAULT_LEAD_TIME,
+        job_key: Optional[str] = None,
+    ) -> int:
+        """新增生成任务，返回任务 id；同一 job_key 重复提交时返回已有任务."""
+        now = time.time()
+        try:
+            cursor = self._conn.execute(
+                "INSERT INTO moment_jobs (job_key, row_moment, moment_number, configurable, publish_at, run_at,"
+                " status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_key, row_moment, moment_number,
+                    json.dumps(configurable or {}, ensure_ascii=False),
+                    publish_at, publish_at - lead_time, STATUS_PENDING, now, now,
+                ),
+            )
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            row = self._conn.execute("SELECT id FROM moment_jobs WHERE job_key = ?", (job_key,)).fetchone()
+            return row["id"]
+
+    def claim_due(self, now: Optional[float] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Optional[MomentJob]:
+        """领取一个到期任务（含租约过期的 running 任务）并标记为 running.
+
+        租约过期的任务已达 max_attempts 或已到发布时间时不再领取，直接标记为 failed。
+        """
+        now = time.time() if now is None else now
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "UPDATE moment_jobs SET status = ?, lease_until = NULL, error_message = ?, updated_at = ?"
+                " WHERE status = ? AND lease_until < ? AND (attempts >= ? OR publish_at <= ?)",
+                (STATUS_FAILED, "worker 租约过期，已达最大尝试次数或已过发布时间", now,
+                 STATUS_RUNNING, now, max_attempts, now),
+            )
+            row = self._conn.execute(
+                "SELECT * FROM moment_jobs WHERE (status = ? AND run_at <= ?) OR (status = ? AND lease_until < ?)"
+                " ORDER BY run_at LIMIT 1",
+                (STATUS_PENDING, now, STATUS_RUNNING, now),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute(
+                "UPDATE moment_jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, now + self.lease_seconds, now, row["id"]),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        job = MomentJob.from_row(row)
+        job.status, job.attempts = STATUS_RUNNING, job.attempts + 1
+        return job
+
+    def mark_ready(self, job_id: int, moments: List[str], attempt: Optional[int] = None) -> bool:
+        """写回生成结果；给出 attempt 时只有仍持有该次租约的 worker 能写入，返回是否写入."""
+        return self._update(job_id, attempt, status=STATUS_READY, moments=json.dumps(moments, ensure_ascii=False),
+                            error_message=None, lease_until=None)
+
+    def mark_failed(self, job_id: int, error_message: str, retry_at: Optional[float] = None,
+                    attempt: Optional[int] = None) -> bool:
+        """记录失败；给出 retry_at 时重新排队，否则标记为最终失败. attempt 同 mark_ready."""
+        if retry_at is None:
+            return self._update(job_id, attempt, status=STATUS_FAILED, error_message=error_message, lease_until=None)
+        return self._update(job_id, attempt, status=STATUS_PENDING, error_message=error_message, run_at=retry_at,
+                            lease_until=None)
+
+    def take_ready(self, job_id: int) -> Optional[List[str]]:
+        """发布时取出已生成的文案并标记为 published；尚未生成好或已被取走时返回 None."""
+        # 条件更新保证多个发布进程并发调用时只有一个能取到文案
+        cursor = self._conn.execute(
+            "UPDATE moment_jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_PUBLISHED, time.time(), job_id, STATUS_READY),
+        )
+        if cursor.rowcount != 1:
+            return None
+        return self.get(job_id).moments
+
+    def get(self, job_id: int) -> Optional[MomentJob]:
+        row = self._conn.execute("SELECT * FROM moment_jobs WHERE id = ?", (job_id,)).fetchone()
+        return MomentJob.from_row(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM moment_jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def _update(self, job_id: int, attempt: Optional[int] = None, **columns: Any) -> bool:
+        """更新任务；给出 attempt 时要求任务仍是该次领取的 running 状态（租约令牌）."""
+        columns["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        if attempt is None:
+            cursor = self._conn.execute(f"UPDATE moment_jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+        else:
+            cursor = self._conn.execute(
+                f"UPDATE moment_jobs SET {assignments} WHERE id = ? AND status = ? AND attempts = ?",
+                (*columns.values(), job_id, STATUS_RUNNING, attempt),
+            )
+        return cursor.rowcount == 1
+
+
+async def generate_moments(row_moment: str, moment_number: int, configurable: Dict[str, Any]) -> List[str]:
+    """调用 wechat_moment_graph 生成文案；没有任何文案时抛出异常以便重试."""
+    # 延迟导入：只管理队列（enqueue/take_ready）时不需要初始化模型
+    from huanmu_agent.wechat.moment_agent import wechat_moment_graph
+
+    result = await wechat_moment_graph.ainvoke(
+        {"row_moment": row_moment, "moment_number": moment_number},
+        {"configurable": configurable},
+    )
+    response = result.get("structured_response")
+    moments = [m.improved_moment for m in response.moments] if response else []
+    if not moments:
+        raise RuntimeError(result.get("error_message") or "没有生成任何朋友圈文案")
+    return moments
+
+
+@dataclass
+class SchedulerStats:
+    succeeded: int = 0
+    retried: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"succeeded": self.succeeded, "retried": self.retried, "failed": self.failed}
+
+
+@dataclass
+class MomentScheduler:
+    """用固定数量的 worker 协程消费到期的生成任务."""
+
+    store: MomentJobStore
+    concurrency: int = DEFAULT_CONCURRENCY
+    poll_interval: float = DEFAULT_POLL_INTERVAL
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    generate_fn: GenerateFn = generate_moments
+    stats: SchedulerStats = field(default_factory=SchedulerStats)
+
+    async def process(self, job: MomentJob) -> None:
+        try:
+            moments = await self.generate_fn(job.row_moment, job.moment_number, job.configurable)
+        except Exception as e:
+            print(f"[DEBUG] 朋友圈任务 {job.id} 生成失败（第{job.attempts}次）: {e}")
+            retry_at = time.time() + min(2 ** job.attempts * 10, 300)
+            # 重试只在发布时间之前有意义，赶不上发布就直接标记失败
+            if job.attempts >= self.max_attempts or retry_at >= job.publish_at:
+                if self.store.mark_failed(job.id, str(e), attempt=job.attempts):
+                    self.stats.failed += 1
+            elif self.store.mark_failed(job.id, str(e), retry_at=retry_at, attempt=job.attempts):
+                self.stats.retried += 1
+            return
+        if self.store.mark_ready(job.id, moments, attempt=job.attempts):
+            self.stats.succeeded += 1
+        else:
+            print(f"[DEBUG] 朋友圈任务 {job.id} 的租约已被其他 worker 接管，丢弃本次结果")
+
+    async def worker(self, stop: Optional[asyncio.Event], idle_exit: bool) -> None:
+        while stop is None or not stop.is_set():
+            job = self.store.claim_due(max_attempts=self.max_attempts)
+            if job is not None:
+                await self.process(job)
+                continue
+            if idle_exit:
+                return
+            if stop is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """持续轮询到期任务，直到 stop 被设置."""
+        await asyncio.gather(*(self.worker(stop, idle_exit=False) for _ in range(max(1, self.concurrency))))
+
+    async def drain(self) -> Dict[str, int]:
+        """处理当前所有到期任务后返回，适合由 cron 定时调用."""
+        await asyncio.gather(*(self.worker(None, idle_exit=True) for _ in range(max(1, self.concurrency))))
+        return self.stats.as_dict()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="朋友圈文案定时预生成队列")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="新增生成任务")
+    enqueue.add_argument("db")
+    enqueue.add_argument("--row-moment", required=True)
+    enqueue.add_argument("--publish-at", type=float, required=True, help="发布时间（Unix 时间戳）")
+    enqueue.add_argument("--number", type=int, default=1)
+    enqueue.add_argument("--topic", default="")
+    enqueue.add_argument("--lead-time", type=float, default=DEFAULT_LEAD_TIME, help="提前多少秒生成")
+    enqueue.add_argument("--job-key", default=None, help="幂等键，重复提交时不会新建任务")
+
+    worker = subparsers.add_parser("worker", help="运行 worker 消费到期任务")
+    worker.add_argument("db")
+    worker.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    worker.add_argument("--once", action="store_true", help="处理完当前到期任务后退出")
+    args = parser.parse_args()
+
+    store = MomentJobStore(args.db)
+    if args.command == "enqueue":
+        job_id = store.enqueue(
+            args.row_moment,
+            args.publish_at,
+            moment_number=args.number,
+            configurable={"topic": args.topic} if args.topic else {},
+            lead_time=args.lead_time,
+            job_key=args.job_key,
+        )
+        print(json.dumps({"job_id": job_id}))
+        return
+    scheduler = MomentScheduler(store, concurrency=args.concurrency)
+    if args.once:
+        print(json.dumps(asyncio.run(scheduler.drain())))
+    else:
+        asyncio.run(scheduler.run())
+
+
+if __name__ == "__main__":
+    main()
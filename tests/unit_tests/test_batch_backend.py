@@ -0,0 +1,98 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Optional
+
+from pydantic import BaseModel
+
+from huanmu_agent.offline.batch_backend import BatchFailedError, BatchJob, OpenAIBatchBackend
+
+
+class FakeBatchClient:
+    """In-memory stand-in for the OpenAI files/batches endpoints."""
+
+    def __init__(self, handler, polls_until_done: int = 2, status: str = "completed") -> None:
+        self.handler = handler
+        self.polls_until_done = polls_until_done
+        self.final_status = status
+        self.uploaded = {}
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self._batches = {}
+
+    async def _create_file(self, file, purpose):
+        file_id = f"file-{len(self.uploaded)}"
+        self.uploaded[file_id] = file[1].decode("utf-8")
+        return SimpleNamespace(id=file_id)
+
+    async def _file_content(self, file_id):
+        return SimpleNamespace(text=self.uploaded[file_id])
+
+    async def _create_batch(self, input_file_id, endpoint, completion_window, metadata):
+        batch_id = f"batch-{len(self._batches)}"
+        self._batches[batch_id] = {"input": input_file_id, "polls": 0}
+        return SimpleNamespace(id=batch_id)
+
+    async def _retrieve_batch(self, batch_id):
+        batch = self._batches[batch_id]
+        batch["polls"] += 1
+        if batch["polls"] < self.polls_until_done:
+            return SimpleNamespace(id=batch_id, status="in_progress")
+        output_lines = []
+        for line in self.uploaded[batch["input"]].splitlines():
+            request = json.loads(line)
+            status_code, body = self.handler(request["body"])
+            output_lines.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "response": {"status_code": status_code, "body": body},
+                "error": None,
+            }))
+        output_id = f"file-{len(self.uploaded)}"
+        self.uploaded[output_id] = "\n".join(output_lines)
+        return SimpleNamespace(id=batch_id, status=self.final_status, output_file_id=output_id, error_file_id=None)
+
+
+class Greeting(BaseModel):
+    text: str
+    error_message: Optional[str] = None
+
+
+JOB = BatchJob(
+    name="greeting",
+    build_messages=lambda state: [{"role": "user", "content": state["name"]}],
+    response_model=Greeting,
+    to_output=lambda response: {"structured_response": response},
+)
+
+
+def _handler(body):
+    name = body["messages"][0]["content"]
+    if name == "bad":
+        return 400, {"error": {"message": "invalid request"}}
+    content = json.dumps({"text": f"hi {name}"})
+    return 200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def test_batch_results_map_back_to_graph_outputs() -> None:
+    client = FakeBatchClient(_handler)
+    backend = OpenAIBatchBackend(client, model="test-model", poll_interval=0)
+    items = [("c1", {"name": "amy"}), ("c2", {"name": "bad"}), ("c3", {"name": "bo"})]
+    results = asyncio.run(backend.run(JOB, items))
+
+    request = json.loads(client.uploaded["file-0"].splitlines()[0])
+    assert request["body"]["model"] == "test-model"
+    assert request["body"]["response_format"]["json_schema"]["name"] == "Greeting"
+    assert results["c1"]["structured_response"].text == "hi amy"
+    assert results["c3"]["structured_response"].text == "hi bo"
+    assert "invalid request" in results["c2"]["error_message"]
+
+
+def test_failed_batch_raises() -> None:
+    client = FakeBatchClient(_handler, polls_until_done=1, status="expired")
+    backend = OpenAIBatchBackend(client, poll_interval=0)
+    try:
+        asyncio.run(backend.run(JOB, [("c1", {"name": "amy"})]))
+    except BatchFailedError:
+        pass
+    else:
+        raise AssertionError("expected BatchFailedError")
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from huanmu_agent.user_profile import batch_label
+from huanmu_agent.user_profile.batch_label import STATUS_ERROR, STATUS_OK, load_completed_ids, run_batch_labeling
+
+
+def _read_rows(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_resume_truncates_partial_line_and_skips_completed(tmp_path) -> None:
+    output = tmp_path / "labels.jsonl"
+    output.write_text(
+        json.dumps({"customer_id": "a", "status": STATUS_OK, "labels": {}}) + "\n"
+        + json.dumps({"customer_id": "b", "status": STATUS_ERROR, "error_message": "boom"}) + "\n"
+        + '{"customer_id": "c", "sta',
+        encoding="utf-8",
+    )
+    assert load_completed_ids(str(output)) == {"a"}
+    assert output.read_text(encoding="utf-8").endswith("\n")
+
+    labeled = []
+
+    async def fake_label(messages):
+        labeled.append(messages[0])
+        return {"stage": messages[0]}
+
+    records = [("a", ["a"]), ("b", ["b"]), ("c", ["c"]), ("c", ["c"])]
+    stats = asyncio.run(run_batch_labeling(
+        records, str(output), requests_per_second=1000, provider="test-resume", label_fn=fake_label,
+    ))
+
+    assert sorted(labeled) == ["b", "c"]
+    # Completed "a" and the duplicate "c" are both skipped
+    assert stats["skipped"] == 2 and stats["succeeded"] == 2
+    rows = _read_rows(output)
+    assert [row["customer_id"] for row in rows[:2]] == ["a", "b"]
+    assert {row["customer_id"] for row in rows[2:] if row["status"] == STATUS_OK} == {"b", "c"}
+
+
+def test_retry_then_success_and_permanent_failure(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(batch_label, "retry_delay", lambda attempt: 0)
+    output = tmp_path / "labels.jsonl"
+    calls = {}
+
+    async def flaky_label(messages):
+        customer_id = messages[0]
+        calls[customer_id] = calls.get(customer_id, 0) + 1
+        if customer_id == "bad" or calls[customer_id] == 1:
+            raise RuntimeError(f"{customer_id} failed")
+        return {"stage": "ok"}
+
+    stats = asyncio.run(run_batch_labeling(
+        [("flaky", ["flaky"]), ("bad", ["bad"])], str(output),
+        requests_per_second=1000, provider="test-retry", max_retries=2, label_fn=flaky_label,
+    ))
+
+    assert calls == {"flaky": 2, "bad": 3}
+    assert stats["succeeded"] == 1 and stats["failed"] == 1 and stats["retries"] == 3
+    rows = {row["customer_id"]: row for row in _read_rows(output)}
+    assert rows["flaky"]["status"] == STATUS_OK
+    assert rows["bad"]["status"] == STATUS_ERROR and rows["bad"]["error_message"] == "bad failed"
+    assert load_completed_ids(str(output)) == {"flaky"}
+
+
+def test_graph_error_message_reaches_the_result(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(batch_label, "retry_delay", lambda attempt: 0)
+
+    class FailingGraph:
+        async def ainvoke(self, input, config=None, **kwargs):
+            return {"structured_response": None, "error_message": "labeling model timed out"}
+
+    monkeypatch.setattr(batch_label, "profile_label_graph", FailingGraph())
+    output = tmp_path / "labels.jsonl"
+    asyncio.run(run_batch_labeling([("a", ["hi"])], str(output), requests_per_second=1000, provider="test-error"))
+    [row] = _read_rows(output)
+    assert (row["status"], row["error_message"]) == (STATUS_ERROR, "labeling model timed out")
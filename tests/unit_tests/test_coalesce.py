@@ -0,0 +1,113 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Annotated, Optional, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import START, StateGraph, add_messages
+
+from huanmu_agent.utils.coalesce import coalesce_graph, coalesce_key
+
+
+class State(TypedDict):
+    query: str
+    answer: str
+
+
+def test_concurrent_identical_requests_run_graph_once() -> None:
+    runs = []
+
+    async def answer(state: State) -> dict:
+        runs.append(state["query"])
+        await asyncio.sleep(0.01)
+        return {"answer": state["query"].upper()}
+
+    graph = StateGraph(State).add_node("respond", answer).add_edge(START, "respond").compile(name="echo")
+    coalesced = coalesce_graph(graph, "echo")
+
+    async def main():
+        return await asyncio.gather(
+            *(coalesced.ainvoke({"query": "hi"}, {"configurable": {"run_id": str(i)}}) for i in range(3)),
+            coalesced.ainvoke({"query": "bye"}),
+        )
+
+    results = asyncio.run(main())
+    assert [r["answer"] for r in results] == ["HI", "HI", "HI", "BYE"]
+    assert sorted(runs) == ["bye", "hi"]
+
+
+@dataclass
+class DataclassState:
+    messages: Annotated[Sequence[AnyMessage], add_messages] = field(default_factory=list)
+    reply: str = ""
+
+
+def test_dataclass_state_graph_is_coalesced() -> None:
+    runs = []
+
+    async def respond(state: DataclassState) -> dict:
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {"messages": [AIMessage("ok")], "reply": "ok"}
+
+    graph = StateGraph(DataclassState).add_node("respond", respond).add_edge(START, "respond").compile()
+    coalesced = coalesce_graph(graph, "agent")
+
+    async def main():
+        return await asyncio.gather(*(coalesced.ainvoke({"messages": [HumanMessage("hi")]}) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert [r["reply"] for r in results] == ["ok"] * 3
+    assert len(runs) == 1
+
+
+def test_key_ignores_message_ids_and_run_ids_but_not_threads() -> None:
+    a = coalesce_key("g", {"messages": [HumanMessage("hi", id="1")]}, {"configurable": {"run_id": "a", "number": 3}})
+    b = coalesce_key("g", {"messages": [HumanMessage("hi", id="2")]}, {"configurable": {"run_id": "b", "number": 3}})
+    c = coalesce_key("g", {"messages": [HumanMessage("hi")]}, {"configurable": {"number": 5}})
+    assert a == b != c
+    thread_a = coalesce_key("g", {"messages": [HumanMessage("hi")]}, {"configurable": {"thread_id": "a"}})
+    thread_b = coalesce_key("g", {"messages": [HumanMessage("hi")]}, {"configurable": {"thread_id": "b"}})
+    assert thread_a != thread_b
+
+
+class ChatState(TypedDict):
+    messages: Annotated[Sequence[AnyMessage], add_messages]
+    human_control: Optional[bool]
+    last_message: str
+
+
+class ChatInput(TypedDict):
+    messages: Annotated[Sequence[AnyMessage], add_messages]
+    human_control: Optional[bool]
+
+
+class ChatOutput(TypedDict):
+    last_message: str
+
+
+def test_checkpointed_thread_keeps_full_history() -> None:
+    async def reply(state: ChatState) -> dict:
+        text = f"reply{len(state['messages'])}"
+        return {"messages": [AIMessage(text)], "human_control": True, "last_message": text}
+
+    def build():
+        return (
+            StateGraph(ChatState, input=ChatInput, output=ChatOutput)
+            .add_node("reply", reply)
+            .add_edge(START, "reply")
+        )
+
+    plain = build().compile(checkpointer=MemorySaver())
+    coalesced = coalesce_graph(build().compile(), "chat")
+    coalesced.checkpointer = MemorySaver()
+
+    def history(graph) -> tuple:
+        config = {"configurable": {"thread_id": "t"}}
+        for text in ("hi", "again"):
+            asyncio.run(graph.ainvoke({"messages": [HumanMessage(text)]}, config))
+        values = graph.get_state(config).values
+        return [m.content for m in values["messages"]], values.get("human_control")
+
+    assert history(plain) == (["hi", "reply1", "again", "reply3"], True)
+    assert history(coalesced) == (["hi", "reply1", "again", "reply3"], True)
@@ -0,0 +1,54 @@
+from huanmu_agent.Post_Comments.content_gate import (
+    SKIP_AD,
+    SKIP_BLOCKED,
+    SKIP_EMPTY,
+    SKIP_URL_ONLY,
+    classify_post,
+    get_gate_stats,
+    record_gate_result,
+)
+
+
+def test_normal_post_passes() -> None:
+    assert classify_post("今天做了红烧肉", None, "今天做了红烧肉") is None
+    assert classify_post("", ["https://a.com/1.jpg"], "\n\n一盘红烧肉") is None
+
+
+def test_personal_shopping_posts_are_not_ads() -> None:
+    for post in (
+        "今天下单了包邮的裙子",
+        "秒杀到一双鞋，还包邮，开心",
+        "领了优惠券买咖啡，投资一下自己的快乐",
+        "朋友做微商代理，给我寄了面膜试试",
+    ):
+        assert classify_post(post, None, post) is None, post
+
+
+def test_promotions_with_contact_are_ads() -> None:
+    post = "厂家直销，微信：shop_abc123"
+    assert classify_post(post, None, post) == SKIP_AD
+    post = "一件代发，有意者加V 13812345678"
+    assert classify_post(post, None, post) == SKIP_AD
+
+
+def test_silence_worthy_posts_are_skipped() -> None:
+    assert classify_post("", [], "") == SKIP_EMPTY
+    assert classify_post("。。。。。。", None, "。。。。。。") == SKIP_EMPTY
+    assert classify_post("https://shop.example.com/item/1", None, "https://shop.example.com/item/1") == SKIP_URL_ONLY
+    assert classify_post("微商代理，月入过万，点击链接了解详情", None, "微商代理，月入过万，点击链接了解详情") == SKIP_AD
+    assert classify_post("法轮大法好", None, "法轮大法好") == SKIP_BLOCKED
+
+
+def test_everyday_wording_is_not_blocked() -> None:
+    for post in ("今天热杀了", "去区政府办了户口", "累得要弄死我了", "狗狗去世了，好难过"):
+        assert classify_post(post, None, post) is None, post
+
+
+def test_gate_stats_count_skipped_calls() -> None:
+    before = get_gate_stats()
+    record_gate_result(SKIP_AD)
+    record_gate_result(None)
+    after = get_gate_stats()
+    assert after["skipped"] - before.get("skipped", 0) == 1
+    assert after["skipped:ad"] - before.get("skipped:ad", 0) == 1
+    assert after["checked"] - before.get("checked", 0) == 2
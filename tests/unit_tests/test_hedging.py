@@ -0,0 +1,64 @@
+import asyncio
+
+from huanmu_agent.utils import hedging
+
+
+class FakeStream:
+    def __init__(self, delay: float, chunks=("a", "b"), error: Exception = None) -> None:
+        self.delay = delay
+        self.chunks = chunks
+        self.error = error
+        self.cancelled = False
+
+    async def astream(self, input, config=None):
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            for chunk in self.chunks:
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def test_slow_primary_is_hedged_and_cancelled() -> None:
+    hedging.reset_hedge_stats()
+    primary, backup = FakeStream(1.0, ("slow",)), FakeStream(0.01, ("fa", "st"))
+
+    async def main():
+        fast = await hedging.hedged_invoke(FakeStream(0.0), None, key="t")
+        hedged = await hedging.hedged_invoke(primary, None, backup=backup, key="t")
+        return fast, hedged
+
+    original = hedging.DEFAULT_HEDGE_DELAY
+    hedging.DEFAULT_HEDGE_DELAY = 0.05
+    try:
+        fast, hedged = asyncio.run(main())
+    finally:
+        hedging.DEFAULT_HEDGE_DELAY = original
+    assert (fast, hedged) == ("ab", "fast")
+    assert primary.cancelled
+    stats = hedging.get_hedge_stats()
+    assert (stats["requests"], stats["hedged"], stats["primary_wins"], stats["backup_wins"]) == (2, 1, 1, 1)
+    # The fast primary's latency plus the cancelled primary's censored one; the backup is not sampled
+    samples = list(hedging._stats.first_token_latencies["t"])
+    assert len(samples) == 2
+    assert samples[1] >= 0.05
+
+
+def test_primary_error_falls_through_to_backup() -> None:
+    hedging.reset_hedge_stats()
+    result = asyncio.run(hedging.hedged_invoke(
+        FakeStream(0.0, error=TimeoutError("boom")), None, backup=FakeStream(0.0, ("ok",)), key="t"
+    ))
+    assert result == "ok"
+    assert hedging.get_hedge_stats()["backup_wins"] == 1
+
+
+def test_delay_follows_observed_percentile() -> None:
+    hedging.reset_hedge_stats()
+    for i in range(100):
+        hedging.record_first_token("k", (i + 1) / 100)
+    assert hedging.hedge_delay("k", 95.0) == 0.96
+    assert hedging.hedge_delay("unknown", 95.0) == hedging.DEFAULT_HEDGE_DELAY
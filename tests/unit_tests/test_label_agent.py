@@ -0,0 +1,28 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from huanmu_agent.user_profile import label_agent
+
+
+def test_constrained_decoding_follows_the_current_route(monkeypatch) -> None:
+    monkeypatch.setenv("MODEL_ROUTE_LABELING", "openai/gpt-4o-mini,google_vertexai/gemini-2.0-flash")
+    assert label_agent.use_constrained_decoding({})
+    monkeypatch.setenv("MODEL_ROUTE_LABELING", "google_vertexai/gemini-2.0-flash,openai/gpt-4o-mini")
+    assert not label_agent.use_constrained_decoding({})
+    assert label_agent.use_constrained_decoding({"configurable": {"constrained_decoding": True}})
+
+
+def test_constrained_path_output_is_validated(monkeypatch) -> None:
+    # What a non-OpenAI fallback returns: free-form labels outside the vocabulary
+    empty = {name: None for name in label_agent.ProfileLabelFallback.model_fields}
+    output = label_agent.ProfileLabelFallback(**{**empty, "character": ["谨慎"], "emotion": ["开心"]})
+    monkeypatch.setattr(label_agent, "constrained_label_model", RunnableLambda(lambda _input: output))
+
+    result = asyncio.run(label_agent.profile_agent_node(
+        {"messages": [HumanMessage("我再考虑一下")]}, {"configurable": {"constrained_decoding": True}}
+    ))
+    labels = result["structured_response"].user_profile_label
+    assert labels.character == "谨慎型"
+    assert labels.emotion is None
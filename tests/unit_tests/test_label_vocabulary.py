@@ -0,0 +1,86 @@
+import pytest
+from pydantic import ValidationError
+
+from huanmu_agent.user_profile.label_vocabulary import (
+    LABEL_FIELDS,
+    LABEL_VOCABULARY,
+    build_label_enum_model,
+    enum_labels_to_fields,
+    merge_label_delta,
+    validate_label_fields,
+)
+
+
+def test_vocabulary_index() -> None:
+    assert "谨慎型" in LABEL_VOCABULARY["character"]
+    assert "purchase_intent_score" not in LABEL_VOCABULARY
+    assert set(LABEL_FIELDS["隆鼻"]) == {"current_use", "potential_needs"}
+
+
+def test_valid_labels_are_kept_and_deduplicated() -> None:
+    labels, report = validate_label_fields({"emotion": "焦虑，犹豫、焦虑", "age": "26-35岁", "region": None})
+    assert labels == {"emotion": "焦虑,犹豫", "age": "26-35岁", "region": None}
+    assert not report.changed
+
+
+def test_near_misses_are_snapped_and_unknown_labels_dropped() -> None:
+    labels, report = validate_label_fields({
+        "character": "谨慎",
+        "willingness": "价格敏感型",
+        "age": "26-35",
+        "emotion": "开心",
+        "region": "一线",
+    })
+    assert labels["character"] == "谨慎型"
+    assert labels["willingness"] == "价格敏感"
+    assert labels["age"] == "26-35岁"
+    assert labels["emotion"] is None
+    assert labels["region"] is None  # 一线城市 / 新一线城市 都接近，不猜
+    assert ("emotion", "开心") in report.dropped
+
+
+def test_negated_labels_are_never_snapped_to_their_opposite() -> None:
+    labels, report = validate_label_fields({
+        "lifestyle": "不吸烟",
+        "emotion": "不信任,不焦虑,不太满意",
+        "willingness": "不价格敏感",
+        "family_status": "未婚未育",
+    })
+    assert labels["lifestyle"] is None
+    assert labels["emotion"] == "不满意"  # 否定保留时仍可纠正
+    assert labels["willingness"] is None
+    assert labels["family_status"] is None
+    assert ("emotion", "不焦虑") in report.dropped
+
+
+def test_misplaced_label_moves_to_its_field_and_score_is_clamped() -> None:
+    labels, report = validate_label_fields({"character": "谨慎型,焦虑", "emotion": None, "purchase_intent_score": "12分"})
+    assert labels["character"] == "谨慎型"
+    assert labels["emotion"] == "焦虑"
+    assert labels["purchase_intent_score"] == "10"
+    assert report.moved == [("character", "焦虑", "emotion")]
+
+
+def test_enum_model_only_accepts_vocabulary_labels() -> None:
+    model = build_label_enum_model()
+    empty = {name: None for name in model.model_fields}
+    labels = model(**{**empty, "emotion": ["焦虑", "犹豫"], "purchase_intent_score": 7})
+    fields = enum_labels_to_fields(labels)
+    assert fields["emotion"] == "焦虑,犹豫"
+    assert fields["purchase_intent_score"] == "7"
+    assert fields["age"] is None
+    with pytest.raises(ValidationError):
+        model(**{**empty, "emotion": ["开心"]})
+    with pytest.raises(ValidationError):
+        model(**{**empty, "purchase_intent_score": 11})
+
+
+def test_merge_label_delta() -> None:
+    labels, _ = merge_label_delta(
+        {"emotion": "焦虑,期待", "stage": "决策期", "age": "26-35岁"},
+        {"emotion": "满意,开心", "stage": "成交客户期"},
+        {"emotion": "焦虑"},
+    )
+    assert labels["emotion"] == "期待,满意"
+    assert labels["stage"] == "成交客户期"  # 单值字段直接替换
+    assert labels["age"] == "26-35岁"
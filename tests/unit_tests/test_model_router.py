@@ -0,0 +1,72 @@
+import asyncio
+from typing import Literal
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from huanmu_agent.utils import model_router as mr
+
+
+def failing(_input):
+    raise TimeoutError("provider timed out")
+
+
+def test_fails_over_and_demotes_unhealthy_model(monkeypatch) -> None:
+    models = {
+        "openai/a": RunnableLambda(failing),
+        "openai/b": FakeListChatModel(responses=["from b"] * 50),
+    }
+    monkeypatch.setattr(mr, "load_chat_model", lambda name, temperature: models[name])
+    router = mr.ModelRouter({"reply": mr.ModelRoute(("openai/a", "openai/b"), 5.0)})
+    model = mr.RoutedChatModel("reply", 0.0, router=router)
+
+    async def main():
+        return [await model.ainvoke("hi") for _ in range(mr.MIN_HEALTH_SAMPLES)]
+
+    assert [m.content for m in asyncio.run(main())] == ["from b"] * mr.MIN_HEALTH_SAMPLES
+    assert router.candidates("reply") == ["openai/b", "openai/a"]
+    assert router.stats()["openai/a"]["error_rate"] == 1.0
+    # A per-request primary model is tried first
+    assert router.candidates("reply", primary="openai/c")[0] == "openai/c"
+
+
+def test_slow_model_moves_behind_faster_ones() -> None:
+    router = mr.ModelRouter({"reply": mr.ModelRoute(("openai/a", "openai/b"), 1.0)})
+    for _ in range(mr.MIN_HEALTH_SAMPLES):
+        router.record("openai/a", 3.0, True)
+        router.record("openai/b", 0.2, True)
+    assert router.candidates("reply") == ["openai/b", "openai/a"]
+    assert router.stats()["openai/a"]["p95_latency"] == 3.0
+
+
+def test_strict_schema_arguments_only_go_to_openai(monkeypatch) -> None:
+    seen = {}
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def with_structured_output(self, schema, **kwargs):
+            seen[self.name] = (schema, kwargs)
+            if self.name.startswith("openai/"):
+                return RunnableLambda(failing)
+            return RunnableLambda(lambda _input: schema(label="近似标签"))
+
+    class Strict(BaseModel):
+        label: Literal["合法标签"]
+
+    class Loose(BaseModel):
+        label: str
+
+    monkeypatch.setattr(mr, "load_chat_model", lambda name, temperature: Recorder(name))
+    router = mr.ModelRouter({"labeling": mr.ModelRoute(("openai/a", "google_vertexai/b"), 5.0)})
+    model = mr.RoutedChatModel("labeling", 0.0, router=router).with_structured_output(
+        Strict, fallback_schema=Loose, method="json_schema", strict=True
+    )
+    # The fallback returns the loose schema instead of failing enum validation
+    assert model.invoke("hi") == Loose(label="近似标签")
+    assert seen == {
+        "openai/a": (Strict, {"method": "json_schema", "strict": True}),
+        "google_vertexai/b": (Loose, {}),
+    }
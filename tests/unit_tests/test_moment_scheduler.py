@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from huanmu_agent.wechat.moment_scheduler import (
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_READY,
+    MomentJobStore,
+    MomentScheduler,
+)
+
+
+def test_due_jobs_are_pregenerated_and_future_jobs_wait(tmp_path) -> None:
+    store = MomentJobStore(str(tmp_path / "moments.db"))
+    now = time.time()
+    due = [store.enqueue(f"moment {i}", now + 60, moment_number=2, lead_time=600) for i in range(5)]
+    later = store.enqueue("tomorrow", now + 86400, lead_time=600)
+    assert store.enqueue("duplicate", now, job_key="k") == store.enqueue("duplicate", now, job_key="k")
+
+    running, peak = 0, 0
+
+    async def generate(row_moment, moment_number, configurable):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [f"{row_moment} #{i}" for i in range(moment_number)]
+
+    stats = asyncio.run(MomentScheduler(store, concurrency=2, generate_fn=generate).drain())
+    assert stats["succeeded"] == 6
+    assert peak == 2
+    assert store.get(due[0]).status == STATUS_READY
+    assert store.take_ready(due[0]) == ["moment 0 #0", "moment 0 #1"]
+    assert store.take_ready(due[0]) is None  # already published
+    assert store.get(later).status == STATUS_PENDING
+
+
+def test_failed_jobs_retry_then_fail(tmp_path) -> None:
+    store = MomentJobStore(str(tmp_path / "moments.db"))
+    job_id = store.enqueue("x", time.time() + 3600, lead_time=3600)
+
+    async def fail(*args):
+        raise ValueError("boom")
+
+    scheduler = MomentScheduler(store, max_attempts=2, generate_fn=fail)
+    asyncio.run(scheduler.drain())
+    assert store.get(job_id).status == STATUS_PENDING  # requeued with backoff
+    store._update(job_id, run_at=0)
+    asyncio.run(scheduler.drain())
+    job = store.get(job_id)
+    assert (job.status, job.attempts, job.error_message) == (STATUS_FAILED, 2, "boom")
+
+
+def test_no_retry_past_publish_time(tmp_path) -> None:
+    store = MomentJobStore(str(tmp_path / "moments.db"))
+    # Due now, but the first backoff (20s) would land after publishing
+    job_id = store.enqueue("x", time.time() + 5, lead_time=60)
+
+    async def fail(*args):
+        raise ValueError("boom")
+
+    stats = asyncio.run(MomentScheduler(store, max_attempts=3, generate_fn=fail).drain())
+    assert stats == {"succeeded": 0, "retried": 0, "failed": 1}
+    assert store.get(job_id).status == STATUS_FAILED
+
+
+def test_take_ready_hands_moments_to_one_caller(tmp_path) -> None:
+    path = str(tmp_path / "moments.db")
+    store = MomentJobStore(path)
+    job_id = store.enqueue("x", time.time(), lead_time=0)
+    store.mark_ready(job_id, ["a"])
+    other = MomentJobStore(path)
+    results = [store.take_ready(job_id), other.take_ready(job_id)]
+    assert results == [["a"], None]
+    assert store.take_ready(store.enqueue("pending", time.time() + 3600)) is None
+
+
+def test_expired_leases_respect_attempts_and_publish_time(tmp_path) -> None:
+    store = MomentJobStore(str(tmp_path / "moments.db"), lease_seconds=1)
+    now = time.time()
+    retried = store.enqueue("retried", now + 3600, lead_time=3600)
+    late = store.enqueue("late", now + 10, lead_time=3600)
+    assert {store.claim_due(now).id, store.claim_due(now).id} == {retried, late}
+
+    # Both leases expire: only the job still before its publish time is reclaimed
+    job = store.claim_due(now + 20, max_attempts=2)
+    assert (job.id, job.attempts) == (retried, 2)
+    assert store.get(late).status == STATUS_FAILED
+    # The crashed worker's attempts are used up
+    assert store.claim_due(now + 40, max_attempts=2) is None
+    assert store.get(retried).status == STATUS_FAILED
+
+
+def test_stale_worker_cannot_overwrite_the_new_owner(tmp_path) -> None:
+    store = MomentJobStore(str(tmp_path / "moments.db"), lease_seconds=1)
+    now = time.time()
+    job_id = store.enqueue("x", now + 3600, lead_time=3600)
+    stale = store.claim_due(now)
+    owner = store.claim_due(now + 5)
+    assert owner.attempts == stale.attempts + 1
+    assert not store.mark_ready(job_id, ["stale"], attempt=stale.attempts)
+    assert store.mark_ready(job_id, ["fresh"], attempt=owner.attempts)
+    assert not store.mark_failed(job_id, "late error", attempt=stale.attempts)
+    assert store.take_ready(job_id) == ["fresh"]
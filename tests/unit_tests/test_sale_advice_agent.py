@@ -0,0 +1,33 @@
+import asyncio
+
+from langchain_core.messages import convert_to_messages
+from langchain_core.runnables import RunnableLambda
+
+from huanmu_agent.sales import sale_advice_agent
+from huanmu_agent.utils import model_router
+
+
+def test_streaming_and_plain_paths_send_the_same_prompt(monkeypatch) -> None:
+    sent = []
+
+    class FakeChatModel:
+        def with_structured_output(self, schema, **kwargs):
+            def respond(messages):
+                sent.append([(m.type, m.content) for m in convert_to_messages(messages)])
+                return {"suggestions": []} if isinstance(schema, dict) else schema(suggestions=[])
+
+            return RunnableLambda(respond)
+
+    monkeypatch.setattr(model_router, "load_chat_model", lambda name, temperature: FakeChatModel())
+
+    async def main():
+        for stream in (False, True):
+            await sale_advice_agent.sales_chat_suggestion_graph.ainvoke(
+                {"messages": []}, {"configurable": {"stream_suggestions": stream, "use_cache": False}}
+            )
+
+    asyncio.run(main())
+    plain, streamed = sent
+    assert streamed == plain
+    # An empty history still carries the reply instructions
+    assert [role for role, _ in plain] == ["system", "system", "human", "human"]
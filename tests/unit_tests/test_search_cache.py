@@ -0,0 +1,30 @@
+import asyncio
+
+from huanmu_agent import tools
+
+
+def test_identical_queries_share_one_search(monkeypatch) -> None:
+    calls = []
+
+    async def fake_search(query, max_results):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return [{"title": "热玛吉价格", "content": "约 1 万元起", "url": "https://example.com"}]
+
+    monkeypatch.setattr(tools, "tavily_search", fake_search)
+    tools.search_cache.clear()
+
+    async def main():
+        concurrent = await asyncio.gather(*(tools.cached_search(q, 3) for q in ["热玛吉 价格？", "热玛吉  价格", "热玛吉 价格"]))
+        again = await tools.cached_search("热玛吉 价格!", 3)
+        return concurrent, again
+
+    concurrent, again = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == again for r in concurrent)
+    assert "来源: https://example.com" in tools.format_search_results(again, 3)
+
+
+def test_normalize_search_query() -> None:
+    assert tools.normalize_search_query("  Thermage   PRICE？ ") == "thermage price"
+    assert tools.normalize_search_query("ＡＢＣ。") == "abc"
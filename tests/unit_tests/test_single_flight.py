@@ -0,0 +1,40 @@
+import asyncio
+
+from huanmu_agent.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    flight = SingleFlight()
+    calls = []
+
+    async def work(value: int) -> int:
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def main():
+        same = await asyncio.gather(*(flight.do("a", lambda: work(1)) for _ in range(5)))
+        other = await flight.do("b", lambda: work(2))
+        again = await flight.do("a", lambda: work(3))
+        return same, other, again
+
+    same, other, again = asyncio.run(main())
+    assert same == [2] * 5
+    assert other == 4
+    assert again == 6  # finished calls are not remembered
+    assert calls == [1, 2, 3]
+    assert flight.stats() == {"executions": 3, "shared": 4, "in_flight": 0}
+
+
+def test_errors_propagate_to_every_waiter() -> None:
+    flight = SingleFlight()
+
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)